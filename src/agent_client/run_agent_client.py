@@ -1,4 +1,3 @@
-import ast
 import asyncio
 import logging
 import os
@@ -15,6 +14,7 @@ from src.agent_client.environment.scenario_type import ScenarioType
 from src.agent_client.environment.terminal_access_tool_provider import TerminalAccessToolImplementationProvider
 from src.agent_client.utils.available_context import AvailableContext
 from src.agent_client.utils.exceptions import ScenarioEnvironmentException
+from src.data_processing_scripts.scenario_columns import scenario_of
 
 async def main():
     yt_connection_manager = YTConnectionManager(dataset_table_location=os.environ['YT_DATASET_TABLE_LOCATION'])
@@ -102,7 +102,7 @@ async def main():
                               llm_client=llm_client,
                               host_agent_work_dir=host_agent_work_dir)
 
-        scenario = ast.literal_eval(sample.scenario)
+        scenario = scenario_of(sample)
 
         if sample.sample_type == ScenarioType.CHERRY_PICK.value:
             scenario_types = [ScenarioType.CHERRY_PICK]
@@ -0,0 +1,108 @@
+import json
+import os
+import sqlite3
+from typing import Any, Callable, Dict, List, Sequence
+
+# The version of every cached analysis. Bump it whenever the results of the analysis change, e.g. after fixing a bug
+# in it, so results of the previous version are no longer used.
+ANALYSIS_VERSIONS = {
+    'remerge_diff': 1,
+    'cherry_pick_conflicts': 2,
+    'file_commit_chain_purity': 3,
+    'file_commit_chain_non_pl_files': 1,
+}
+
+
+class AnalysisCache:
+    """
+    Content-addressed cache of the results of the git analyses of the post-processing stages, e.g. the conflicts of a
+    merge commit or the purity of a file-commit chain, in a sqlite file.
+
+    A result is keyed by the analysis, its version in ANALYSIS_VERSIONS, the repository and the inputs of the
+    analysis, i.e. the SHAs of the commits involved and e.g. the file of a file-commit chain. Commits never change, so
+    results never have to be invalidated, unless the analysis itself changes. Results are stored as JSON. The cache
+    can be shared by several processes, e.g. on a persistent disk of the job nodes, so re-running a stage reuses the
+    results of earlier runs.
+    """
+
+    def __init__(self, path_to_cache: str):
+        self.path_to_cache = os.path.abspath(path_to_cache)
+        os.makedirs(os.path.dirname(self.path_to_cache), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS results (analysis TEXT NOT NULL, version INTEGER NOT NULL,
+                                                    repository TEXT NOT NULL, inputs TEXT NOT NULL,
+                                                    result TEXT NOT NULL,
+                                                    PRIMARY KEY (analysis, version, repository, inputs)) WITHOUT ROWID
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per operation, so the cache can be used from several threads and processes
+        return sqlite3.connect(self.path_to_cache, timeout=60)
+
+    @staticmethod
+    def _version_of(analysis: str) -> int:
+        if analysis not in ANALYSIS_VERSIONS:
+            raise ValueError(f'Unknown analysis {analysis}. Supported values: {list(ANALYSIS_VERSIONS)}')
+        return ANALYSIS_VERSIONS[analysis]
+
+    def get_many(self, analysis: str, repository_name: str, inputs: Sequence[tuple]) -> Dict[tuple, Any]:
+        """
+        Returns:
+            Dict[tuple, Any]: The cached results of the analysis of the repository by their inputs. Inputs without a
+                cached result are missing.
+        """
+        version = self._version_of(analysis)
+        results = {}
+        connection = self._connect()
+        try:
+            for analysis_inputs in inputs:
+                row = connection.execute('SELECT result FROM results WHERE analysis = ? AND version = ? AND '
+                                         'repository = ? AND inputs = ?',
+                                         (analysis, version, repository_name, json.dumps(analysis_inputs))).fetchone()
+                if row is not None:
+                    results[analysis_inputs] = json.loads(row[0])
+        finally:
+            connection.close()
+        return results
+
+    def put_many(self, analysis: str, repository_name: str, results: Dict[tuple, Any]):
+        """
+        Args:
+            analysis (str): One of ANALYSIS_VERSIONS.
+            repository_name (str): The repository '<owner>/<repository>' the results are of.
+            results (Dict[tuple, Any]): The JSON serialisable results of the analysis by their inputs.
+        """
+        version = self._version_of(analysis)
+        if not results:
+            return
+        with self._connect() as connection:
+            connection.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                                   [(analysis, version, repository_name, json.dumps(analysis_inputs), json.dumps(result))
+                                    for analysis_inputs, result in results.items()])
+        connection.close()
+
+    def cached(self, analysis: str, repository_name: str, inputs: Sequence[tuple],
+               compute: Callable[[List[tuple]], List[Any]]) -> List[Any]:
+        """
+        Returns the results of the analysis for all inputs, in order. Only the inputs without a cached result are
+        computed, in a single call of compute, and their results are added to the cache. Results which are None, e.g.
+        of commits missing from a clone, are not cached, so they are computed again next time.
+
+        Args:
+            analysis (str): One of ANALYSIS_VERSIONS.
+            repository_name (str): The repository '<owner>/<repository>' the inputs are of.
+            inputs (Sequence[tuple]): The inputs of the analysis, e.g. (merge_commit_hash,).
+            compute (Callable[[List[tuple]], List[Any]]): Computes the JSON serialisable results of a list of inputs.
+        """
+        inputs = [tuple(analysis_inputs) for analysis_inputs in inputs]
+        results = self.get_many(analysis, repository_name, inputs)
+        missing_inputs = list(dict.fromkeys(analysis_inputs for analysis_inputs in inputs
+                                            if analysis_inputs not in results))
+        if missing_inputs:
+            computed_results = dict(zip(missing_inputs, compute(missing_inputs)))
+            self.put_many(analysis, repository_name, {analysis_inputs: result
+                                                      for analysis_inputs, result in computed_results.items()
+                                                      if result is not None})
+            results.update(computed_results)
+        return [results[analysis_inputs] for analysis_inputs in inputs]
@@ -0,0 +1,62 @@
+import heapq
+import itertools
+import pickle
+import tempfile
+from typing import Any, BinaryIO, Iterable, Iterator, List, Sequence
+
+ROWS_PER_RUN = 100000
+
+
+def sort_key_of(row, columns: Sequence[str]) -> tuple:
+    """
+    Returns the sort key of a row by columns. Like YT, missing values sort before all other values.
+    """
+    return tuple((0,) if getattr(row, column) is None else (1, getattr(row, column)) for column in columns)
+
+
+def _write_run(rows: List, columns: Sequence[str]) -> BinaryIO:
+    run = tempfile.TemporaryFile()
+    for row in sorted(rows, key=lambda row: sort_key_of(row, columns)):
+        pickle.dump(row, run, protocol=pickle.HIGHEST_PROTOCOL)
+    run.seek(0)
+    return run
+
+
+def _read_run(run: BinaryIO) -> Iterator[Any]:
+    while True:
+        try:
+            yield pickle.load(run)
+        except EOFError:
+            return
+
+
+def sort_rows_externally(rows: Iterable, columns: Sequence[str], rows_per_run: int = ROWS_PER_RUN) -> Iterator:
+    """
+    Sorts rows by columns, like run_sort on a cluster, with at most rows_per_run rows in memory: the rows are sorted in
+    runs which are spilled to temporary files and merged while iterating. The sort is stable.
+    """
+    runs = []
+    try:
+        rows = iter(rows)
+        while True:
+            rows_of_run = list(itertools.islice(rows, rows_per_run))
+            if not rows_of_run:
+                break
+            runs.append(_write_run(rows_of_run, columns))
+        # heapq.merge takes the row of the earliest run on equal keys, so the merge keeps the sort stable
+        yield from heapq.merge(*[_read_run(run) for run in runs], key=lambda row: sort_key_of(row, columns))
+    finally:
+        for run in runs:
+            run.close()
+
+
+def remove_duplicates(rows: Iterable, key_columns: Sequence[str], tie_break_columns: Sequence[str] = (),
+                      rows_per_run: int = ROWS_PER_RUN) -> Iterator:
+    """
+    Streams the rows without duplicates by key_columns, sorted by key_columns, like remove_duplicates_in does on the
+    cluster. Of rows with the same key, the one that sorts first by tie_break_columns is kept, and the first of them
+    in the input if they are equal in those as well.
+    """
+    sorted_rows = sort_rows_externally(rows, list(key_columns) + list(tie_break_columns), rows_per_run)
+    for _, rows_with_key in itertools.groupby(sorted_rows, key=lambda row: sort_key_of(row, key_columns)):
+        yield next(rows_with_key)
@@ -3,6 +3,8 @@ import re
 
 import pandas as pd
 
+from src.data_processing_scripts.scenario_columns import SCENARIO_COLUMN_BY_SAMPLE_TYPE, scenario_of
+
 def bin_file_commit_chain_purity(scenario):
     if scenario['purity'] == 1:
         return 'easy'
@@ -63,11 +65,24 @@ def sample_by_strata(df, sample_size=100):
 
     return sampled_groups
 
+def read_dataset(path_to_dataset: str) -> pd.DataFrame:
+    """
+    Reads the dataset with parsed scenarios. Parquet exports of SampleDataRowV5 tables hold structured scenarios, which
+    need no parsing, CSV files hold them as Python literals.
+    """
+    if path_to_dataset.endswith('.parquet'):
+        dataset = pd.read_parquet(path_to_dataset)
+        dataset['scenario'] = [scenario_of(sample) for sample in dataset.to_dict(orient='records')]
+        return dataset.drop(columns=[column for column in set(SCENARIO_COLUMN_BY_SAMPLE_TYPE.values())
+                                     if column in dataset.columns])
+
+    dataset = pd.read_csv(path_to_dataset, index_col=0)
+    dataset['scenario'] = dataset['scenario'].apply(lambda row: ast.literal_eval(row))
+    return dataset
+
 def main():
     path_to_dataset = '../../data/git_good_bench_full.csv'
-    input_dataset = pd.read_csv(path_to_dataset, index_col=0)
-
-    input_dataset['scenario'] = input_dataset['scenario'].apply(lambda row: ast.literal_eval(row))
+    input_dataset = read_dataset(path_to_dataset)
 
     input_dataset["repository_slug"] = input_dataset["name"].apply(lambda row: re.sub(r"[^\w]+", "_", row).strip("_"))
     input_dataset["sample_index"] = input_dataset.groupby(["name", "sample_type"]).cumcount()
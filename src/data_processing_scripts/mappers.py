@@ -2,23 +2,52 @@ import ast
 import os
 import re
 import shutil
+import sqlite3
 import stat
+import subprocess
 import sys
 import traceback
-from typing import Iterable
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime, timedelta
 
 import yt.wrapper as yt
+from yt.wrapper.schema import RowIterator
 from git import Repo, GitCommandError, Commit
 from pandas import isna
 
 from src.repository_data_scraper.programming_language import ProgrammingLanguage
 from src.repository_data_scraper.repository_data_scraper import RepositoryDataScraper
-from src.data_processing_scripts.schemas import RepositoryDataRow, SampleDataRow, SampleDataRowV2, SampleDataRowV3, SampleDataRowV4
+from src.repository_data_scraper.top_k_chains import TOP_K_GROUP_BY_REPOSITORY
+from src.repository_data_scraper.commit_index import CommitIndex, commit_index_path_for, iter_git_log_records
+from src.repository_data_scraper.clone_service import CloneService, github_url, template_url_rewrite
+from src.repository_data_scraper.repository_cache import RepositoryCache
+from src.data_processing_scripts.schemas import RepositoryDataRow, SampleDataRow, SampleDataRowV2, SampleDataRowV3, SampleDataRowV4, \
+    RepositoryDataRowV2, SampleDataRowV5
+from src.data_processing_scripts.analysis_cache import AnalysisCache
+from src.data_processing_scripts.scenario_columns import parse_raw_scenarios, to_structured_repository_row, \
+    to_structured_sample_row
 
 
 def _parse_scenarios_from_raw_string(scenarios: str) -> list:
-    return ast.literal_eval(scenarios) if scenarios not in ['None', 'none', 'nan', 'NaN'] and not isna(scenarios) else []
+    return parse_raw_scenarios(scenarios)
+
+def _open_commit_index_for(repository_name: str, path_to_commit_indices: Optional[str]) -> Optional[CommitIndex]:
+    """
+    Opens the persisted commit index of the repository, if one was built (e.g. during scraping). Mappers that only
+    need per-commit file lists can then skip cloning the repository.
+    """
+    if path_to_commit_indices is None:
+        return None
+
+    path_to_index = commit_index_path_for(path_to_commit_indices, repository_name)
+    if not os.path.exists(path_to_index):
+        return None
+    try:
+        return CommitIndex(path_to_index)
+    except (ValueError, sqlite3.DatabaseError) as e:
+        print(f'Could not open commit index {path_to_index}, falling back to git: {e}', file=sys.stderr)
+        return None
 
 def on_rm_error(func, path, exc_info):
     """
@@ -35,23 +64,162 @@ def on_rm_error(func, path, exc_info):
     func(path)
 
 
-class RepositoryDataMapper(yt.TypedJob):
+_clone_services = {}
+
+
+def _get_clone_service(clone_url_template: Optional[str], clone_max_attempts: int,
+                       clone_rate_per_second: Optional[float]) -> CloneService:
+    """
+    Returns the clone service of this job process for the given settings. The service is created on first use.
+    """
+    key = (clone_url_template, clone_max_attempts, clone_rate_per_second)
+    if key not in _clone_services:
+        _clone_services[key] = CloneService(
+            max_concurrency=1, rate_per_second=clone_rate_per_second, max_attempts=clone_max_attempts,
+            url_rewrite=template_url_rewrite(clone_url_template) if clone_url_template is not None else github_url)
+    return _clone_services[key]
+
+
+_repository_caches = {}
+
+
+def _get_repository_cache(path_to_cache: str, disk_budget_bytes: Optional[int],
+                          clone_service: CloneService) -> RepositoryCache:
+    """
+    Returns the repository cache of this job process for the given settings. The cache is opened on first use.
+    """
+    key = (path_to_cache, disk_budget_bytes, id(clone_service))
+    if key not in _repository_caches:
+        _repository_caches[key] = RepositoryCache(path_to_cache, disk_budget_bytes=disk_budget_bytes,
+                                                  clone_service=clone_service)
+    return _repository_caches[key]
+
+
+_analysis_caches = {}
+
+
+def _get_analysis_cache(path_to_cache: str) -> AnalysisCache:
+    """
+    Returns the analysis cache of this job process at path_to_cache. The cache is opened on first use.
+    """
+    if path_to_cache not in _analysis_caches:
+        _analysis_caches[path_to_cache] = AnalysisCache(path_to_cache)
+    return _analysis_caches[path_to_cache]
+
+
+class RepositoryCloningJob(yt.TypedJob):
+    """
+    Base of all mappers which clone the repository of a row. Clones go through a CloneService, which retries
+    transient failures (e.g. throttling by GitHub) with exponential backoff instead of failing the row.
+
+    The settings are attributes of the job, so they are shipped with it to the job processes. Use with_clone_settings
+    to e.g. clone from a mirror: with_clone_settings(clone_url_template='file:///slot/sandbox/mirrors/{folder}.git').
+
+    Use with_repository_cache to check out working copies from a RepositoryCache on a persistent disk of the job
+    nodes instead, so every repository is only cloned once per node across rows, mappers and operations. The mappers
+    remove their working copies with rmtree as before, which ends their leases.
+
+    Use with_analysis_cache to look the results of the git analyses up in an AnalysisCache before computing them. The
+    mappers only clone a repository if a result is missing, so re-running a stage with a filled cache clones nothing.
+    """
+    clone_url_template: Optional[str] = None
+    clone_max_attempts: int = 5
+    clone_rate_per_second: Optional[float] = None
+    repository_cache_dir: Optional[str] = None
+    repository_cache_budget_bytes: Optional[int] = None
+    path_to_repositories: str = '/slot/sandbox/repos'
+    path_to_analysis_cache: Optional[str] = None
+
+    def with_clone_settings(self, clone_url_template: Optional[str] = None, clone_max_attempts: int = 5,
+                            clone_rate_per_second: Optional[float] = None):
+        """
+        Args:
+            clone_url_template (Optional[str]): The URL to clone from, see template_url_rewrite for the placeholders.
+                Defaults to GitHub.
+            clone_max_attempts (int): How often a clone is attempted if it fails transiently.
+            clone_rate_per_second (Optional[float]): If set, the maximum amount of clones per second of a job process.
+
+        Returns:
+            The job itself.
+        """
+        self.clone_url_template = clone_url_template
+        self.clone_max_attempts = clone_max_attempts
+        self.clone_rate_per_second = clone_rate_per_second
+        return self
+
+    def with_repository_cache(self, repository_cache_dir: str, repository_cache_budget_bytes: Optional[int] = None):
+        """
+        Args:
+            repository_cache_dir (str): The directory of the repository cache on the job node.
+            repository_cache_budget_bytes (Optional[int]): If set, the maximum size of the mirrors in the cache.
+
+        Returns:
+            The job itself.
+        """
+        self.repository_cache_dir = repository_cache_dir
+        self.repository_cache_budget_bytes = repository_cache_budget_bytes
+        return self
+
+    def with_analysis_cache(self, path_to_analysis_cache: str):
+        """
+        Args:
+            path_to_analysis_cache (str): The sqlite file of the analysis cache, e.g. on a persistent disk of the job
+                nodes.
+
+        Returns:
+            The job itself.
+        """
+        self.path_to_analysis_cache = path_to_analysis_cache
+        return self
+
+    def _cached_analyses(self, analysis: str, repository_name: str, inputs: List[tuple],
+                         compute: Callable[[List[tuple]], List[Any]]) -> List[Any]:
+        """
+        Returns the results of an analysis for all inputs, see AnalysisCache.cached. Without an analysis cache, all
+        results are computed.
+        """
+        if self.path_to_analysis_cache is None:
+            return compute(inputs) if inputs else []
+        return _get_analysis_cache(self.path_to_analysis_cache).cached(analysis, repository_name, inputs, compute)
+
+    def _path_to_repository_of(self, repository_name: str) -> str:
+        return os.path.join(self.path_to_repositories, "__".join(repository_name.split("/")))
+
+    def _clone_repository(self, repository_name: str, path_to_repository: str) -> Repo:
+        """
+        Clones the repository '<owner>/<repository>' to path_to_repository, like Repo.clone_from. With a repository
+        cache, path_to_repository is a working copy checked out from the cached mirror.
+        """
+        clone_service = _get_clone_service(self.clone_url_template, self.clone_max_attempts,
+                                           self.clone_rate_per_second)
+        if self.repository_cache_dir is None:
+            return clone_service.clone_repository(repository_name, path_to_repository)
+        repository_cache = _get_repository_cache(self.repository_cache_dir, self.repository_cache_budget_bytes,
+                                                 clone_service)
+        return Repo(repository_cache.checkout(repository_name, path_to_repository))
+
+
+class RepositoryDataMapper(RepositoryCloningJob):
     sliding_window_size: int = -1
+    top_k_chains: Optional[int] = None
+    top_k_group_by: str = TOP_K_GROUP_BY_REPOSITORY
+    max_chain_length: Optional[int] = None
 
-    def __init__(self, sliding_window_size: int = 3):
+    def __init__(self, sliding_window_size: int = 3, top_k_chains: Optional[int] = None,
+                 top_k_group_by: str = TOP_K_GROUP_BY_REPOSITORY, max_chain_length: Optional[int] = None):
         super(RepositoryDataMapper, self).__init__()
         self.sliding_window_size = sliding_window_size
-        print(f'Using sliding_window_size={self.sliding_window_size}', file=sys.stderr)
+        self.top_k_chains = top_k_chains
+        self.top_k_group_by = top_k_group_by
+        self.max_chain_length = max_chain_length
+        print(f'Using sliding_window_size={self.sliding_window_size}, top_k_chains={self.top_k_chains} '
+              f'(per {self.top_k_group_by}), max_chain_length={self.max_chain_length}', file=sys.stderr)
 
     def __call__(self, row: RepositoryDataRow) -> Iterable[RepositoryDataRow]:
-        repository_folder = "__".join(row.name.split("/"))
-        path_to_repository = os.path.join('/slot/sandbox/repos', repository_folder)
+        path_to_repository = self._path_to_repository_of(row.name)
         try:
-            repo_instance = Repo.clone_from(f'https://github.com/{row.name}.git',
-                                            f'{path_to_repository}')
-
-            os.chdir(path_to_repository)
-            print(os.getcwd(), file=sys.stderr)
+            repo_instance = self._clone_repository(row.name, path_to_repository)
+            print(path_to_repository, file=sys.stderr)
 
             if row.programming_language == 'kotlin':
                 programming_language = ProgrammingLanguage.KOTLIN
@@ -66,22 +234,19 @@ class RepositoryDataMapper(yt.TypedJob):
             repo_scraper = RepositoryDataScraper(repository=repo_instance,
                                                  programming_language=programming_language,
                                                  repository_name=row.name,
-                                                 sliding_window_size=self.sliding_window_size)
+                                                 sliding_window_size=self.sliding_window_size,
+                                                 top_k_chains=self.top_k_chains,
+                                                 top_k_group_by=self.top_k_group_by,
+                                                 max_chain_length=self.max_chain_length)
             repo_scraper.scrape()
 
-            row.file_commit_gram_scenarios = str(repo_scraper.accumulator['file_commit_gram_scenarios'])
+            row.file_commit_gram_scenarios = str(repo_scraper.accumulator['file_commit_chain_scenarios'])
             row.merge_scenarios = str(repo_scraper.accumulator['merge_scenarios'])
             row.cherry_pick_scenarios = str(repo_scraper.accumulator['cherry_pick_scenarios'])
 
-            # Move back into tmpfs working directrory
-            os.chdir('..')
-
-            print('Current working directory: '+os.getcwd(), file=sys.stderr)
-            print(os.listdir('.'), file=sys.stderr)
+            shutil.rmtree(path_to_repository, onerror=on_rm_error)
 
-            shutil.rmtree(repository_folder, onerror=on_rm_error)
-
-            print(os.listdir('.'), file=sys.stderr)
+            print(os.listdir(os.path.dirname(path_to_repository)), file=sys.stderr)
         except Exception as e:
             print(traceback.format_exc(), file=sys.stderr)
             row.error = traceback.format_exc()
@@ -116,77 +281,284 @@ def _detect_manual_changes_in(remerge_result):
     has_manual_changes = re.findall(r'(diff --git (?:a|b)/\w+\.\w+)', remerge_result)
     return has_manual_changes != []
 
-def process_merge_scenarios(parsed_merge_scenarios, repo_instance):
+@dataclass
+class RemergeDiffAnalysis:
+    """
+    What the remerge diff of a merge commit, i.e. the diff between re-doing the merge and the merge commit, shows.
+
+    has_conflict and has_manual_changes are the flags of MergeConflictMapper, the remaining fields are the ones
+    ImproveMergeConflictScenarioQualityMapper adds to merge scenarios.
+    """
+    merge_commit_hash: str
+    has_conflict: bool = False
+    has_manual_changes: bool = False
+    files_in_merge_conflict: List[str] = field(default_factory=list)
+    total_number_of_merge_conflicts: int = 0
+    changes_non_pl_files: bool = False
+
+
+_CONFLICT_MARKER_PATTERN = re.compile(r'<<<<<<< [a-z0-9 ()]+$|=======|>>>>>>> [a-z0-9 ()]+$')
+_MANUAL_CHANGE_PATTERN = re.compile(r'diff --git (?:a|b)/\w+\.\w+')
+
+
+def _analyse_remerge_diff(merge_commit_hash: str, lines: Iterable[str]) -> RemergeDiffAnalysis:
+    """
+    Analyses the remerge diff of a merge commit line by line, with the same patterns as _detect_merge_conflicts_in and
+    _detect_manual_changes_in.
+    """
+    analysis = RemergeDiffAnalysis(merge_commit_hash)
+    file, conflicts_in_file, has_conflict_end_marker = None, 0, False
+
+    def finish_file():
+        if file is not None and has_conflict_end_marker:
+            analysis.files_in_merge_conflict.append(file)
+            analysis.total_number_of_merge_conflicts += conflicts_in_file
+
+    for line in lines:
+        if line.startswith('diff --git'):
+            finish_file()
+            # e.g. ' a/module.py b/module.py'
+            header = line[len('diff --git'):]
+            file, conflicts_in_file, has_conflict_end_marker = header.split(' b')[0][3:], 0, False
+            analysis.changes_non_pl_files |= _does_line_contain_non_programming_language_files(header)
+        analysis.has_manual_changes |= _MANUAL_CHANGE_PATTERN.search(line) is not None
+        analysis.has_conflict |= _CONFLICT_MARKER_PATTERN.search(line) is not None
+        conflicts_in_file += line.count('<<<<<<<')
+        has_conflict_end_marker |= '>>>>>>>' in line
+    finish_file()
+    return analysis
+
+
+def _resolve_commits(repo_instance: Repo, commit_hashes: Iterable[str]) -> Dict[str, str]:
+    """
+    Returns:
+        Dict[str, str]: The full hash of each of the commits which still exist in the repository, by the given hash.
+    """
+    commit_hashes = list(dict.fromkeys(commit_hashes))
+    batch_check = subprocess.run(['git', '-C', repo_instance.working_dir, 'cat-file', '--batch-check'],
+                                 input=''.join(f'{commit_hash}\n' for commit_hash in commit_hashes).encode('utf-8'),
+                                 capture_output=True, check=True).stdout.decode('utf-8').splitlines()
+    # git cat-file prints one line per input, '<hash> commit <size>' or '<hash> missing'
+    return {commit_hash: line.split(' ')[0] for commit_hash, line in zip(commit_hashes, batch_check)
+            if line.split(' ')[1:2] == ['commit']}
+
+
+def analyse_remerge_diffs(repo_instance: Repo, merge_commit_hashes: Iterable[str]) -> Iterator[RemergeDiffAnalysis]:
+    """
+    Analyses the remerge diffs of many merge commits with a single streamed `git log --remerge-diff`, instead of one
+    `git show --remerge-diff` per merge commit whose output is buffered as a whole.
+
+    Args:
+        repo_instance (Repo): The repository containing the merge commits.
+        merge_commit_hashes (Iterable[str]): The merge commits to analyse.
+
+    Yields:
+        RemergeDiffAnalysis: The analysis of each merge commit which still exists in the repository, with the hash as
+            given. Commits which no longer exist (e.g. after a force push) are skipped.
+    """
+    given_hash_by_full_hash = {full_hash: commit_hash for commit_hash, full_hash
+                               in _resolve_commits(repo_instance, merge_commit_hashes).items()}
+    # Without revisions git log would fall back to HEAD
+    if not given_hash_by_full_hash:
+        return
+    for (full_hash,), lines in iter_git_log_records(repo_instance.working_dir, '--no-walk=unsorted', '--stdin',
+                                                    '--remerge-diff', fields='%H',
+                                                    stdin_lines=given_hash_by_full_hash):
+        yield _analyse_remerge_diff(given_hash_by_full_hash[full_hash], lines)
+
+
+@dataclass
+class CherryPickConflictAnalysis:
+    """
+    The conflicts cherry-picking a commit onto a parent results in, as reported by `git cherry-pick`.
+
+    conflict_messages are the 'CONFLICT ...' lines git prints, files_in_merge_conflict the programming language files
+    they name and total_number_of_merge_conflicts the number of conflict markers in these files.
+    """
+    conflict_messages: List[str] = field(default_factory=list)
+    files_in_merge_conflict: List[str] = field(default_factory=list)
+    total_number_of_merge_conflicts: int = 0
+    conflicts_in_non_pl_files: bool = False
+
+    @property
+    def has_conflict(self) -> bool:
+        return self.conflict_messages != []
+
+
+# The author and committer of the commits built for git merge-tree before 2.40. Fixing them makes the commits of
+# repeated analyses identical, so they are only written once.
+_MERGE_BASE_COMMIT_ENVIRONMENT = {'GIT_AUTHOR_NAME': 'merge-base', 'GIT_AUTHOR_EMAIL': 'merge-base@localhost',
+                                  'GIT_AUTHOR_DATE': '@0 +0000', 'GIT_COMMITTER_NAME': 'merge-base',
+                                  'GIT_COMMITTER_EMAIL': 'merge-base@localhost', 'GIT_COMMITTER_DATE': '@0 +0000'}
+
+
+def _cherry_pick_merge_tree_arguments(repo_instance: Repo, parent: str, cherry_commit: str,
+                                      cherry_commit_parent: str) -> List[str]:
+    """
+    Returns:
+        List[str]: The arguments to git merge-tree which apply the changes of cherry_commit to parent, like
+            `git cherry-pick`, i.e. with the parent of cherry_commit as merge base.
+    """
+    if repo_instance.git.version_info >= (2, 40):
+        return ['--merge-base', cherry_commit_parent, parent, cherry_commit]
+
+    # Before git 2.40 merge-tree always merges from the merge base of both sides. Commits with the trees of parent and
+    # cherry_commit, whose only ancestor has the tree of cherry_commit_parent, result in the same merge. They are only
+    # written to the object database, no ref or worktree is changed.
+    def commit_tree(commit: str, *parents: str) -> str:
+        parent_arguments = [argument for parent_commit in parents for argument in ['-p', parent_commit]]
+        return repo_instance.git.commit_tree(f'{commit}^{{tree}}', *parent_arguments, '-m', commit,
+                                             env=_MERGE_BASE_COMMIT_ENVIRONMENT)
+
+    merge_base = commit_tree(cherry_commit_parent)
+    return [commit_tree(parent, merge_base), commit_tree(cherry_commit, merge_base)]
+
+
+def analyse_cherry_pick_conflicts(repo_instance: Repo, parent: str, cherry_commit: Commit) -> CherryPickConflictAnalysis:
+    """
+    Detects the conflicts of cherry-picking cherry_commit onto parent with `git merge-tree --write-tree`, in the object
+    database only. Unlike `git cherry-pick` it needs no checkout, branch or abort and works in bare repositories.
+
+    Args:
+        repo_instance (Repo): The repository containing both commits.
+        parent (str): The commit to cherry-pick onto.
+        cherry_commit (Commit): The commit to cherry-pick, with exactly one parent.
+
+    Raises:
+        GitCommandError: If git merge-tree fails for another reason than a conflict, e.g. if parent does not exist.
+    """
+    status, output, stderr = repo_instance.git.merge_tree(
+        '--write-tree', '--name-only', '--messages',
+        *_cherry_pick_merge_tree_arguments(repo_instance, parent, cherry_commit.hexsha, cherry_commit.parents[0].hexsha),
+        with_exceptions=False, with_extended_output=True)
+    # 0 if the merge is clean, 1 if it has conflicts
+    if status not in [0, 1]:
+        raise GitCommandError(['git', 'merge-tree', parent, cherry_commit.hexsha], status, stderr, output)
+
+    # The merged tree, the conflicted files and, after an empty line, the messages of the merge
+    tree, _, messages = output.partition('\n\n')
+    tree = tree.split('\n')[0]
+    analysis = CherryPickConflictAnalysis()
+    for line in messages.splitlines():
+        if 'CONFLICT' not in line:
+            continue
+        analysis.conflict_messages.append(line)
+        if line.split('.')[-1] not in ['py', 'java', 'kt']:
+            analysis.conflicts_in_non_pl_files = True
+            continue
+        file = re.search(r'(?<= )(?:\w+\/)*\w+\.(?:py|kt|java)', line)
+        if file:
+            analysis.files_in_merge_conflict.append(file.group(0))
+            # The merged tree contains the conflicted files with conflict markers, as the worktree would
+            analysis.total_number_of_merge_conflicts += len(
+                re.findall(r'<<<<<<<', repo_instance.git.cat_file('-p', f'{tree}:{file.group(0)}')))
+    return analysis
+
+
+def _remerge_diff_analyses(job: RepositoryCloningJob, repository_name: str, merge_commit_hashes: List[str],
+                           repository: Callable[[], Repo]) -> Dict[str, RemergeDiffAnalysis]:
+    """
+    Returns the analyses of the merge commits which still exist in the repository by their hash, see
+    analyse_remerge_diffs. They are looked up in the analysis cache of job first, so repository is only cloned if one
+    is missing. Commits missing from the clone are not cached.
+    """
+    def compute(inputs: List[tuple]) -> list:
+        analyses = {analysis.merge_commit_hash: asdict(analysis)
+                    for analysis in analyse_remerge_diffs(repository(), [merge_commit_hash for merge_commit_hash, in inputs])}
+        return [analyses.get(merge_commit_hash) for merge_commit_hash, in inputs]
+
+    results = job._cached_analyses('remerge_diff', repository_name,
+                                   [(merge_commit_hash,) for merge_commit_hash in merge_commit_hashes], compute)
+    return {merge_commit_hash: RemergeDiffAnalysis(**result)
+            for merge_commit_hash, result in zip(merge_commit_hashes, results) if result is not None}
+
+
+def _cherry_pick_conflict_analysis(job: RepositoryCloningJob, repository_name: str, cherry_pick_scenario: dict,
+                                   repository: Callable[[], Repo]) -> Optional[CherryPickConflictAnalysis]:
+    """
+    Returns the conflicts of cherry-picking the cherry commit of a scenario onto its parent, see
+    analyse_cherry_pick_conflicts, or None if the cherry commit is a merge commit. It is looked up in the analysis
+    cache of job first, so repository is only cloned if it is missing.
+
+    Raises:
+        ValueError: If the cherry commit no longer exists in the repository.
+        GitCommandError: If git fails otherwise.
+    """
+    def compute(inputs: List[tuple]) -> list:
+        (parent, cherry_commit_hash), = inputs
+        cherry_commit = Commit(repository(), bytes.fromhex(cherry_commit_hash))
+        # Wrapped, since None results are not cached
+        if len(cherry_commit.parents) != 1:
+            return [{'analysis': None}]
+        return [{'analysis': asdict(analyse_cherry_pick_conflicts(repository(), parent, cherry_commit))}]
+
+    result, = job._cached_analyses('cherry_pick_conflicts', repository_name,
+                                   [(cherry_pick_scenario['parents'][0], cherry_pick_scenario['cherry_commit'])],
+                                   compute)
+    result = result['analysis']
+    if result is None:
+        print(f'Cherry commit {cherry_pick_scenario["cherry_commit"]} is a merge. It is unclear which side of the merge '
+              f'should be picked, skipping and removing this scenario.\n', file=sys.stderr)
+        return None
+    return CherryPickConflictAnalysis(**result)
+
+
+def process_merge_scenarios(parsed_merge_scenarios, analyses: Dict[str, RemergeDiffAnalysis]):
     merge_scenarios = []
     for merge_scenario in parsed_merge_scenarios:
-        try:
-            remerge_result = repo_instance.git.show('--remerge-diff', f'{merge_scenario["merge_commit_hash"]}')
+        analysis = analyses.get(merge_scenario['merge_commit_hash'])
+        if analysis is None:
+            print(f'Commit {merge_scenario["merge_commit_hash"]} no longer exists in the repository.'
+                  f'This may happen if there is some time between the execution of this mapper '
+                  f'and the initial dataset collection', file=sys.stderr)
+            continue
 
-            # If the remerge shows any diff output there must have been manual changes
-            merge_scenario['has_manual_changes'] = _detect_manual_changes_in(remerge_result)
+        # If the remerge shows any diff output there must have been manual changes
+        merge_scenario['has_manual_changes'] = analysis.has_manual_changes
 
-            # We know the remerge output contains a diff. If this this contains merge conflict markers, there must
-            # have been a merge conflict
-            merge_scenario['has_conflict'] = (_detect_merge_conflicts_in(remerge_result) != [])
+        # We know the remerge output contains a diff. If this this contains merge conflict markers, there must
+        # have been a merge conflict
+        merge_scenario['has_conflict'] = analysis.has_conflict
 
-            merge_scenarios.append(merge_scenario)
-        except GitCommandError as e:
-            if 'unknown revision or path not in the working tree.' in e.stdout:
-                print(f'Commit {merge_scenario["merge_commit_hash"]} no longer exists in the repository.'
-                      f'This may happen if there is some time between the execution of this mapper '
-                      f'and the initial dataset collection', file=sys.stderr)
-            else:
-                print(f'Other, unexpected error occurred - continuing:\n{e.stdout}', file=sys.stderr)
+        merge_scenarios.append(merge_scenario)
 
     print(f'Found {len(merge_scenarios)} merge scenarios.\n', file=sys.stderr)
     return merge_scenarios
 
 
-def process_cherry_pick_scenarios(parsed_cherry_pick_scenarios, repo_instance):
+def process_cherry_pick_scenarios(parsed_cherry_pick_scenarios,
+                                  analyse: Callable[[dict], Optional[CherryPickConflictAnalysis]]):
+    """
+    analyse returns the conflicts of a scenario, see _cherry_pick_conflict_analysis.
+    """
     cherry_pick_scenarios = []
     for cherry_pick_scenario in parsed_cherry_pick_scenarios:
-        repo_instance.git.checkout(f'{cherry_pick_scenario["parents"][0]}')
-        repo_instance.git.branch('cherry_pick_isolation_branch')
-
         try:
-            cherry_commit = Commit(repo_instance, bytes.fromhex(cherry_pick_scenario['cherry_commit']))
-            if len(cherry_commit.parents) == 1:
-                repo_instance.git.cherry_pick(f'{cherry_pick_scenario["cherry_commit"]}')
-            else:
-                print(f'Cherry commit is a merge with {len(cherry_commit.parents)} parents. '
-                      f'It is unclear which side of the merge should be picked, skipping and removing this scenario.\n', file=sys.stderr)
+            analysis = analyse(cherry_pick_scenario)
+            if analysis is None:
+                continue
         except ValueError as e:
             print(f'Commit {cherry_pick_scenario["cherry_commit"]} appears to no longer exist in the repository: {str(e)}'
                   f'This may happen if there is some time between the execution of this mapper '
                   f'and the initial dataset collection. Skipping and removing this scenario.', file=sys.stderr)
+            continue
         except GitCommandError as e:
-            print('Caught GitCommandError. Checking if it is the result of a merge conflict.', file=sys.stderr)
-
-            # We know the remerge output contains a diff. If this this contains merge conflict markers, there must
-            # have been a merge conflict
-            cherry_pick_scenario['has_conflict'] = (_detect_cherry_pick_conflicts_in(e.stdout) != [])
+            print(f'Other, unexpected error occurred:\n{e}', file=sys.stderr)
+            print(f'Current scenario:\n{cherry_pick_scenario}', file=sys.stderr)
+            continue
 
-            if cherry_pick_scenario['has_conflict']:
-                print(f'Found merge conflict:\n{e}', file=sys.stderr)
-                cherry_pick_scenarios.append(cherry_pick_scenario)
-                repo_instance.git.cherry_pick('--abort')
-                print(f'Aborted cherry-pick: {repo_instance.git.status()}\n', file=sys.stderr)
-            elif 'fatal: bad object' in e.stdout:
-                print(f'Commit {cherry_pick_scenario["cherry_commit"]} no longer exists in the repository.'
-                      f'This may happen if there is some time between the execution of this mapper '
-                      f'and the initial dataset collection', file=sys.stderr)
-            else:
-                print(f'Other, unexpected error occurred:\n{e}', file=sys.stderr)
-                print(f'Current scenario:\n{cherry_pick_scenario}', file=sys.stderr)
+        # If cherry-picking the commit results in conflict messages, there must have been a merge conflict
+        cherry_pick_scenario['has_conflict'] = analysis.has_conflict
 
-        repo_instance.git.checkout('-') # Checkout last branch, ie. main
-        repo_instance.git.branch('-D', 'cherry_pick_isolation_branch')
+        if cherry_pick_scenario['has_conflict']:
+            print('Found merge conflict:\n' + '\n'.join(analysis.conflict_messages), file=sys.stderr)
+            cherry_pick_scenarios.append(cherry_pick_scenario)
 
     print(f'Found {len(cherry_pick_scenarios)} cherry-pick scenarios.\n', file=sys.stderr)
     return cherry_pick_scenarios
 
 
-class MergeConflictMapper(yt.TypedJob):
+class MergeConflictMapper(RepositoryCloningJob):
     """
     Mapper that checks whether there has been a conflict for all merge and cherry-pick scenario's.
 
@@ -204,34 +576,43 @@ class MergeConflictMapper(yt.TypedJob):
         if not parsed_merge_scenarios and not parsed_cherry_pick_scenarios:
             yield row
 
-        # Setup repository if since is data to be processed
-        repository_folder = "__".join(row.name.split("/"))
-        path_to_repository = os.path.join('/slot/sandbox/repos', repository_folder)
+        # Setup repository if since is data to be processed. It is only cloned if an analysis is not cached.
+        shared_clone = _SharedClone(self, row.name)
         try:
-            repo_instance = Repo.clone_from(f'https://github.com/{row.name}.git',
-                                            f'{path_to_repository}')
-            repo_instance.git.fetch('--all')
-
-            os.chdir(path_to_repository)
-
-            if parsed_merge_scenarios:
-                print(f'Processing merge scenarios in {row.name}.', file=sys.stderr)
-                merge_scenarios = process_merge_scenarios(parsed_merge_scenarios, repo_instance)
-                row.merge_scenarios = str(merge_scenarios)
-
-            if parsed_cherry_pick_scenarios:
-                print(f'Processing cherry-pick scenarios in {row.name}.', file=sys.stderr)
-                cherry_pick_scenarios = process_cherry_pick_scenarios(parsed_cherry_pick_scenarios, repo_instance)
-                row.cherry_pick_scenarios = str(cherry_pick_scenarios)
-
-            os.chdir('..')
-            shutil.rmtree(repository_folder, onerror=on_rm_error)
+            self.analyse(row, shared_clone)
         except Exception:
             print(traceback.format_exc(), file=sys.stderr)
             row.error = traceback.format_exc()
         finally:
+            shared_clone.remove()
             yield row
 
+    def analyse(self, row: RepositoryDataRow, repository: Callable[[], Repo]) -> bool:
+        """
+        Analysis pass of this mapper, see RepositoryAnalysisMapper. repository returns the clone of the row's repository.
+
+        Returns:
+            bool: Whether the row is kept.
+        """
+        parsed_merge_scenarios = _parse_scenarios_from_raw_string(row.merge_scenarios)
+        parsed_cherry_pick_scenarios = _parse_scenarios_from_raw_string(row.cherry_pick_scenarios)
+
+        if parsed_merge_scenarios:
+            print(f'Processing merge scenarios in {row.name}.', file=sys.stderr)
+            merge_scenarios = process_merge_scenarios(parsed_merge_scenarios, _remerge_diff_analyses(
+                self, row.name, [merge_scenario['merge_commit_hash'] for merge_scenario in parsed_merge_scenarios],
+                repository))
+            row.merge_scenarios = str(merge_scenarios)
+
+        if parsed_cherry_pick_scenarios:
+            print(f'Processing cherry-pick scenarios in {row.name}.', file=sys.stderr)
+            cherry_pick_scenarios = process_cherry_pick_scenarios(
+                parsed_cherry_pick_scenarios,
+                lambda cherry_pick_scenario: _cherry_pick_conflict_analysis(self, row.name, cherry_pick_scenario,
+                                                                            repository))
+            row.cherry_pick_scenarios = str(cherry_pick_scenarios)
+        return True
+
 
 class SelectOnlyMergeScenariosWithConflictsMapper(yt.TypedJob):
     """
@@ -239,6 +620,10 @@ class SelectOnlyMergeScenariosWithConflictsMapper(yt.TypedJob):
         """
 
     def __call__(self, row: RepositoryDataRow) -> Iterable[RepositoryDataRow]:
+        self.analyse(row)
+        yield row
+
+    def analyse(self, row: RepositoryDataRow, repository: Optional[Callable[[], Repo]] = None) -> bool:
         parsed_merge_scenarios = _parse_scenarios_from_raw_string(row.merge_scenarios)
 
         if parsed_merge_scenarios:
@@ -249,95 +634,158 @@ class SelectOnlyMergeScenariosWithConflictsMapper(yt.TypedJob):
                     del merge_scenario['had_conflicts']
                     merge_scenarios_with_conflicts.append(merge_scenario)
             row.merge_scenarios = str(merge_scenarios_with_conflicts)
+        return True
 
-        yield row
+
+class FirstParentMergeIndex:
+    """
+    Answers for every commit of a repository how far its first-parent chain reaches and where on it the first merge
+    commit is, from a single listing of all commits with their parents. Checking whether a file-commit chain contains
+    a merge is then a lookup instead of a walk over its commits, however many chains overlap.
+    """
+
+    def __init__(self, repo_instance: Repo):
+        # (commits on the first-parent chain starting at the commit, position of the first merge commit on it or None)
+        self._chains: Dict[str, Tuple[int, Optional[int]]] = {}
+        # Parents are listed before their children
+        for (commit, parents), _ in iter_git_log_records(repo_instance.working_dir, '--all', '--topo-order',
+                                                         '--reverse'):
+            parents = parents.split()
+            if not parents:
+                self._chains[commit] = (1, None)
+                continue
+            depth, merge_position = self._chains[parents[0]]
+            self._chains[commit] = (depth + 1, 0 if len(parents) > 1 else
+                                    (merge_position + 1 if merge_position is not None else None))
+
+    def __contains__(self, commit: str) -> bool:
+        return commit in self._chains
+
+    def depth(self, commit: str) -> int:
+        """
+        Returns:
+            int: The number of commits on the first-parent chain starting at commit, including commit.
+        """
+        return self._chains[commit][0]
+
+    def merge_position(self, commit: str) -> Optional[int]:
+        """
+        Returns:
+            Optional[int]: The position of the first merge commit on the first-parent chain starting at commit, 0 if
+                commit is a merge commit, or None if the chain contains no merge commit.
+        """
+        return self._chains[commit][1]
 
 
-class RemoveFileCommitGramScenariosWithMergesMapper(yt.TypedJob):
+class RemoveFileCommitGramScenariosWithMergesMapper(RepositoryCloningJob):
 
     def __call__(self, row: RepositoryDataRow) -> Iterable[RepositoryDataRow]:
-        parsed_file_commit_gram_scenarios = _parse_scenarios_from_raw_string(row.file_commit_gram_scenarios)
-        parsed_merge_scenarios = _parse_scenarios_from_raw_string(row.merge_scenarios)
-        parsed_cherry_pick_scenarios = _parse_scenarios_from_raw_string(row.cherry_pick_scenarios)
-
         # Setup repository if since is data to be processed
-        repository_folder = "__".join(row.name.split("/"))
-        path_to_repository = os.path.join('/slot/sandbox/repos', repository_folder)
+        path_to_repository = self._path_to_repository_of(row.name)
         try:
-            repo_instance = Repo.clone_from(f'https://github.com/{row.name}.git',
-                                            f'{path_to_repository}')
+            repo_instance = self._clone_repository(row.name, path_to_repository)
             repo_instance.git.fetch('--all')
 
-            os.chdir(path_to_repository)
-
-            # Remove unused indicators from dataset. We will only include scenario that have conflicts for
-            # merge and cherry-pick scenarios
-            if parsed_merge_scenarios:
-                merge_scenarios = []
-                for merge_scenario in parsed_merge_scenarios:
-                    if 'has_conflict' in merge_scenario:
-                        del merge_scenario['has_conflict']
-                    if 'has_manual_changes' in merge_scenario:
-                        del merge_scenario['has_manual_changes']
-                    merge_scenarios.append(merge_scenario)
-                row.merge_scenarios = str(merge_scenarios)
-
-            if parsed_cherry_pick_scenarios:
-                cherry_pick_scenarios = []
-                for cherry_pick_scenario in parsed_cherry_pick_scenarios:
-                    if 'has_conflict' in cherry_pick_scenario:
-                        del cherry_pick_scenario['has_conflict']
-                    cherry_pick_scenarios.append(cherry_pick_scenario)
-
-                row.cherry_pick_scenarios = str(cherry_pick_scenarios)
-
-            if parsed_file_commit_gram_scenarios:
-                scenarios_without_merges = []
-                for file_commit_gram_scenario in parsed_file_commit_gram_scenarios:
-                    try:
-                        commit = Commit(repo_instance, bytes.fromhex(file_commit_gram_scenario["first_commit"]))
-
-                        has_merge_commit = False
-                        i = 0
-                        while i < file_commit_gram_scenario['times_seen_consecutively']:
-                            if len(commit.parents) > 1:
-                                print(f'Found merge in chain. Repository {row.name}, Commit-{i} {commit}, Parents {commit.parents}',
-                                      file=sys.stderr)
-                                file_commit_gram_scenario['has_merge_commit'] = True
-                                has_merge_commit = True
-                                break
-                            commit = commit.parents[0]
-                            i += 1
-
-                        if not has_merge_commit:
-                            scenarios_without_merges.append(file_commit_gram_scenario)
-                    except ValueError as e:
-                        print(f'Commit {file_commit_gram_scenario["first_commit"]} or a parent appear to no longer exist in the repository.'
-                              f'Commit {commit}: {str(e)}',
-                              file=sys.stderr)
-                        continue
-                    except GitCommandError as e:
-                        print(f'Other, unexpected error occurred:\n{e}', file=sys.stderr)
-                        continue
-                    except IndexError as e:
-                        print(f'Error shifting to next commit in chain. Commit parents: {commit.parents}, Error: {e}', file=sys.stderr)
-
-                row.file_commit_gram_scenarios = str(scenarios_without_merges)
+            self.analyse(row, lambda: repo_instance)
 
-            os.chdir('..')
-            shutil.rmtree(repository_folder, onerror=on_rm_error)
+            shutil.rmtree(path_to_repository, onerror=on_rm_error)
         except Exception:
             print(traceback.format_exc(), file=sys.stderr)
             row.error = traceback.format_exc()
         finally:
             yield row
 
+    def analyse(self, row: RepositoryDataRow, repository: Callable[[], Repo]) -> bool:
+        """
+        Analysis pass of this mapper, see RepositoryAnalysisMapper.
+        """
+        parsed_file_commit_gram_scenarios = _parse_scenarios_from_raw_string(row.file_commit_gram_scenarios)
+        parsed_merge_scenarios = _parse_scenarios_from_raw_string(row.merge_scenarios)
+        parsed_cherry_pick_scenarios = _parse_scenarios_from_raw_string(row.cherry_pick_scenarios)
+
+        # Remove unused indicators from dataset. We will only include scenario that have conflicts for
+        # merge and cherry-pick scenarios
+        if parsed_merge_scenarios:
+            merge_scenarios = []
+            for merge_scenario in parsed_merge_scenarios:
+                if 'has_conflict' in merge_scenario:
+                    del merge_scenario['has_conflict']
+                if 'has_manual_changes' in merge_scenario:
+                    del merge_scenario['has_manual_changes']
+                merge_scenarios.append(merge_scenario)
+            row.merge_scenarios = str(merge_scenarios)
+
+        if parsed_cherry_pick_scenarios:
+            cherry_pick_scenarios = []
+            for cherry_pick_scenario in parsed_cherry_pick_scenarios:
+                if 'has_conflict' in cherry_pick_scenario:
+                    del cherry_pick_scenario['has_conflict']
+                cherry_pick_scenarios.append(cherry_pick_scenario)
+
+            row.cherry_pick_scenarios = str(cherry_pick_scenarios)
+
+        if parsed_file_commit_gram_scenarios:
+            repo_instance = repository()
+            merge_index = FirstParentMergeIndex(repo_instance)
+            scenarios_without_merges = []
+            for file_commit_gram_scenario in parsed_file_commit_gram_scenarios:
+                first_commit = file_commit_gram_scenario['first_commit']
+                chain_length = file_commit_gram_scenario['times_seen_consecutively']
+                if first_commit in merge_index:
+                    merge_position = merge_index.merge_position(first_commit)
+                    if merge_position is not None and merge_position < chain_length:
+                        print(f'Found merge in chain. Repository {row.name}, Commit-{merge_position} of chain starting '
+                              f'at {first_commit}', file=sys.stderr)
+                        file_commit_gram_scenario['has_merge_commit'] = True
+                    elif merge_index.depth(first_commit) <= chain_length:
+                        print(f'Error shifting to next commit in chain. Chain starting at {first_commit} reaches the '
+                              f'root commit.', file=sys.stderr)
+                    else:
+                        scenarios_without_merges.append(file_commit_gram_scenario)
+                    continue
+
+                # Commits which are not reachable from any ref are not indexed
+                try:
+                    commit = Commit(repo_instance, bytes.fromhex(file_commit_gram_scenario["first_commit"]))
+
+                    has_merge_commit = False
+                    i = 0
+                    while i < file_commit_gram_scenario['times_seen_consecutively']:
+                        if len(commit.parents) > 1:
+                            print(f'Found merge in chain. Repository {row.name}, Commit-{i} {commit}, Parents {commit.parents}',
+                                  file=sys.stderr)
+                            file_commit_gram_scenario['has_merge_commit'] = True
+                            has_merge_commit = True
+                            break
+                        commit = commit.parents[0]
+                        i += 1
+
+                    if not has_merge_commit:
+                        scenarios_without_merges.append(file_commit_gram_scenario)
+                except ValueError as e:
+                    print(f'Commit {file_commit_gram_scenario["first_commit"]} or a parent appear to no longer exist in the repository.'
+                          f'Commit {commit}: {str(e)}',
+                          file=sys.stderr)
+                    continue
+                except GitCommandError as e:
+                    print(f'Other, unexpected error occurred:\n{e}', file=sys.stderr)
+                    continue
+                except IndexError as e:
+                    print(f'Error shifting to next commit in chain. Commit parents: {commit.parents}, Error: {e}', file=sys.stderr)
+
+            row.file_commit_gram_scenarios = str(scenarios_without_merges)
+        return True
+
 class SelectMergeScenariosWithExactlyTwoParents(yt.TypedJob):
     """
         Only retains scenarios with exactly two parent commits for the merge commit.
     """
 
     def __call__(self, row: RepositoryDataRow) -> Iterable[RepositoryDataRow]:
+        self.analyse(row)
+        yield row
+
+    def analyse(self, row: RepositoryDataRow, repository: Optional[Callable[[], Repo]] = None) -> bool:
         parsed_merge_scenarios = _parse_scenarios_from_raw_string(row.merge_scenarios)
 
         if parsed_merge_scenarios:
@@ -346,10 +794,9 @@ class SelectMergeScenariosWithExactlyTwoParents(yt.TypedJob):
                                             if len(merge_scenario['parents']) == 2]
 
             row.merge_scenarios = str(parsed_merge_scenarios)
+        return True
 
-        yield row
-
-class ImproveMergeConflictScenarioQualityMapper(yt.TypedJob):
+class ImproveMergeConflictScenarioQualityMapper(RepositoryCloningJob):
     """
     Mapper that removes merge conflicts where a conflict occurred in a non-Java, non-Python or non-Kotlin file.
     Furthermore, it introduces and populates new metadata fields for merge scenarios:
@@ -366,151 +813,327 @@ class ImproveMergeConflictScenarioQualityMapper(yt.TypedJob):
         if not parsed_merge_scenarios and not parsed_cherry_pick_scenarios:
             yield row
 
-        # Setup repository if since is data to be processed
-        repository_folder = "__".join(row.name.split("/"))
-        path_to_repository = os.path.join('/slot/sandbox/repos', repository_folder)
+        # Setup repository if since is data to be processed. It is only cloned if an analysis is not cached.
+        shared_clone = _SharedClone(self, row.name)
         try:
-            repo_instance = Repo.clone_from(f'https://github.com/{row.name}.git',
-                                            f'{path_to_repository}')
-            repo_instance.git.fetch('--all')
-
-            os.chdir(path_to_repository)
-
-            if parsed_merge_scenarios:
-                print(f'Processing merge scenarios in {row.name}.', file=sys.stderr)
-                merge_scenarios = []
-                for merge_scenario in parsed_merge_scenarios:
-                    try:
-                        remerge_result = repo_instance.git.show('--remerge-diff',
-                                                                f'{merge_scenario["merge_commit_hash"]}')
-
-                        # We know the remerge output contains a diff. If this contains merge conflict markers, there must
-                        # have been a merge conflictgit
-                        remerge_result_per_file = remerge_result.split('diff --git')[
-                                                  1:]  # remove remerge commit header and metadata
-                        if any([_does_line_contain_non_programming_language_files(r.splitlines()[0]) for r in
-                                remerge_result_per_file]):
-                            print(f'Merge conflict in non-PL file. Skipping and removing this scenario.\n', file=sys.stderr)
-                            print('\n'.join([r.splitlines()[0] for r in remerge_result_per_file]), file=sys.stderr)
-                            continue
-
-                        diffs_with_conflicts = [diff for diff in remerge_result_per_file if '>>>>>>>' in diff]
-                        total_number_of_conflicts = 0
-                        files_with_conflicts = []
-                        for diff in diffs_with_conflicts:
-                            files_with_conflicts.append(diff.split(' b')[0][3:])
-                            total_number_of_conflicts += len(re.findall(r'<<<<<<<', diff))
-
-                        merge_scenario['number_of_files_with_merge_conflict'] = len(files_with_conflicts)
-                        merge_scenario['total_number_of_merge_conflicts'] = total_number_of_conflicts
-                        merge_scenario['files_in_merge_conflict'] = files_with_conflicts
-
-                        print(f"\n##### MERGE #######\nDetected {merge_scenario['total_number_of_merge_conflicts']} merge conflicts (merge) in "
-                              f"{merge_scenario['number_of_files_with_merge_conflict']} files. Files: {merge_scenario['files_in_merge_conflict']}", file=sys.stderr)
-
-                        if total_number_of_conflicts > 0:
-                            merge_scenarios.append(merge_scenario)
-                    except GitCommandError as e:
-                        if 'unknown revision or path not in the working tree.' in e.stdout:
-                            print(f'Commit {merge_scenario["merge_commit_hash"]} no longer exists in the repository.'
-                                  f'This may happen if there is some time between the execution of this mapper '
-                                  f'and the initial dataset collection', file=sys.stderr)
-                        else:
-                            print(f'Other, unexpected error occurred - continuing:\n{e.stdout}', file=sys.stderr)
-
-                print(f'Found {len(merge_scenarios)} merge scenarios.\n', file=sys.stderr)
-                row.merge_scenarios = str(merge_scenarios)
-
-            if parsed_cherry_pick_scenarios:
-                print(f'Processing cherry-pick scenarios in {row.name}.', file=sys.stderr)
-                cherry_pick_scenarios = []
-                for cherry_pick_scenario in parsed_cherry_pick_scenarios:
-                    repo_instance.git.checkout(f'{cherry_pick_scenario["parents"][0]}')
-                    repo_instance.git.branch('cherry_pick_isolation_branch')
-
-                    try:
-                        cherry_commit = Commit(repo_instance, bytes.fromhex(cherry_pick_scenario['cherry_commit']))
-                        if len(cherry_commit.parents) == 1:
-                            repo_instance.git.cherry_pick(f'{cherry_pick_scenario["cherry_commit"]}')
-                        else:
-                            print(f'Cherry commit is a merge with {len(cherry_commit.parents)} parents. '
-                                  f'It is unclear which side of the merge should be picked, skipping and removing this scenario.\n',
-                                  file=sys.stderr)
-                    except ValueError as e:
-                        print(
-                            f'Commit {cherry_pick_scenario["cherry_commit"]} appears to no longer exist in the repository: {str(e)}'
-                            f'This may happen if there is some time between the execution of this mapper '
-                            f'and the initial dataset collection. Skipping and removing this scenario.',
-                            file=sys.stderr)
-                    except GitCommandError as e:
-                        print('Caught GitCommandError. Checking if it is the result of a merge conflict.',
-                              file=sys.stderr)
-
-                        scenario_contains_non_pl_file = False
-                        git_error_was_conflict = False
-                        cherry_pick_files_with_conflicts = []
-                        cherry_pick_total_number_of_conflicts = 0
-                        for line in e.stdout.splitlines():
-                            if 'CONFLICT' in line:
-                                if line.split('.')[-1] not in ['py', 'java', 'kt']:
-                                    print(f'\n\n--CHERRY-PICK--\nMerge conflict with unsupported non-programming-language file. Skipping and removing this scenario.\n{e.stdout}', file=sys.stderr)
-                                    scenario_contains_non_pl_file = True
-                                    break
-                                else:
-                                    git_error_was_conflict = True
-                                    file = re.search(r'(?<= )(?:\w+\/)*\w+\.(?:py|kt|java)', line)
-                                    if file:
-                                        cherry_pick_files_with_conflicts.append(file.group(0))
-
-                                        with open(file.group(0), 'r') as f:
-                                            file_content = f.read()
-                                            cherry_pick_total_number_of_conflicts += len(re.findall(r'<<<<<<<', file_content))
-
-                        if scenario_contains_non_pl_file or not git_error_was_conflict:
-                            repo_instance.git.cherry_pick('--abort')
-                            repo_instance.git.checkout('-')  # Checkout last branch, ie. main
-                            repo_instance.git.branch('-D', 'cherry_pick_isolation_branch')
-                            continue
-
-                        cherry_pick_scenario['number_of_files_with_merge_conflict'] = len(cherry_pick_files_with_conflicts)
-                        cherry_pick_scenario['total_number_of_merge_conflicts'] = cherry_pick_total_number_of_conflicts
-                        cherry_pick_scenario['files_in_merge_conflict'] = cherry_pick_files_with_conflicts
-
-                        print(
-                            f"\n###### CHERRY-PICK ######\nDetected {cherry_pick_scenario['total_number_of_merge_conflicts']} merge conflicts (cherry-pick) in "
-                            f"{cherry_pick_scenario['number_of_files_with_merge_conflict']} files. Files: {cherry_pick_scenario['files_in_merge_conflict']}",
-                            file=sys.stderr)
-
-                        cherry_pick_scenarios.append(cherry_pick_scenario)
-
-                        repo_instance.git.cherry_pick('--abort')
-                        print(f'Aborted cherry-pick: {repo_instance.git.status()}\n', file=sys.stderr)
-                        if 'fatal: bad object' in e.stdout:
-                            print(f'Commit {cherry_pick_scenario["cherry_commit"]} no longer exists in the repository.'
-                                  f'This may happen if there is some time between the execution of this mapper '
-                                  f'and the initial dataset collection', file=sys.stderr)
-                        else:
-                            print(f'Other, unexpected error occurred:\n{e}', file=sys.stderr)
-                            print(f'Current scenario:\n{cherry_pick_scenario}', file=sys.stderr)
-
-                    repo_instance.git.checkout('-')  # Checkout last branch, ie. main
-                    repo_instance.git.branch('-D', 'cherry_pick_isolation_branch')
-
-                print(f'Found {len(cherry_pick_scenarios)} cherry-pick scenarios.\n', file=sys.stderr)
-                row.cherry_pick_scenarios = str(cherry_pick_scenarios)
-
-            os.chdir('..')
-            shutil.rmtree(repository_folder, onerror=on_rm_error)
+            self.analyse(row, shared_clone)
         except Exception:
             print(traceback.format_exc(), file=sys.stderr)
             row.error = traceback.format_exc()
         finally:
+            shared_clone.remove()
             yield row
 
+    def analyse(self, row: RepositoryDataRow, repository: Callable[[], Repo]) -> bool:
+        """
+        Analysis pass of this mapper, see RepositoryAnalysisMapper.
+        """
+        parsed_merge_scenarios = _parse_scenarios_from_raw_string(row.merge_scenarios)
+        parsed_cherry_pick_scenarios = _parse_scenarios_from_raw_string(row.cherry_pick_scenarios)
+        if not parsed_merge_scenarios and not parsed_cherry_pick_scenarios:
+            return True
+
+        if parsed_merge_scenarios:
+            print(f'Processing merge scenarios in {row.name}.', file=sys.stderr)
+            merge_scenarios = []
+            analyses = _remerge_diff_analyses(
+                self, row.name, [merge_scenario['merge_commit_hash'] for merge_scenario in parsed_merge_scenarios],
+                repository)
+            for merge_scenario in parsed_merge_scenarios:
+                analysis = analyses.get(merge_scenario['merge_commit_hash'])
+                if analysis is None:
+                    print(f'Commit {merge_scenario["merge_commit_hash"]} no longer exists in the repository.'
+                          f'This may happen if there is some time between the execution of this mapper '
+                          f'and the initial dataset collection', file=sys.stderr)
+                    continue
+
+                # We know the remerge output contains a diff. If this contains merge conflict markers, there must
+                # have been a merge conflict
+                if analysis.changes_non_pl_files:
+                    print(f'Merge conflict in non-PL file. Skipping and removing this scenario.\n', file=sys.stderr)
+                    continue
+
+                merge_scenario['number_of_files_with_merge_conflict'] = len(analysis.files_in_merge_conflict)
+                merge_scenario['total_number_of_merge_conflicts'] = analysis.total_number_of_merge_conflicts
+                merge_scenario['files_in_merge_conflict'] = analysis.files_in_merge_conflict
+
+                print(f"\n##### MERGE #######\nDetected {merge_scenario['total_number_of_merge_conflicts']} merge conflicts (merge) in "
+                      f"{merge_scenario['number_of_files_with_merge_conflict']} files. Files: {merge_scenario['files_in_merge_conflict']}", file=sys.stderr)
+
+                if analysis.total_number_of_merge_conflicts > 0:
+                    merge_scenarios.append(merge_scenario)
+
+            print(f'Found {len(merge_scenarios)} merge scenarios.\n', file=sys.stderr)
+            row.merge_scenarios = str(merge_scenarios)
+
+        if parsed_cherry_pick_scenarios:
+            print(f'Processing cherry-pick scenarios in {row.name}.', file=sys.stderr)
+            cherry_pick_scenarios = []
+            for cherry_pick_scenario in parsed_cherry_pick_scenarios:
+                try:
+                    analysis = _cherry_pick_conflict_analysis(self, row.name, cherry_pick_scenario, repository)
+                    if analysis is None:
+                        continue
+                except ValueError as e:
+                    print(
+                        f'Commit {cherry_pick_scenario["cherry_commit"]} appears to no longer exist in the repository: {str(e)}'
+                        f'This may happen if there is some time between the execution of this mapper '
+                        f'and the initial dataset collection. Skipping and removing this scenario.',
+                        file=sys.stderr)
+                    continue
+                except GitCommandError as e:
+                    print(f'Other, unexpected error occurred:\n{e}', file=sys.stderr)
+                    print(f'Current scenario:\n{cherry_pick_scenario}', file=sys.stderr)
+                    continue
+
+                if analysis.conflicts_in_non_pl_files:
+                    print(f'\n\n--CHERRY-PICK--\nMerge conflict with unsupported non-programming-language file. Skipping and removing this scenario.\n' +
+                          '\n'.join(analysis.conflict_messages), file=sys.stderr)
+                    continue
+                if not analysis.has_conflict:
+                    continue
+
+                cherry_pick_scenario['number_of_files_with_merge_conflict'] = len(analysis.files_in_merge_conflict)
+                cherry_pick_scenario['total_number_of_merge_conflicts'] = analysis.total_number_of_merge_conflicts
+                cherry_pick_scenario['files_in_merge_conflict'] = analysis.files_in_merge_conflict
+
+                print(
+                    f"\n###### CHERRY-PICK ######\nDetected {cherry_pick_scenario['total_number_of_merge_conflicts']} merge conflicts (cherry-pick) in "
+                    f"{cherry_pick_scenario['number_of_files_with_merge_conflict']} files. Files: {cherry_pick_scenario['files_in_merge_conflict']}",
+                    file=sys.stderr)
+
+                cherry_pick_scenarios.append(cherry_pick_scenario)
+
+            print(f'Found {len(cherry_pick_scenarios)} cherry-pick scenarios.\n', file=sys.stderr)
+            row.cherry_pick_scenarios = str(cherry_pick_scenarios)
+        return True
+
 def _does_line_contain_non_programming_language_files(line: str) -> bool:
     return not (line.endswith('.java') or line.endswith('.py') or line.endswith('.kt'))
 
-class DetermineFileCommitGramPurityMapper(yt.TypedJob):
+_TARGET_FILE_DIFF = 'target'
+_CANCELLED_FILE_DIFF = 'cancelled'
+_NON_PL_FILE_DIFF = 'non_pl'
+_OTHER_FILE_DIFF = 'other'
+
+
+def _kind_of_file_commit_chain_diff(header: str, scenario: dict, files_with_cancelled_changes: set) -> str:
+    """
+    Returns:
+        str: Which file of a file-commit chain scenario the diff with the header 'diff --git a/PATH b/PATH' is of, the
+            file of the scenario, a file whose changes cancel out over the chain, a non-PL file or another file.
+    """
+    # Extract the file path from the diff line (format: diff --git a/PATH b/PATH)
+    if header.split(' b/')[-1] in files_with_cancelled_changes:
+        return _CANCELLED_FILE_DIFF
+    if f'diff --git a/{scenario["file"]} b/{scenario["file"]}' in header:
+        return _TARGET_FILE_DIFF
+    file_extension = re.search(r'(?:diff --git a\/.*)(\.(?:\w+))(?= )\b', header)
+    if file_extension and file_extension.group(1) not in ['.java', '.py', '.kt']:
+        return _NON_PL_FILE_DIFF
+    return _OTHER_FILE_DIFF
+
+
+def _file_commit_chain_purity(scenario: dict, repo_instance: Repo) -> Optional[float]:
+    """
+    Returns the purity of a file-commit chain scenario, see DetermineFileCommitGramPurityMapper, or None if its commits
+    change a non-PL file. Leaves the newest commit of the chain checked out.
+    """
+    # First, get the list of files that were changed across all commits
+    repo_instance.git.checkout(f'{scenario["newest_commit"]}')
+    commits = repo_instance.git.log(format='%H', n=f'{scenario["times_seen_consecutively"]}')
+    commits = commits.strip().split('\n')
+
+    # Get all files that were changed in any of the commits
+    all_changed_files = set()
+    for commit in commits:
+        # Get list of files changed in this commit
+        changed_files = repo_instance.git.show('--pretty=format:', '--name-only', commit)
+        for line in changed_files.strip().split('\n'):
+            if line:  # Skip empty lines
+                file_path = line
+                all_changed_files.add(file_path)
+
+    # Now reset to the state before the commits and get staged files
+    repo_instance.git.reset(f'HEAD~{scenario["times_seen_consecutively"]}')
+    staged_files = set()
+    status_output = repo_instance.git.status('--porcelain')
+    for line in status_output.strip().split('\n'):
+        if line:  # Skip empty lines
+            # Extract just the filename, ignoring the status (git status --porcelain format is XY PATH)
+            file_path = line.strip().split(' ')[-1]
+            staged_files.add(file_path)
+
+    # Files that were changed but not in staging area have changes that cancel out
+    files_with_cancelled_changes = all_changed_files - staged_files
+
+    repo_instance.git.checkout('-f', f'{scenario["newest_commit"]}')
+
+    changes_in_file = 0
+    total_changes = 0
+    for commit in commits:
+        changes = _count_file_commit_chain_changes_in_patch(repo_instance.git.show(f'{commit}'), scenario,
+                                                            files_with_cancelled_changes)
+        if changes is None:
+            return None
+        changes_in_file, total_changes = changes_in_file + changes[0], total_changes + changes[1]
+
+    if total_changes > 0:
+        return round(changes_in_file / total_changes, 2)
+    return 0
+
+
+def _count_file_commit_chain_changes_in_patch(commit_diff: str, scenario: dict,
+                                              files_with_cancelled_changes: set) -> Optional[Tuple[int, int]]:
+    """
+    Returns:
+        Optional[Tuple[int, int]]: The changed lines of the scenario's file and of all files in the patch of a commit
+            of a file-commit chain, or None if the commit changes a non-PL file.
+    """
+    changes_in_file = 0
+    total_changes = 0
+    in_target_file_diff = False
+    in_cancelled_file_diff = False
+    have_encountered_first_diff = False
+
+    for line in commit_diff.split('\n'):
+        # Skip header until first diff
+        if not line.startswith('diff --git') and not have_encountered_first_diff:
+            continue
+
+        # Start of a new diff section
+        if line.startswith('diff --git'):
+            have_encountered_first_diff = True
+            kind_of_diff = _kind_of_file_commit_chain_diff(line, scenario, files_with_cancelled_changes)
+            if kind_of_diff == _NON_PL_FILE_DIFF:
+                print(f'Skipping and removing file-commit gram scenario due to non-PL file in {line}.', file=sys.stderr)
+                return None
+            in_target_file_diff = kind_of_diff == _TARGET_FILE_DIFF
+            in_cancelled_file_diff = kind_of_diff == _CANCELLED_FILE_DIFF
+        # Ensure we only count changes and not metadata change information and also separate
+        # counting of target and noise files
+        elif not in_cancelled_file_diff:  # Only count changes if not in a cancelled file
+            if in_target_file_diff and (line.startswith('+') or line.startswith('-')) and not (
+                    line.startswith('---') or line.startswith('+++')):
+                changes_in_file += 1
+                total_changes += 1
+            elif (line.startswith('+') or line.startswith('-')) and not (
+                    line.startswith('---') or line.startswith('+++')):
+                total_changes += 1
+    return changes_in_file, total_changes
+
+
+def _paths_of_numstat_path(path: str) -> Tuple[str, str]:
+    """
+    Returns:
+        Tuple[str, str]: The old and the new path of a path printed by `git log --numstat`, which abbreviates renames,
+            e.g. 'src/{a => b}/c.py' or 'a.py => b.py'.
+    """
+    if ' => ' not in path:
+        return path, path
+    abbreviated_rename = re.fullmatch(r'(.*)\{(.*) => (.*)\}(.*)', path)
+    if abbreviated_rename is None:
+        old_path, new_path = path.split(' => ')
+        return old_path, new_path
+    prefix, old_part, new_part, suffix = abbreviated_rename.groups()
+    # e.g. 'src/{ => b}/c.py' for a file moved from src/c.py
+    return (prefix + old_part + suffix).replace('//', '/'), (prefix + new_part + suffix).replace('//', '/')
+
+
+def _files_with_changes_between(repo_instance: Repo, base: str, commit: str) -> set:
+    """
+    Returns:
+        set: The paths `git status --porcelain` lists after `git reset base` with commit checked out, i.e. the files
+            which differ between both trees. As in git status, added files in directories which do not exist in base
+            are listed as their outermost new directory, e.g. 'new/' for new/a.py.
+    """
+    changed_files = set()
+    added_files = []
+    for line in repo_instance.git.diff_tree('-r', '--no-renames', '--name-status', base, commit).splitlines():
+        status, path = line.split('\t', 1)
+        if status == 'A':
+            added_files.append(path)
+        else:
+            changed_files.add(path)
+    if any('/' in path for path in added_files):
+        directories_in_base = set(repo_instance.git.ls_tree('-r', '-d', '--name-only', base).splitlines())
+    for path in added_files:
+        parts = path.split('/')
+        new_directories = [directory for directory in ('/'.join(parts[:depth]) for depth in range(1, len(parts)))
+                           if directory not in directories_in_base]
+        changed_files.add(f'{new_directories[0]}/' if new_directories else path)
+    return changed_files
+
+
+def _file_commit_chain_purity_from_log(scenario: dict, repo_instance: Repo) -> Optional[float]:
+    """
+    Same as _file_commit_chain_purity, but reads the changed files and the patches of all commits of the chain from a
+    single `git log --numstat -p` and the files whose changes cancel out from a tree diff between the ends of the
+    chain. It checks nothing out and resets nothing, so it also works on bare repositories. Only merge commits, whose
+    combined diff git log does not show, are still read with git show.
+    """
+    records = []
+    for (commit, parents), lines in iter_git_log_records(
+            repo_instance.working_dir, '-n', str(scenario['times_seen_consecutively']), '--numstat', '-p',
+            scenario['newest_commit'], fields='%H%x1f%P'):
+        # The numstat lines of a commit precede its patch
+        start_of_patch = next((index for index, line in enumerate(lines) if line.startswith('diff --git')),
+                              len(lines))
+        records.append((commit, len(parents.split()) > 1, lines[:start_of_patch], lines[start_of_patch:]))
+
+    # Get all files that were changed in any of the commits
+    all_changed_files = set()
+    for commit, is_merge, numstat_lines, _ in records:
+        if is_merge:
+            changed_files = repo_instance.git.show('--pretty=format:', '--name-only', commit)
+            all_changed_files.update(line for line in changed_files.strip().split('\n') if line)
+        else:
+            all_changed_files.update(_paths_of_numstat_path(line.split('\t', 2)[2])[1] for line in numstat_lines)
+
+    # Files that were changed but do not differ between the ends of the chain have changes that cancel out
+    base = f'{scenario["newest_commit"]}~{scenario["times_seen_consecutively"]}'
+    files_with_cancelled_changes = all_changed_files - _files_with_changes_between(repo_instance, base,
+                                                                                    scenario['newest_commit'])
+
+    changes_in_file = 0
+    total_changes = 0
+    for commit, is_merge, _, patch_lines in records:
+        patch = repo_instance.git.show(commit) if is_merge else '\n'.join(patch_lines)
+        changes = _count_file_commit_chain_changes_in_patch(patch, scenario, files_with_cancelled_changes)
+        if changes is None:
+            return None
+        changes_in_file, total_changes = changes_in_file + changes[0], total_changes + changes[1]
+
+    if total_changes > 0:
+        return round(changes_in_file / total_changes, 2)
+    return 0
+
+
+def _cached_file_commit_chain_purity(job: RepositoryCloningJob, repository_name: str, scenario: dict,
+                                     repository: Callable[[], Repo]) -> Optional[float]:
+    """
+    Returns the purity of a file-commit chain, see _file_commit_chain_purity_from_log. It is looked up in the
+    analysis cache of job first, so repository is only cloned if it is missing. Git errors are raised and not cached.
+    """
+    def compute(inputs: List[tuple]) -> list:
+        # Wrapped, since a purity of None (a non-PL file in the chain) is a result and None results are not cached
+        return [{'purity': _file_commit_chain_purity_from_log(scenario, repository())}]
+
+    result, = job._cached_analyses('file_commit_chain_purity', repository_name,
+                                   [(scenario['newest_commit'], scenario['times_seen_consecutively'],
+                                     scenario['file'])], compute)
+    return result['purity']
+
+
+def _print_file_commit_chain_git_error(e: GitCommandError):
+    if 'unknown revision or path not in the working tree.' in e.stdout:
+        print(f'A commit in this file-commit gram scenario no longer exists in the repository.'
+              f'This may happen if there is some time between the execution of this mapper '
+              f'and the initial dataset collection', file=sys.stderr)
+    else:
+        print(f'Other, unexpected error occurred - continuing:\n{e}', file=sys.stderr)
+
+class DetermineFileCommitGramPurityMapper(RepositoryCloningJob):
     """
     Mapper that determines the amount of other files present in a file commit gram scenario and the relative
     amount of changes that were made in the file the scenario concerns itself with compared to the overall changes.
@@ -528,108 +1151,15 @@ class DetermineFileCommitGramPurityMapper(yt.TypedJob):
         # Parse the scenario from the row
         scenario = ast.literal_eval(row.scenario)
 
-        # Setup repository if since is data to be processed
-        repository_folder = "__".join(row.name.split("/"))
-        path_to_repository = os.path.join('/slot/sandbox/repos', repository_folder)
+        # Setup repository if since is data to be processed. It is only cloned if the purity is not cached.
+        shared_clone = _SharedClone(self, row.name)
         try:
-            repo_instance = Repo.clone_from(f'https://github.com/{row.name}.git',
-                                            f'{path_to_repository}')
-            repo_instance.git.fetch('--all')
-
-            os.chdir(path_to_repository)
-
             print(f'Processing file-commit gram scenario in {row.name}.', file=sys.stderr)
             try:
-                # First, get the list of files that were changed across all commits
-                repo_instance.git.checkout(f'{scenario["newest_commit"]}')
-                commits = repo_instance.git.log(format='%H', n=f'{scenario["times_seen_consecutively"]}')
-                commits = commits.strip().split('\n')
-
-                # Get all files that were changed in any of the commits
-                all_changed_files = set()
-                for commit in commits:
-                    # Get list of files changed in this commit
-                    changed_files = repo_instance.git.show('--pretty=format:', '--name-only', commit)
-                    for line in changed_files.strip().split('\n'):
-                        if line:  # Skip empty lines
-                            file_path = line
-                            all_changed_files.add(file_path)
-
-                # Now reset to the state before the commits and get staged files
-                repo_instance.git.reset(f'HEAD~{scenario["times_seen_consecutively"]}')
-                staged_files = set()
-                status_output = repo_instance.git.status('--porcelain')
-                for line in status_output.strip().split('\n'):
-                    if line:  # Skip empty lines
-                        # Extract just the filename, ignoring the status (git status --porcelain format is XY PATH)
-                        file_path = line.strip().split(' ')[-1]
-                        staged_files.add(file_path)
-
-                # Files that were changed but not in staging area have changes that cancel out
-                files_with_cancelled_changes = all_changed_files - staged_files
-
-                repo_instance.git.checkout('-f', f'{scenario["newest_commit"]}')
-
-                changes_in_file = 0
-                total_changes = 0
-                contains_non_programming_language_file = False
-                offending_line = None
-                for commit in commits:
-                    commit_diff = repo_instance.git.show(f'{commit}')
-
-                    lines = commit_diff.split('\n')
-                    in_target_file_diff = False
-                    in_cancelled_file_diff = False
-                    have_encountered_first_diff = False
-
-                    for line in lines:
-                        # Skip header until first diff
-                        if not line.startswith('diff --git') and not have_encountered_first_diff:
-                            continue
-
-                        # Start of a new diff section
-                        if line.startswith('diff --git'):
-                            in_target_file_diff = False
-                            in_cancelled_file_diff = False
-                            have_encountered_first_diff = True
-
-                            # Extract the file path from the diff line (format: diff --git a/PATH b/PATH)
-                            file_path = line.split(' b/')[-1]
-                            
-                            # Skip files that have cancelled changes
-                            if file_path in files_with_cancelled_changes:
-                                in_cancelled_file_diff = True
-                                continue
-
-                            if f'diff --git a/{scenario["file"]} b/{scenario["file"]}' in line:
-                                in_target_file_diff = True
-                            else:
-                                file_extension = re.search(r'(?:diff --git a\/.*)(\.(?:\w+))(?= )\b', line)
-                                contains_non_programming_language_file = file_extension and file_extension.group(1) not in ['.java', '.py', '.kt']
-                                if contains_non_programming_language_file:
-                                    offending_line = line
-                                    break
-                        # Ensure we only count changes and not metadata change information and also separate
-                        # counting of target and noise files
-                        elif not in_cancelled_file_diff:  # Only count changes if not in a cancelled file
-                            if in_target_file_diff and (line.startswith('+') or line.startswith('-')) and not (
-                                    line.startswith('---') or line.startswith('+++')):
-                                changes_in_file += 1
-                                total_changes += 1
-                            elif (line.startswith('+') or line.startswith('-')) and not (
-                                    line.startswith('---') or line.startswith('+++')):
-                                total_changes += 1
-
-                    if contains_non_programming_language_file:
-                        break
-
-                if contains_non_programming_language_file:
-                    print(f'Skipping and removing file-commit gram scenario due to non-PL file in {offending_line}.', file=sys.stderr)
+                purity = _cached_file_commit_chain_purity(self, row.name, scenario, shared_clone)
+                if purity is None:
                     return  # skip and remove scenario
-                elif total_changes > 0:
-                    scenario['purity'] = round(changes_in_file / total_changes, 2)
-                else:
-                    scenario['purity'] = 0
+                scenario['purity'] = purity
 
                 print(f"\n##### FILE-COMMIT GRAM #######\nDetected scenario with purity {scenario['purity']}.", file=sys.stderr)
 
@@ -637,19 +1167,39 @@ class DetermineFileCommitGramPurityMapper(yt.TypedJob):
                 yield row
 
             except GitCommandError as e:
-                if 'unknown revision or path not in the working tree.' in e.stdout:
-                    print(f'A commit in this file-commit gram scenario no longer exists in the repository.'
-                          f'This may happen if there is some time between the execution of this mapper '
-                          f'and the initial dataset collection', file=sys.stderr)
-                else:
-                    print(f'Other, unexpected error occurred - continuing:\n{e}', file=sys.stderr)
+                _print_file_commit_chain_git_error(e)
 
         except Exception:
             print(traceback.format_exc(), file=sys.stderr)
             row.error = traceback.format_exc()
         finally:
+            shared_clone.remove()
             yield row
 
+    def analyse(self, row: SampleDataRowV4, repository: Callable[[], Repo]) -> bool:
+        """
+        Analysis pass of this mapper, see SampleAnalysisMapper. Unlike the mapper, it removes the scenarios with non-PL
+        files and keeps every other row once.
+        """
+        if row.sample_type != 'file_commit_chain':
+            return True
+
+        scenario = ast.literal_eval(row.scenario)
+        print(f'Processing file-commit gram scenario in {row.name}.', file=sys.stderr)
+        try:
+            purity = _cached_file_commit_chain_purity(self, row.name, scenario, repository)
+        except GitCommandError as e:
+            _print_file_commit_chain_git_error(e)
+            return True
+        if purity is None:
+            return False
+        scenario['purity'] = purity
+
+        print(f"\n##### FILE-COMMIT GRAM #######\nDetected scenario with purity {scenario['purity']}.", file=sys.stderr)
+
+        row.scenario = str(scenario)
+        return True
+
 class RemoveArchivedReposMapper(yt.TypedJob):
 
     def __call__(self, row: RepositoryDataRow) -> Iterable[RepositoryDataRow]:
@@ -840,14 +1390,22 @@ class RefineDatasetCoarse(yt.TypedJob):
                 yield row
 
 
-class RemoveFileCommitGramScenariosWithAddedFile(yt.TypedJob):
+class RemoveFileCommitGramScenariosWithAddedFile(RepositoryCloningJob):
     """
     Remove file-commit gram scenarios that concern a file that was added in the scenario. Introduce difficulty field.
 
     If the file was created in the chronologically first commit, then we will just get a diff with one hunk that is the
     entire file. Our approach cannot meaningfully improve the git history in this case, since we ask the LLM to select
     hunks. Thus we remove these samples.
+
+    If path_to_commit_indices contains a commit index for the repository, the changed files are read from it and the
+    repository is not cloned.
     """
+    path_to_commit_indices: Optional[str] = None
+
+    def __init__(self, path_to_commit_indices: Optional[str] = None):
+        super(RemoveFileCommitGramScenariosWithAddedFile, self).__init__()
+        self.path_to_commit_indices = path_to_commit_indices
 
     def _compute_file_commit_gram_difficulty(self, scenario) -> str | None:
         if scenario['purity'] == 1:
@@ -865,45 +1423,61 @@ class RemoveFileCommitGramScenariosWithAddedFile(yt.TypedJob):
         elif scenario['number_of_files_with_merge_conflict'] > 1 and scenario['total_number_of_merge_conflicts'] > 1:
             return 'hard'
 
+    def _keep_if_file_was_modified(self, row: SampleDataRow, scenario: dict, show_lines: list) -> Iterable[SampleDataRowV2]:
+        """
+        Yields the row if the first line of `git show --name-status` mentioning the scenario's file does not mark it
+        as added.
+        """
+        print(show_lines, file=sys.stderr)
+        line_with_file = [l for l in show_lines if scenario['file'] in l]
+        print(line_with_file, file=sys.stderr)
+        print(line_with_file[0], file=sys.stderr)
+        if not line_with_file[0].strip().startswith('A'):
+            print('KEEPING scenario, because the file it concerns itself with is MODIFIED\n\n',
+                  file=sys.stderr)
+            row.scenario = str(scenario)
+            yield SampleDataRowV2(row, self._compute_file_commit_gram_difficulty(scenario))
+        else:
+            print('SKIPPING scenario, because the file it concerns itself with is ADDED\n\n', file=sys.stderr)
+
     def __call__(self, row: SampleDataRow) -> Iterable[SampleDataRowV2]:
+        shared_clone = _SharedClone(self, row.name)
+        try:
+            yield from self._process(row, shared_clone)
+        except Exception:
+            print(traceback.format_exc(), file=sys.stderr)
+        finally:
+            shared_clone.remove()
+
+    def _process(self, row: SampleDataRow, repository: Callable[[], Repo]) -> Iterable[SampleDataRowV2]:
+        """
+        Processes a row with the clone repository returns, which is only cloned if the row needs it.
+        """
         scenario = ast.literal_eval(row.scenario)
         if row.scenario_type == 'file_commit_gram':
-            # Setup repository if since is data to be processed
-            repository_folder = "__".join(row.name.split("/"))
-            path_to_repository = os.path.join('/slot/sandbox/repos', repository_folder)
-            try:
-                repo_instance = Repo.clone_from(f'https://github.com/{row.name}.git',
-                                                f'{path_to_repository}')
-                repo_instance.git.fetch('--all')
-                os.chdir(path_to_repository)
-
+            commit_index = _open_commit_index_for(row.name, self.path_to_commit_indices)
+            if commit_index is not None and commit_index.contains(scenario['last_commit']):
                 try:
-                    show_output = repo_instance.git.show(f'{scenario["last_commit"]}',
-                                                         '--pretty=format:"%h - %an, %ar : %s"', '--name-status')
-                    lines = show_output.splitlines()
-                    print(lines, file=sys.stderr)
-                    line_with_file = [l for l in lines if scenario['file'] in l]
-                    print(line_with_file, file=sys.stderr)
-                    print(line_with_file[0], file=sys.stderr)
-                    if not line_with_file[0].strip().startswith('A'):
-                        print('KEEPING scenario, because the file it concerns itself with is MODIFIED\n\n',
-                              file=sys.stderr)
-                        row.scenario = str(scenario)
-                        yield SampleDataRowV2(row, self._compute_file_commit_gram_difficulty(scenario))
-                    else:
-                        print('SKIPPING scenario, because the file it concerns itself with is ADDED\n\n', file=sys.stderr)
-                except ValueError as e:
-                    print(
-                        f'Commit {scenario["last_commit"]} appears to no longer exist in the repository: {str(e)}',
-                        file=sys.stderr)
-                except GitCommandError as e:
-                    print(f'Other, unexpected error occurred:\n{e}', file=sys.stderr)
+                    with commit_index:
+                        # The header emitted by --pretty=format:"%h - %an, %ar : %s" can only mention the file in
+                        # the subject. It never starts with 'A', since it is quoted.
+                        show_lines = [f'"{commit_index.subject(scenario["last_commit"])}"'] + \
+                                     commit_index.name_status(scenario['last_commit'])
+                    yield from self._keep_if_file_was_modified(row, scenario, show_lines)
+                except Exception:
+                    print(traceback.format_exc(), file=sys.stderr)
+                return
 
-            except Exception:
-                print(traceback.format_exc(), file=sys.stderr)
-            finally:
-                os.chdir('..')
-                shutil.rmtree(repository_folder, onerror=on_rm_error)
+            try:
+                show_output = repository().git.show(f'{scenario["last_commit"]}',
+                                                    '--pretty=format:"%h - %an, %ar : %s"', '--name-status')
+                yield from self._keep_if_file_was_modified(row, scenario, show_output.splitlines())
+            except ValueError as e:
+                print(
+                    f'Commit {scenario["last_commit"]} appears to no longer exist in the repository: {str(e)}',
+                    file=sys.stderr)
+            except GitCommandError as e:
+                print(f'Other, unexpected error occurred:\n{e}', file=sys.stderr)
         elif row.scenario_type == 'merge':
             yield SampleDataRowV2(row, self._compute_merge_conflict_difficulty(scenario))
 
@@ -947,69 +1521,117 @@ class RemoveUnneededMetadataMapper(yt.TypedJob):
     def __call__(self, row: SampleDataRowV3) -> Iterable[SampleDataRowV4]:
         yield SampleDataRowV4(row)
 
-class CheckIfFileCommitChainsContainNonPLFiles(yt.TypedJob):
+def _find_non_pl_files_in(name_status_lines: list) -> list:
+    """
+    Returns the files that are not .py, .java, or .kt files from the `git show --name-status` lines of a commit.
+    Files without an extension are considered non-PL files.
+    """
+    non_pl_files = []
+    for line in name_status_lines:
+        # Skip empty lines
+        if not line.strip():
+            continue
+        # Get the file path (last part of the line after status character)
+        file_path = line.strip().split()[-1]
+
+        # Check if file has an extension and if it's not a PL file
+        if '.' in file_path:
+            extension = file_path.split('.')[-1]
+            if extension not in ['py', 'java', 'kt']:
+                non_pl_files.append(file_path)
+        else:
+            # Files without an extension are considered non-PL files
+            non_pl_files.append(file_path)
+    return non_pl_files
+
+def _update_scenario_with_non_pl_files(scenario: dict, non_pl_files: list):
+    contains_non_pl_files = False
+    if non_pl_files:
+        contains_non_pl_files = True
+        print(non_pl_files, file=sys.stderr)
+
+    scenario['contains_non_pl_files'] = contains_non_pl_files
+    if contains_non_pl_files:
+        scenario['non_pl_files'] = non_pl_files
+
+def _find_non_pl_files_in_checked_out_chain(scenario: dict, repo_instance: Repo) -> list:
+    """
+    Returns the non-PL files changed by the commits of a file-commit chain, whose newest commit is checked out.
+    """
+    commits = repo_instance.git.log(format='%H', n=f'{scenario["times_seen_consecutively"]}').strip().split('\n')
+
+    # Check each commit for non-PL files
+    non_pl_files = []
+    for commit in commits:
+        try:
+            show_output = repo_instance.git.show(commit,
+                                             '--pretty=format:"%h - %an, %ar : %s"', '--name-status')
+        except GitCommandError as e:
+            print(f'Failed to process commit {commit}: {e}', file=sys.stderr)
+            continue
+
+        lines = show_output.splitlines()[1:]  # Skip the first line which contains commit info
+        non_pl_files += _find_non_pl_files_in(lines)
+    return non_pl_files
+
+def _cached_non_pl_files_in_chain(job: RepositoryCloningJob, repository_name: str, scenario: dict,
+                                  repository: Callable[[], Repo]) -> list:
+    """
+    Returns the non-PL files changed in a file-commit chain, see _find_non_pl_files_in_checked_out_chain. They are
+    looked up in the analysis cache of job first, so repository is only cloned and checked out if they are missing.
+
+    Raises:
+        GitCommandError: If the newest commit of the chain cannot be checked out. It is not cached.
+    """
+    def compute(inputs: List[tuple]) -> list:
+        repo_instance = repository()
+        repo_instance.git.checkout(f'{scenario["newest_commit"]}')
+        return [_find_non_pl_files_in_checked_out_chain(scenario, repo_instance)]
+
+    non_pl_files, = job._cached_analyses('file_commit_chain_non_pl_files', repository_name,
+                                         [(scenario['newest_commit'], scenario['times_seen_consecutively'])], compute)
+    return non_pl_files
+
+
+class CheckIfFileCommitChainsContainNonPLFiles(RepositoryCloningJob):
     """
     Read only mapper to check if commits in file-commit chains may contain files other than Python, Java, or Kotlin files.
+
+    If path_to_commit_indices contains a commit index for the repository, the commits and their changed files are read
+    from it and the repository is not cloned.
     """
+    path_to_commit_indices: Optional[str] = None
+
+    def __init__(self, path_to_commit_indices: Optional[str] = None):
+        super(CheckIfFileCommitChainsContainNonPLFiles, self).__init__()
+        self.path_to_commit_indices = path_to_commit_indices
 
     def __call__(self, row: SampleDataRowV4) -> Iterable[SampleDataRowV4]:
         scenario = ast.literal_eval(row.scenario)
         if row.sample_type == 'file_commit_chain':
-            repository_folder = "__".join(row.name.split("/"))
-            path_to_repository = os.path.join('/slot/sandbox/repos', repository_folder)
-            try:
-                repo_instance = Repo.clone_from(f'https://github.com/{row.name}.git',
-                                                f'{path_to_repository}')
-                repo_instance.git.fetch('--all')
-                os.chdir(path_to_repository)
+            commit_index = _open_commit_index_for(row.name, self.path_to_commit_indices)
+            if commit_index is not None and commit_index.contains(scenario['newest_commit']):
+                try:
+                    with commit_index:
+                        non_pl_files = []
+                        for commit in commit_index.log(scenario['newest_commit'],
+                                                       scenario['times_seen_consecutively']):
+                            non_pl_files += _find_non_pl_files_in(commit_index.name_status(commit))
+                    _update_scenario_with_non_pl_files(scenario, non_pl_files)
+                    row.scenario = str(scenario)
+                except Exception:
+                    print(traceback.format_exc(), file=sys.stderr)
+
+                if scenario['file'].split('.')[-1] in ['py', 'java', 'kt']:
+                    yield row
+                return
 
+            # The repository is only cloned if the non-PL files of the chain are not cached
+            shared_clone = _SharedClone(self, row.name)
+            try:
                 try:
-                    # First checkout the newest commit
-                    try:
-                        repo_instance.git.checkout(f'{scenario["newest_commit"]}')
-                    except GitCommandError as e:
-                        print(f'Failed to checkout newest commit {scenario["newest_commit"]}: {e}', file=sys.stderr)
-                        yield row
-
-                    commits = repo_instance.git.log(format='%H', n=f'{scenario["times_seen_consecutively"]}').strip().split('\n')
-
-                    # Check each commit for non-PL files
-                    contains_non_pl_files = False
-                    non_pl_files = []
-                    for commit in commits:
-                        try:
-                            show_output = repo_instance.git.show(commit,
-                                                             '--pretty=format:"%h - %an, %ar : %s"', '--name-status')
-                        except GitCommandError as e:
-                            print(f'Failed to process commit {commit}: {e}', file=sys.stderr)
-                            continue
-
-                        lines = show_output.splitlines()[1:]  # Skip the first line which contains commit info
-
-                        # Filter out files that are not .py, .java, or .kt
-                        for line in lines:
-                            # Skip empty lines
-                            if not line.strip():
-                                continue
-                            # Get the file path (last part of the line after status character)
-                            file_path = line.strip().split()[-1]
-
-                            # Check if file has an extension and if it's not a PL file
-                            if '.' in file_path:
-                                extension = file_path.split('.')[-1]
-                                if extension not in ['py', 'java', 'kt']:
-                                    non_pl_files.append(file_path)
-                            else:
-                                # Files without extension are considered non-PL files
-                                non_pl_files.append(file_path)
-
-                    if non_pl_files:
-                        contains_non_pl_files = True
-                        print(non_pl_files, file=sys.stderr)
-
-                    scenario['contains_non_pl_files'] = contains_non_pl_files
-                    if contains_non_pl_files:
-                        scenario['non_pl_files'] = non_pl_files
+                    non_pl_files = _cached_non_pl_files_in_chain(self, row.name, scenario, shared_clone)
+                    _update_scenario_with_non_pl_files(scenario, non_pl_files)
                     row.scenario = str(scenario)
                 except ValueError as e:
                     print(
@@ -1021,11 +1643,241 @@ class CheckIfFileCommitChainsContainNonPLFiles(yt.TypedJob):
             except Exception:
                 print(traceback.format_exc(), file=sys.stderr)
             finally:
-                os.chdir('..')
-                shutil.rmtree(repository_folder, onerror=on_rm_error)
+                shared_clone.remove()
 
                 if scenario['file'].split('.')[-1] in ['py', 'java', 'kt']:
                     yield row
 
         elif row.sample_type == 'merge':
             yield row
+
+    def analyse(self, row: SampleDataRowV4, repository: Callable[[], Repo]) -> bool:
+        """
+        Analysis pass of this mapper, see SampleAnalysisMapper.
+        """
+        if row.sample_type != 'file_commit_chain':
+            return row.sample_type == 'merge'
+
+        scenario = ast.literal_eval(row.scenario)
+        is_programming_language_file = scenario['file'].split('.')[-1] in ['py', 'java', 'kt']
+        try:
+            non_pl_files = _cached_non_pl_files_in_chain(self, row.name, scenario, repository)
+        except GitCommandError as e:
+            print(f'Failed to checkout newest commit {scenario["newest_commit"]}: {e}', file=sys.stderr)
+            return is_programming_language_file
+
+        _update_scenario_with_non_pl_files(scenario, non_pl_files)
+        row.scenario = str(scenario)
+        return is_programming_language_file
+
+
+class MigrateToStructuredScenariosMapper(yt.TypedJob):
+    """
+    Converts the scenarios of a table of repositories from str columns to structured columns, see
+    RepositoryDataRowV2. Fails on scenarios with keys the structs do not have, instead of dropping them.
+    """
+
+    def __call__(self, row: RepositoryDataRow) -> Iterable[RepositoryDataRowV2]:
+        yield to_structured_repository_row(row)
+
+
+class MigrateSamplesToStructuredScenariosMapper(yt.TypedJob):
+    """
+    Converts the scenario of a table of samples from a str column to a structured column, see SampleDataRowV5.
+
+    Should operate on the git_good_bench tables.
+    """
+
+    def __call__(self, row: SampleDataRowV4) -> Iterable[SampleDataRowV5]:
+        yield to_structured_sample_row(row)
+
+
+class _SharedClone:
+    """
+    The clone of a row's repository shared by the analysis passes of an AnalysisPassMapper, or by all rows of a
+    repository in a reducer, callable like the repository argument of the passes. The repository is cloned when a pass
+    first needs it. Since passes check out other commits
+    (e.g. to cherry-pick), the working copy is reset to the initially checked out branch before every later pass.
+    """
+
+    def __init__(self, job: RepositoryCloningJob, repository_name: str):
+        self.job = job
+        self.repository_name = repository_name
+        self.path_to_repository = job._path_to_repository_of(repository_name)
+        self._repo_instance: Optional[Repo] = None
+        self._initial_ref: Optional[str] = None
+        self._clone_error: Optional[Exception] = None
+        self._is_dirty = False
+
+    def __call__(self) -> Repo:
+        if self._clone_error is not None:
+            # The clone service already retried, every further pass would fail the same way
+            raise self._clone_error
+        if self._repo_instance is None:
+            try:
+                self._repo_instance = self.job._clone_repository(self.repository_name, self.path_to_repository)
+                self._repo_instance.git.fetch('--all')
+            except Exception as e:
+                self._clone_error = e
+                raise
+            head = self._repo_instance.head
+            self._initial_ref = head.commit.hexsha if head.is_detached else head.ref.name
+        elif self._is_dirty:
+            # A hard reset also ends cherry-picks a failed pass left in progress
+            self._repo_instance.git.reset('--hard')
+            self._repo_instance.git.checkout('-f', self._initial_ref)
+            if 'cherry_pick_isolation_branch' in self._repo_instance.heads:
+                self._repo_instance.git.branch('-D', 'cherry_pick_isolation_branch')
+        self._is_dirty = False
+        return self._repo_instance
+
+    def end_pass(self):
+        self._is_dirty = self._repo_instance is not None
+
+    def remove(self):
+        if self._repo_instance is not None:
+            self._repo_instance.close()
+        if os.path.exists(self.path_to_repository):
+            shutil.rmtree(self.path_to_repository, onerror=on_rm_error)
+
+
+class AnalysisPassMapper(RepositoryCloningJob):
+    """
+    Base of the mappers which run several analysis passes over a row while cloning its repository only once. A pass is
+    the `analyse` method of the mapper of a post-processing stage, which updates the row like the stage does and returns
+    whether the row is kept. The passes run in the configured order, each on the result of the previous one, like a
+    chain of the separate operations.
+
+    Unlike the separate mappers, every row is emitted at most once. An exception in a pass is printed (and recorded
+    in the row, if it has an error column), and the remaining passes still run.
+    """
+    analysis_passes: dict = {}
+    passes: list = []
+
+    def __init__(self, passes: Optional[list] = None):
+        """
+        Args:
+            passes (Optional[list]): The names of the passes to run, in order. Defaults to all passes of the mapper.
+        """
+        super(AnalysisPassMapper, self).__init__()
+        self.passes = list(passes) if passes is not None else list(self.analysis_passes)
+        unknown_passes = [analysis_pass for analysis_pass in self.passes if analysis_pass not in self.analysis_passes]
+        if unknown_passes:
+            raise ValueError(f'Unknown analysis passes: {unknown_passes}. Supported values: '
+                             f'{list(self.analysis_passes)}')
+
+    def _analyse(self, row, shared_clone: Optional[_SharedClone] = None) -> bool:
+        """
+        Runs the passes over row. The clone is removed afterwards, unless a shared_clone of the repository is given.
+        """
+        owns_clone = shared_clone is None
+        shared_clone = shared_clone if shared_clone is not None else _SharedClone(self, row.name)
+        try:
+            for analysis_pass in self.passes:
+                try:
+                    analysis_job = self.analysis_passes[analysis_pass]()
+                    analysis_job.path_to_analysis_cache = self.path_to_analysis_cache
+                    if not analysis_job.analyse(row, shared_clone):
+                        return False
+                except Exception:
+                    print(traceback.format_exc(), file=sys.stderr)
+                    if hasattr(row, 'error'):
+                        row.error = traceback.format_exc()
+                shared_clone.end_pass()
+            return True
+        finally:
+            if owns_clone:
+                shared_clone.remove()
+
+
+class RepositoryAnalysisMapper(AnalysisPassMapper):
+    """
+    Runs the post-processing stages of the scraped repositories, see REPOSITORY_ANALYSIS_PASSES, with a single clone
+    per repository, e.g. RepositoryAnalysisMapper(['detect_merge_conflicts', 'select_merge_scenarios_with_conflicts']).
+    """
+    analysis_passes = {
+        'detect_merge_conflicts': MergeConflictMapper,
+        'select_merge_scenarios_with_conflicts': SelectOnlyMergeScenariosWithConflictsMapper,
+        'select_merge_scenarios_with_exactly_two_parents': SelectMergeScenariosWithExactlyTwoParents,
+        'remove_file_commit_chains_with_merges': RemoveFileCommitGramScenariosWithMergesMapper,
+        'improve_merge_conflict_scenario_quality': ImproveMergeConflictScenarioQualityMapper,
+    }
+
+    def __call__(self, row: RepositoryDataRow) -> Iterable[RepositoryDataRow]:
+        if self._analyse(row):
+            yield row
+
+
+class SampleAnalysisMapper(AnalysisPassMapper):
+    """
+    Runs the post-processing stages of the finished dataset, see SAMPLE_ANALYSIS_PASSES, with a single clone per
+    sample. Rows which no pass needs a clone for, e.g. merge scenarios, are not cloned at all.
+
+    RemoveFileCommitGramScenariosWithAddedFile is no pass, since it converts SampleDataRow to SampleDataRowV2.
+    """
+    analysis_passes = {
+        'determine_file_commit_chain_purity': DetermineFileCommitGramPurityMapper,
+        'check_file_commit_chains_for_non_pl_files': CheckIfFileCommitChainsContainNonPLFiles,
+    }
+
+    def __call__(self, row: SampleDataRowV4) -> Iterable[SampleDataRowV4]:
+        if self._analyse(row):
+            yield row
+
+
+def _rows_with_shared_clone(job: RepositoryCloningJob, rows: Iterable) -> Iterator[tuple]:
+    """
+    Pairs the rows of a reduce group, i.e. the samples of one repository of a table sorted by name, with a single
+    _SharedClone of their repository. The clone is removed once all rows are processed.
+    """
+    shared_clone = None
+    try:
+        for row in rows:
+            if shared_clone is None:
+                shared_clone = _SharedClone(job, row.name)
+            yield row, shared_clone
+    finally:
+        if shared_clone is not None:
+            shared_clone.remove()
+
+
+class SampleAnalysisReducer(SampleAnalysisMapper):
+    """
+    SampleAnalysisMapper as reducer by name: all samples of a repository share one clone instead of cloning the
+    repository for every sample, e.g. SampleAnalysisReducer(['determine_file_commit_chain_purity']) in place of
+    DetermineFileCommitGramPurityMapper.
+    """
+
+    def __call__(self, rows: RowIterator[SampleDataRowV4]) -> Iterable[SampleDataRowV4]:
+        for row, shared_clone in _rows_with_shared_clone(self, rows):
+            if self._analyse(row, shared_clone):
+                yield row
+
+
+class RemoveFileCommitGramScenariosWithAddedFileReducer(RemoveFileCommitGramScenariosWithAddedFile):
+    """
+    RemoveFileCommitGramScenariosWithAddedFile as reducer by name: all samples of a repository share one clone.
+    """
+
+    def __call__(self, rows: RowIterator[SampleDataRow]) -> Iterable[SampleDataRowV2]:
+        for row, shared_clone in _rows_with_shared_clone(self, rows):
+            try:
+                yield from self._process(row, shared_clone)
+            except Exception:
+                print(traceback.format_exc(), file=sys.stderr)
+
+
+class RemoveDuplicatesReducer(yt.TypedJob):
+    """
+    Keeps the first row of every group of a reduce, see remove_duplicates_in. The rows of a group are sorted by the
+    tie-break columns of the operation, so which duplicate is kept is deterministic.
+    """
+
+    def __call__(self, rows: RowIterator[RepositoryDataRow]) -> Iterable[RepositoryDataRow]:
+        for row in rows:
+            yield row
+            return
+
+
+REPOSITORY_ANALYSIS_PASSES = list(RepositoryAnalysisMapper.analysis_passes)
+SAMPLE_ANALYSIS_PASSES = list(SampleAnalysisMapper.analysis_passes)
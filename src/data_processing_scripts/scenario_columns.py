@@ -0,0 +1,152 @@
+import ast
+import dataclasses
+import typing
+from typing import Optional, Type
+
+import pyarrow as pa
+from pandas import isna
+
+from src.data_processing_scripts.schemas import RepositoryDataRow, RepositoryDataRowV2, SampleDataRowV4, \
+    SampleDataRowV5, MergeScenario, CherryPickScenario, FileCommitChainScenario
+
+# The structured scenario column of each sample type of SampleDataRowV5
+SCENARIO_COLUMN_BY_SAMPLE_TYPE = {
+    'merge': 'merge_scenario',
+    'cherry_pick': 'cherry_pick_scenario',
+    'file_commit_chain': 'file_commit_chain_scenario',
+    'file_commit_gram': 'file_commit_chain_scenario',
+}
+SCENARIO_TYPE_BY_SAMPLE_TYPE = {
+    'merge': MergeScenario,
+    'cherry_pick': CherryPickScenario,
+    'file_commit_chain': FileCommitChainScenario,
+    'file_commit_gram': FileCommitChainScenario,
+}
+_SCENARIO_TYPE_BY_REPOSITORY_COLUMN = {
+    'merge_scenarios': MergeScenario,
+    'cherry_pick_scenarios': CherryPickScenario,
+    'file_commit_gram_scenarios': FileCommitChainScenario,
+}
+
+_ARROW_TYPES = {str: pa.string(), int: pa.int64(), float: pa.float64(), bool: pa.bool_()}
+
+
+def _is_missing(raw_scenarios) -> bool:
+    return raw_scenarios is None or (not isinstance(raw_scenarios, str) and isna(raw_scenarios)) or \
+        raw_scenarios in ['None', 'none', 'nan', 'NaN']
+
+
+def parse_raw_scenarios(raw_scenarios: Optional[str]) -> list:
+    """
+    Parses a list of scenarios stored as a Python literal, e.g. RepositoryDataRow.merge_scenarios. Missing values are
+    parsed as no scenarios.
+    """
+    return [] if _is_missing(raw_scenarios) else ast.literal_eval(raw_scenarios)
+
+
+def scenario_to_struct(scenario: dict, scenario_type: Type):
+    """
+    Args:
+        scenario (dict): A scenario as the scraper and the mappers produce it.
+        scenario_type (Type): MergeScenario, CherryPickScenario or FileCommitChainScenario.
+
+    Returns:
+        The scenario as scenario_type.
+
+    Raises:
+        ValueError: If the scenario has a key scenario_type has no field for, which would otherwise be lost.
+    """
+    field_types = typing.get_type_hints(scenario_type)
+    unknown_keys = scenario.keys() - field_types.keys()
+    if unknown_keys:
+        raise ValueError(f'{scenario_type.__name__} has no fields {sorted(unknown_keys)}, add them to the schema.')
+    # Columns are typed strictly, e.g. a purity of 0 has to be written as 0.0
+    return scenario_type(**{key: float(value) if field_types[key] == Optional[float] and value is not None else value
+                            for key, value in scenario.items()})
+
+
+def struct_to_scenario(struct) -> dict:
+    """
+    Inverse of scenario_to_struct. Accepts the structs as well as their dict form, e.g. read with pyarrow. Fields which
+    are None are omitted, so the scenario equals the one before the conversion.
+    """
+    values = struct if isinstance(struct, dict) else dataclasses.asdict(struct)
+    # pandas reads list fields as numpy arrays
+    return {key: value.tolist() if hasattr(value, 'tolist') else value
+            for key, value in values.items() if value is not None}
+
+
+def raw_scenarios_to_structs(raw_scenarios: Optional[str], scenario_type: Type) -> Optional[list]:
+    """
+    Returns:
+        Optional[list]: The parsed scenarios as scenario_type, None if raw_scenarios is missing.
+    """
+    if _is_missing(raw_scenarios):
+        return None
+    return [scenario_to_struct(scenario, scenario_type) for scenario in ast.literal_eval(raw_scenarios)]
+
+
+def structs_to_raw_scenarios(structs: Optional[list]) -> str:
+    """
+    Inverse of raw_scenarios_to_structs, for stages which still read the str columns.
+    """
+    return str(None if structs is None else [struct_to_scenario(struct) for struct in structs])
+
+
+def to_structured_repository_row(row: RepositoryDataRow) -> RepositoryDataRowV2:
+    values = {field.name: getattr(row, field.name) for field in dataclasses.fields(RepositoryDataRowV2)}
+    for column, scenario_type in _SCENARIO_TYPE_BY_REPOSITORY_COLUMN.items():
+        values[column] = raw_scenarios_to_structs(values[column], scenario_type)
+    return RepositoryDataRowV2(**values)
+
+
+def to_structured_sample_row(row: SampleDataRowV4) -> SampleDataRowV5:
+    values = {field.name: getattr(row, field.name) for field in dataclasses.fields(SampleDataRowV5)
+              if hasattr(row, field.name)}
+    if row.sample_type not in SCENARIO_COLUMN_BY_SAMPLE_TYPE:
+        raise ValueError(f'Unknown sample type {row.sample_type}. Supported values: '
+                         f'{list(SCENARIO_COLUMN_BY_SAMPLE_TYPE)}')
+    values[SCENARIO_COLUMN_BY_SAMPLE_TYPE[row.sample_type]] = scenario_to_struct(
+        ast.literal_eval(row.scenario), SCENARIO_TYPE_BY_SAMPLE_TYPE[row.sample_type])
+    return SampleDataRowV5(**values)
+
+
+def scenario_of(sample) -> dict:
+    """
+    Returns the scenario of a sample as a dict, from the scenario column of SampleDataRow to SampleDataRowV4 or the
+    structured columns of SampleDataRowV5. The sample may also be a row read with pyarrow or pandas.
+    """
+    def value_of(column: str):
+        return sample.get(column) if isinstance(sample, dict) else getattr(sample, column, None)
+
+    raw_scenario = value_of('scenario')
+    if raw_scenario is not None:
+        return ast.literal_eval(raw_scenario) if isinstance(raw_scenario, str) else raw_scenario
+    sample_type = value_of('sample_type') or value_of('scenario_type')
+    return struct_to_scenario(value_of(SCENARIO_COLUMN_BY_SAMPLE_TYPE[sample_type]))
+
+
+def arrow_type_of(python_type) -> pa.DataType:
+    """
+    Returns the Arrow type matching a field type of the schemas, e.g. pa.list_(pa.struct(...)) for
+    Optional[List[MergeScenario]], so the structured tables can be exported to Parquet with the same structure.
+    """
+    origin = typing.get_origin(python_type)
+    if origin is typing.Union:
+        non_null_types = [argument for argument in typing.get_args(python_type) if argument is not type(None)]
+        return arrow_type_of(non_null_types[0])
+    if origin is list:
+        return pa.list_(arrow_type_of(typing.get_args(python_type)[0]))
+    if dataclasses.is_dataclass(python_type):
+        return pa.struct([pa.field(name, arrow_type_of(field_type))
+                          for name, field_type in typing.get_type_hints(python_type).items()])
+    return _ARROW_TYPES[python_type]
+
+
+def arrow_schema_of(row_type: Type) -> pa.Schema:
+    """
+    Returns:
+        pa.Schema: The Arrow schema of a row type, e.g. of SampleDataRowV5.
+    """
+    return pa.schema([pa.field(name, arrow_type_of(field_type))
+                      for name, field_type in typing.get_type_hints(row_type).items()])
@@ -1,5 +1,5 @@
 from yt.wrapper import yt_dataclass
-from typing import Optional
+from typing import List, Optional
 from dataclasses import dataclass
 
 
@@ -231,4 +231,119 @@ class SampleDataRowV4:
     #     self.sample_type = row.sample_type
     #     self.project_size = row.project_size
     #     self.project_activity = row.project_activity
-    #     self.difficulty = row.difficulty
\ No newline at end of file
+    #     self.difficulty = row.difficulty
+
+
+# Structured scenarios. The tables above store scenarios as Python literals in str columns, e.g. str(merge_scenarios),
+# which every reader has to parse with ast.literal_eval. RepositoryDataRowV2 and SampleDataRowV5 store them as
+# (lists of) the structs below instead, see scenario_columns for the conversion. Fields which a scenario did not have
+# (e.g. before the post-processing stage that adds them) are None.
+
+@yt_dataclass
+@dataclass
+class MergeScenario:
+    merge_commit_hash: Optional[str] = None
+    parents: Optional[List[str]] = None
+    had_conflicts: Optional[bool] = None
+    has_conflict: Optional[bool] = None
+    has_manual_changes: Optional[bool] = None
+    number_of_files_with_merge_conflict: Optional[int] = None
+    total_number_of_merge_conflicts: Optional[int] = None
+    files_in_merge_conflict: Optional[List[str]] = None
+
+
+@yt_dataclass
+@dataclass
+class CherryPickScenario:
+    cherry_pick_commit: Optional[str] = None
+    cherry_commit: Optional[str] = None
+    parents: Optional[List[str]] = None
+    has_conflict: Optional[bool] = None
+    number_of_files_with_merge_conflict: Optional[int] = None
+    total_number_of_merge_conflicts: Optional[int] = None
+    files_in_merge_conflict: Optional[List[str]] = None
+
+
+@yt_dataclass
+@dataclass
+class FileCommitChainScenario:
+    file: Optional[str] = None
+    branch: Optional[str] = None
+    # first_commit and last_commit were renamed to newest_commit and oldest_commit by ClarifyDatasetMapper
+    first_commit: Optional[str] = None
+    last_commit: Optional[str] = None
+    newest_commit: Optional[str] = None
+    oldest_commit: Optional[str] = None
+    times_seen_consecutively: Optional[int] = None
+    has_merge_commit: Optional[bool] = None
+    purity: Optional[float] = None
+    contains_non_pl_files: Optional[bool] = None
+    non_pl_files: Optional[List[str]] = None
+
+
+@yt_dataclass
+@dataclass
+class RepositoryDataRowV2:
+    id: int
+    name: Optional[str]
+    is_fork: Optional[bool]
+    commits: Optional[int]
+    branches: Optional[int]
+    releases: Optional[int]
+    forks: Optional[int]
+    main_language: Optional[str]
+    default_branch: Optional[str]
+    license: Optional[str]
+    homepage: Optional[str]
+    watchers: Optional[int]
+    stargazers: Optional[int]
+    contributors: Optional[int]
+    size: Optional[int]
+    created_at: Optional[str]
+    pushed_at: Optional[str]
+    updated_at: Optional[str]
+    total_issues: Optional[float]
+    open_issues: Optional[float]
+    total_pull_requests: Optional[float]
+    open_pull_requests: Optional[float]
+    blank_lines: Optional[float]
+    code_lines: Optional[float]
+    comment_lines: Optional[float]
+    metrics: Optional[str]
+    last_commit: Optional[str]
+    last_commit_sha: Optional[str]
+    has_wiki: Optional[bool]
+    is_archived: Optional[bool]
+    is_disabled: Optional[bool]
+    is_locked: Optional[bool]
+    languages: Optional[str]
+    labels: Optional[str]
+    topics: Optional[str]
+    programming_language: Optional[str]
+    file_commit_gram_scenarios: Optional[List[FileCommitChainScenario]]
+    merge_scenarios: Optional[List[MergeScenario]]
+    cherry_pick_scenarios: Optional[List[CherryPickScenario]]
+    error: Optional[str]
+
+
+@yt_dataclass
+@dataclass
+class SampleDataRowV5:
+    """
+    SampleDataRowV4 with a structured scenario. Only the scenario column of the row's sample_type is set.
+    """
+    id: str
+    name: Optional[str]
+    default_branch: Optional[str]
+    license: Optional[str]
+    stargazers: Optional[int]
+    created_at: Optional[str]
+    topics: Optional[str]
+    programming_language: Optional[str]
+    sample_type: Optional[str]
+    project_size: Optional[str]
+    project_activity: Optional[str]
+    difficulty: Optional[str]
+    merge_scenario: Optional[MergeScenario] = None
+    file_commit_chain_scenario: Optional[FileCommitChainScenario] = None
+    cherry_pick_scenario: Optional[CherryPickScenario] = None
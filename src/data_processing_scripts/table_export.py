@@ -0,0 +1,72 @@
+from dataclasses import asdict
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Type
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.data_processing_scripts.scenario_columns import arrow_schema_of
+
+ROWS_PER_BATCH = 10000
+
+
+def _batches_of(rows: Iterable, rows_per_batch: int) -> Iterator[List]:
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, rows_per_batch))
+        if not batch:
+            return
+        yield batch
+
+
+def to_record_batch(rows: List, schema: pa.Schema) -> pa.RecordBatch:
+    """
+    Converts rows of a row type of the schemas, e.g. SampleDataRowV4, to an Arrow record batch with the schema.
+    """
+    return pa.RecordBatch.from_pylist([asdict(row) for row in rows], schema=schema)
+
+
+def export_rows(rows: Iterable, row_type: Type, path_to_parquet: Optional[str] = None,
+                path_to_csv: Optional[str] = None, rows_per_batch: int = ROWS_PER_BATCH) -> int:
+    """
+    Streams rows of row_type to a Parquet file with one row group per batch of rows and/or to a CSV file in the format
+    of DataFrame.to_csv, i.e. with the row number as first column. Integer columns are written as integers, also if
+    they have missing values. Only one batch of rows is held in memory at a time,
+    so rows can e.g. be read from a table with yt.read_table_structured without materialising the table.
+
+    Args:
+        rows (Iterable): The rows to export.
+        row_type (Type): The row type of the rows, whose Arrow schema the Parquet file gets, see arrow_schema_of.
+        path_to_parquet (Optional[str]): Where to write the Parquet file.
+        path_to_csv (Optional[str]): Where to write the CSV file.
+        rows_per_batch (int): The amount of rows per batch, i.e. per row group of the Parquet file.
+
+    Returns:
+        int: The amount of exported rows.
+    """
+    if path_to_parquet is None and path_to_csv is None:
+        raise ValueError('At least one of path_to_parquet and path_to_csv is required.')
+    schema = arrow_schema_of(row_type)
+    parquet_writer = pq.ParquetWriter(path_to_parquet, schema) if path_to_parquet is not None else None
+    csv_file = open(path_to_csv, 'w', newline='') if path_to_csv is not None else None
+    number_of_rows = 0
+    try:
+        for rows_of_batch in _batches_of(rows, rows_per_batch):
+            record_batch = to_record_batch(rows_of_batch, schema)
+            if parquet_writer is not None:
+                parquet_writer.write_batch(record_batch, row_group_size=rows_per_batch)
+            if csv_file is not None:
+                # Integers stay integers in batches with missing values, so the CSV does not depend on the batches
+                batch_df = record_batch.to_pandas(integer_object_nulls=True)
+                batch_df.index += number_of_rows
+                batch_df.to_csv(csv_file, header=number_of_rows == 0)
+            number_of_rows += len(rows_of_batch)
+        if csv_file is not None and number_of_rows == 0:
+            # Like DataFrame.to_csv of an empty table, only write the header
+            schema.empty_table().to_pandas(integer_object_nulls=True).to_csv(csv_file)
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
+        if csv_file is not None:
+            csv_file.close()
+    return number_of_rows
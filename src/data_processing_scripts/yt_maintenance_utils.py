@@ -8,9 +8,15 @@ from src.data_processing_scripts.mappers import ErrorFilteringMapper, MergeConfl
     SelectMergeScenariosWithExactlyTwoParents, ImproveMergeConflictScenarioQualityMapper, \
     DetermineFileCommitGramPurityMapper, TransformDatasetToOneRowPerSample, RemoveArchivedReposMapper, \
     RefineDatasetCoarse, RemoveFileCommitGramScenariosWithAddedFile, ClarifyDatasetMapper, RemoveUnneededMetadataMapper, \
-    CheckIfFileCommitChainsContainNonPLFiles
+    CheckIfFileCommitChainsContainNonPLFiles, RepositoryAnalysisMapper, SampleAnalysisMapper, REPOSITORY_ANALYSIS_PASSES, \
+    SAMPLE_ANALYSIS_PASSES, MigrateToStructuredScenariosMapper, MigrateSamplesToStructuredScenariosMapper, \
+    SampleAnalysisReducer, RemoveFileCommitGramScenariosWithAddedFileReducer, RemoveDuplicatesReducer
 from src.data_processing_scripts.mappers import RepositoryDataMapper
-from src.data_processing_scripts.schemas import RepositoryDataRow, SampleDataRow, SampleDataRowV2, SampleDataRowV3, SampleDataRowV4
+from src.data_processing_scripts.schemas import RepositoryDataRow, SampleDataRow, SampleDataRowV2, SampleDataRowV3, SampleDataRowV4, \
+    RepositoryDataRowV2, SampleDataRowV5
+from src.data_processing_scripts.table_export import export_rows
+from src.repository_data_scraper.top_k_chains import TOP_K_GROUP_BY_REPOSITORY
+from typing import Optional
 import pandas as pd
 
 def parse_table_into_dataframe(table_path: str) -> pd.DataFrame:
@@ -18,22 +24,53 @@ def parse_table_into_dataframe(table_path: str) -> pd.DataFrame:
     return pd.DataFrame([asdict(row) for row in dataset])
 
 def parse_table_into_csv_at(output_path: str, table_path: str):
-    dataset_df = parse_table_into_dataframe(table_path)
-    dataset_df.to_csv(output_path)
-
-def remove_duplicates_in(table_path: str, yt_client: yt.YtClient):
-    dataset_df = parse_table_into_dataframe(table_path)
-    dataset_df.drop_duplicates(inplace=True, subset=['name'])
-
-    yt_client.remove(table_path)
-    src_table_path = yt.TablePath(
-        table_path,
-        schema=TableSchema.from_row_type(RepositoryDataRow)
-    )
-    yt_client.write_table(
-        table=src_table_path,
-        input_stream=dataset_df.to_dict(orient="records"),
-    )
+    # Streams the table in batches instead of materialising it as a DataFrame, see export_rows
+    dataset = yt.read_table_structured(table=table_path, row_type=SampleDataRowV4)
+    export_rows(dataset, SampleDataRowV4, path_to_csv=output_path)
+
+def export_table_to_parquet_at(output_path: str, table_path: str, row_type=SampleDataRowV4,
+                               csv_output_path: Optional[str] = None):
+    """
+    Exports a table of row_type, e.g. SampleDataRowV5 for the structured dataset, to a Parquet file with one row group
+    per batch of rows, and optionally to a CSV file as well. Memory stays bounded by the size of a batch.
+    """
+    dataset = yt.read_table_structured(table=table_path, row_type=row_type)
+    export_rows(dataset, row_type, path_to_parquet=output_path, path_to_csv=csv_output_path)
+
+def remove_duplicates_in(table_path: str, yt_client: yt.YtClient, key_columns: Optional[list] = None,
+                         tie_break_columns: Optional[list] = None):
+    """
+    Removes the rows of a table of repositories with the same key_columns (default: name) on the cluster, with a sort
+    and a reduce. Of the duplicates, the row that sorts first by tie_break_columns (default: id) is kept. The table is
+    only replaced once the deduplicated table is complete, within a transaction, so a failure leaves it as it was.
+    See deduplication.remove_duplicates for the same without a cluster.
+    """
+    key_columns = key_columns if key_columns is not None else ['name']
+    tie_break_columns = tie_break_columns if tie_break_columns is not None else ['id']
+    sort_by = key_columns + [column for column in tie_break_columns if column not in key_columns]
+    sorted_table = table_path + '_sorted_for_deduplication'
+    dst_table = table_path + '_deduplicated'
+
+    with yt_client.Transaction():
+        yt_client.run_sort(table_path, sorted_table, sort_by=sort_by)
+        dst_table_path = yt.TablePath(dst_table, schema=TableSchema.from_row_type(RepositoryDataRow))
+        yt_client.create('table', dst_table_path)
+
+        yt_client.run_reduce(
+            RemoveDuplicatesReducer(),
+            source_table=sorted_table,
+            destination_table=dst_table,
+            reduce_by=key_columns,
+            sort_by=sort_by,
+            spec={
+                "reducer": {
+                    "docker_image": "<docker image with python and ytsaurus and yson bindings>",
+                    "cpu_limit": 1
+                }
+            }
+        )
+        yt_client.remove(sorted_table)
+        yt_client.move(dst_table, table_path, force=True)
 
 def handle_errors_in_dataset(yt_client: yt.YtClient, src_table: str, dst_table: str):
     dst_table_path = yt.TablePath(dst_table, schema=TableSchema.from_row_type(RepositoryDataRow))
@@ -133,11 +170,14 @@ def remove_file_commit_gram_scenarios_with_merges(yt_client: yt.YtClient, src_ta
         }
     )
 
-def run_repository_data_mapper(yt_client: yt.YtClient, src_table: str, dst_table: str):
+def run_repository_data_mapper(yt_client: yt.YtClient, src_table: str, dst_table: str,
+                               top_k_chains: Optional[int] = None, top_k_group_by: str = TOP_K_GROUP_BY_REPOSITORY,
+                               max_chain_length: Optional[int] = None):
     job_count = len(list(yt.read_table_structured(src_table, RepositoryDataRow)))
 
     yt_client.run_map(
-        RepositoryDataMapper(sliding_window_size=3),
+        RepositoryDataMapper(sliding_window_size=3, top_k_chains=top_k_chains, top_k_group_by=top_k_group_by,
+                             max_chain_length=max_chain_length),
         src_table,
         dst_table,
         job_count=job_count,
@@ -268,13 +308,14 @@ def upload_dataset_to(table_path: str, path_to_local_dataset: str, yt_client: yt
         input_stream=dataset_df.to_dict(orient="records"),
     )
 
-def remove_file_commit_gram_scenarios_concerning_added_file(yt_client: yt.YtClient, src_table: str):
+def remove_file_commit_gram_scenarios_concerning_added_file(yt_client: yt.YtClient, src_table: str,
+                                                            path_to_commit_indices: Optional[str] = None):
     dst_table = '/'.join(src_table.split('/')[:-1] + ['dataset_row_wise_samples_added_file_removed_difficulty_added'])
     dst_table_path = yt.TablePath(dst_table, schema=TableSchema.from_row_type(SampleDataRowV2))
     yt_client.create('table', dst_table_path)
 
     yt_client.run_map(
-        RemoveFileCommitGramScenariosWithAddedFile(),
+        RemoveFileCommitGramScenariosWithAddedFile(path_to_commit_indices=path_to_commit_indices),
         source_table=src_table,
         destination_table=dst_table,
         job_count=1000,
@@ -326,13 +367,14 @@ def remove_unneeded_metadata_mapper(yt_client: yt.YtClient, src_table: str):
         }
     )
 
-def check_if_file_commit_chain_contains_non_pl_files_mapper(yt_client: yt.YtClient, src_table: str):
+def check_if_file_commit_chain_contains_non_pl_files_mapper(yt_client: yt.YtClient, src_table: str,
+                                                            path_to_commit_indices: Optional[str] = None):
     dst_table = src_table + '_checked'
     dst_table_path = yt.TablePath(dst_table, schema=TableSchema.from_row_type(SampleDataRowV4))
     yt_client.create('table', dst_table_path)
 
     yt_client.run_map(
-        CheckIfFileCommitChainsContainNonPLFiles(),
+        CheckIfFileCommitChainsContainNonPLFiles(path_to_commit_indices=path_to_commit_indices),
         source_table=src_table,
         destination_table=dst_table,
         job_count=1750,
@@ -348,16 +390,180 @@ def check_if_file_commit_chain_contains_non_pl_files_mapper(yt_client: yt.YtClie
         }
     )
 
+def analyse_repositories(yt_client: yt.YtClient, src_table: str, passes: Optional[list] = None,
+                         dst_table: Optional[str] = None):
+    """
+    Runs the given REPOSITORY_ANALYSIS_PASSES (by default all of them, in pipeline order) in a single operation which
+    clones every repository once, instead of one operation and clone per pass.
+    """
+    passes = passes if passes is not None else REPOSITORY_ANALYSIS_PASSES
+    dst_table = dst_table if dst_table is not None else src_table + '_analysed'
+    dst_table_path = yt.TablePath(dst_table, schema=TableSchema.from_row_type(RepositoryDataRow))
+    yt_client.create('table', dst_table_path)
+
+    yt_client.run_map(
+        RepositoryAnalysisMapper(passes),
+        source_table=src_table,
+        destination_table=dst_table,
+        job_count=3000,
+        spec={
+            "mapper": {
+                "docker_image": "<docker image with python and ytsaurus and yson bindings>",
+                "memory_limit": 1 * 1024 ** 3,
+                "memory_reserve_factor": 0.125,
+                "tmpfs_size": 8 * 1024 ** 3,
+                "tmpfs_path": "repos",
+                "cpu_limit": 1
+            }
+        }
+    )
+
+def analyse_samples(yt_client: yt.YtClient, src_table: str, passes: Optional[list] = None,
+                    dst_table: Optional[str] = None):
+    """
+    Runs the given SAMPLE_ANALYSIS_PASSES (by default all of them) on the finished dataset in a single operation which
+    clones the repository of every sample once.
+    """
+    passes = passes if passes is not None else SAMPLE_ANALYSIS_PASSES
+    dst_table = dst_table if dst_table is not None else src_table + '_analysed'
+    dst_table_path = yt.TablePath(dst_table, schema=TableSchema.from_row_type(SampleDataRowV4))
+    yt_client.create('table', dst_table_path)
+
+    yt_client.run_map(
+        SampleAnalysisMapper(passes),
+        source_table=src_table,
+        destination_table=dst_table,
+        job_count=7932,
+        spec={
+            "mapper": {
+                "docker_image": "<docker image with python and ytsaurus and yson bindings>",
+                "memory_limit": 1 * 1024 ** 3,
+                "memory_reserve_factor": 0.125,
+                "tmpfs_size": 8 * 1024 ** 3,
+                "tmpfs_path": "repos",
+                "cpu_limit": 1
+            }
+        }
+    )
+
+def _sort_by_repository(yt_client: yt.YtClient, src_table: str) -> str:
+    """
+    Returns:
+        str: A copy of src_table sorted by name, the input of the reducers which process all samples of a repository
+            with a single clone.
+    """
+    sorted_table = src_table + '_sorted_by_name'
+    yt_client.run_sort(src_table, sorted_table, sort_by=['name'])
+    return sorted_table
+
+def analyse_samples_by_repository(yt_client: yt.YtClient, src_table: str, passes: Optional[list] = None,
+                                  dst_table: Optional[str] = None):
+    """
+    Like analyse_samples, but clones every repository once for all of its samples instead of once per sample, e.g.
+    with passes=['determine_file_commit_chain_purity'] in place of improve_file_commit_gram_quality.
+    """
+    passes = passes if passes is not None else SAMPLE_ANALYSIS_PASSES
+    dst_table = dst_table if dst_table is not None else src_table + '_analysed'
+    dst_table_path = yt.TablePath(dst_table, schema=TableSchema.from_row_type(SampleDataRowV4))
+    yt_client.create('table', dst_table_path)
+
+    yt_client.run_reduce(
+        SampleAnalysisReducer(passes),
+        source_table=_sort_by_repository(yt_client, src_table),
+        destination_table=dst_table,
+        reduce_by=['name'],
+        job_count=3000,
+        spec={
+            "reducer": {
+                "docker_image": "<docker image with python and ytsaurus and yson bindings>",
+                "memory_limit": 1 * 1024 ** 3,
+                "memory_reserve_factor": 0.125,
+                "tmpfs_size": 8 * 1024 ** 3,
+                "tmpfs_path": "repos",
+                "cpu_limit": 1
+            }
+        }
+    )
+
+def remove_file_commit_gram_scenarios_concerning_added_file_by_repository(yt_client: yt.YtClient, src_table: str,
+                                                                          path_to_commit_indices: Optional[str] = None):
+    """
+    Like remove_file_commit_gram_scenarios_concerning_added_file, but clones every repository once for all of its
+    samples instead of once per sample.
+    """
+    dst_table = '/'.join(src_table.split('/')[:-1] + ['dataset_row_wise_samples_added_file_removed_difficulty_added'])
+    dst_table_path = yt.TablePath(dst_table, schema=TableSchema.from_row_type(SampleDataRowV2))
+    yt_client.create('table', dst_table_path)
+
+    yt_client.run_reduce(
+        RemoveFileCommitGramScenariosWithAddedFileReducer(path_to_commit_indices=path_to_commit_indices),
+        source_table=_sort_by_repository(yt_client, src_table),
+        destination_table=dst_table,
+        reduce_by=['name'],
+        job_count=1000,
+        spec={
+            "reducer": {
+                "docker_image": "<docker image with python and ytsaurus and yson bindings>",
+                "memory_limit": 1 * 1024 ** 3,
+                "memory_reserve_factor": 0.125,
+                "tmpfs_size": 8 * 1024 ** 3,
+                "tmpfs_path": "repos",
+                "cpu_limit": 1
+            }
+        }
+    )
+
+def migrate_to_structured_scenarios(yt_client: yt.YtClient, src_table: str):
+    dst_table = src_table + '_structured'
+    dst_table_path = yt.TablePath(dst_table, schema=TableSchema.from_row_type(RepositoryDataRowV2))
+    yt_client.create('table', dst_table_path)
+
+    yt_client.run_map(
+        MigrateToStructuredScenariosMapper(),
+        source_table=src_table,
+        destination_table=dst_table,
+        job_count=100,
+        spec={
+            "mapper": {
+                "docker_image": "<docker image with python and ytsaurus and yson bindings>",
+                "memory_limit": 4 * 1024 ** 3,
+                "cpu_limit": 1
+            }
+        }
+    )
+
+def migrate_samples_to_structured_scenarios(yt_client: yt.YtClient, src_table: str):
+    dst_table = src_table + '_structured'
+    dst_table_path = yt.TablePath(dst_table, schema=TableSchema.from_row_type(SampleDataRowV5))
+    yt_client.create('table', dst_table_path)
+
+    yt_client.run_map(
+        MigrateSamplesToStructuredScenariosMapper(),
+        source_table=src_table,
+        destination_table=dst_table,
+        job_count=1,
+        spec={
+            "mapper": {
+                "docker_image": "<docker image with python and ytsaurus and yson bindings>",
+                "cpu_limit": 1
+            }
+        }
+    )
+
 def main():
     parser = argparse.ArgumentParser(description='Process some tables in YTsaurus.')
     parser.add_argument('--src-table', type=str, help='Source table path')
     parser.add_argument('--dst-table', type=str, help='Destination table path')
     parser.add_argument('--csv-dataset-path', type=str, help='Path at which to persist CSV of dataset')
+    parser.add_argument('--parquet-dataset-path', type=str, help='Path at which to persist Parquet of dataset')
     args = parser.parse_args()
 
     yt_client = yt.YtClient(proxy=os.environ["YT_PROXY"], token=os.environ["YT_TOKEN"],
                             config={'pickling': {'ignore_system_modules': True}})
-    parse_table_into_csv_at('../../data/git_good_bench.csv', args.src_table)
+    if args.parquet_dataset_path:
+        export_table_to_parquet_at(args.parquet_dataset_path, args.src_table, csv_output_path=args.csv_dataset_path)
+    else:
+        parse_table_into_csv_at('../../data/git_good_bench.csv', args.src_table)
 
 if __name__ == '__main__':
     main()
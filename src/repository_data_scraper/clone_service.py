@@ -0,0 +1,251 @@
+import asyncio
+import os
+import random
+import re
+import shutil
+import sys
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from time import monotonic
+from typing import Callable, List, Optional
+
+from git import GitCommandError, Repo
+
+# stderr of git clone for failures that are worth retrying. Everything else, e.g. a deleted repository, is permanent.
+_TRANSIENT_ERROR_PATTERN = re.compile(
+    r'Could not resolve host|Connection timed out|Connection reset|Operation timed out|early EOF|RPC failed|'
+    r'remote end hung up|unexpected disconnect|returned error: (?:429|5\d\d)|rate limit|HTTP/2 stream|'
+    r'transfer closed|SSL_ERROR|gnutls_handshake', re.IGNORECASE)
+_THROTTLING_ERROR_PATTERN = re.compile(r'returned error: 429|rate limit', re.IGNORECASE)
+
+
+def github_url(repository_name: str) -> str:
+    """
+    Returns:
+        str: The URL GitHub serves the repository '<owner>/<repository>' at.
+    """
+    return f'https://github.com/{repository_name}.git'
+
+
+def template_url_rewrite(url_template: str) -> Callable[[str], str]:
+    """
+    Returns a URL rewrite filling url_template with the repository's name, e.g.
+    'https://mirror.example.com/{owner}/{repository}.git' or 'file:///data/mirrors/{folder}.git'.
+
+    The placeholders are {name} ('<owner>/<repository>'), {owner}, {repository} and {folder} ('<owner>__<repository>',
+    the folder name used for clones in this project).
+    """
+    def rewrite(repository_name: str) -> str:
+        owner, repository = repository_name.split('/', 1)
+        return url_template.format(name=repository_name, owner=owner, repository=repository,
+                                   folder=f'{owner}__{repository}')
+    return rewrite
+
+
+def mirror_url_rewrite(path_to_mirrors: str, fall_back_to_github: bool = True) -> Callable[[str], str]:
+    """
+    Returns a URL rewrite to the local bare mirror of a repository, '<path_to_mirrors>/<owner>__<repository>.git' or
+    '<path_to_mirrors>/<owner>/<repository>.git'.
+
+    Args:
+        path_to_mirrors (str): The directory containing the mirrors.
+        fall_back_to_github (bool): Whether to clone repositories without mirror from GitHub. If False, their URL is
+            the (missing) mirror, so cloning fails permanently.
+    """
+    def rewrite(repository_name: str) -> str:
+        owner, repository = repository_name.split('/', 1)
+        candidates = [os.path.join(path_to_mirrors, f'{owner}__{repository}.git'),
+                      os.path.join(path_to_mirrors, owner, f'{repository}.git')]
+        for candidate in candidates:
+            if os.path.isdir(candidate):
+                return f'file://{os.path.abspath(candidate)}'
+        return github_url(repository_name) if fall_back_to_github else f'file://{os.path.abspath(candidates[0])}'
+    return rewrite
+
+
+class TokenBucket:
+    """
+    Asynchronous token bucket. Tokens are refilled at rate per second up to capacity, each clone takes one.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        if rate <= 0 or capacity < 1:
+            raise ValueError('rate must be positive and capacity at least 1.')
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """
+        Hands out no tokens for the next seconds, e.g. because the remote throttled us.
+        """
+        self._paused_until = max(self._paused_until, monotonic() + seconds)
+        self._tokens = 0.0
+
+
+@dataclass
+class CloneStatistics:
+    clones: int = 0
+    attempts: int = 0
+    retries: int = 0
+    throttled: int = 0
+    failures: int = 0
+
+
+class CloneService:
+    """
+    Clones repositories on an asyncio event loop with bounded concurrency, token bucket rate limiting, retries with
+    exponential backoff and jitter for transient failures and a configurable URL rewrite, e.g. to a local mirror.
+
+    Coroutines can await clone directly. Synchronous callers, such as the clone threads of the local runner or the
+    YTsaurus mappers, use clone_repository, which runs the clone on a background event loop owned by the service. A
+    throttled clone (HTTP 429) pauses the token bucket, so all other clones back off as well.
+    """
+
+    def __init__(self, max_concurrency: int = 4, rate_per_second: Optional[float] = None, burst: int = 4,
+                 max_attempts: int = 5, initial_backoff_seconds: float = 2.0, max_backoff_seconds: float = 120.0,
+                 url_rewrite: Callable[[str], str] = github_url, clone_arguments: Optional[List[str]] = None):
+        """
+        Args:
+            max_concurrency (int): The maximum amount of concurrent clones.
+            rate_per_second (Optional[float]): If set, at most this many clones are started per second on average.
+            burst (int): The amount of clones that may be started at once if the rate limit allows.
+            max_attempts (int): How often a clone is attempted if it fails transiently.
+            initial_backoff_seconds (float): The wait before the first retry. Doubles with every further retry.
+            max_backoff_seconds (float): The maximum wait before a retry.
+            url_rewrite (Callable[[str], str]): Maps the name '<owner>/<repository>' to the URL to clone from.
+            clone_arguments (Optional[List[str]]): Additional arguments to git clone, e.g. ['--filter=blob:none'].
+        """
+        if max_concurrency < 1 or max_attempts < 1:
+            raise ValueError('max_concurrency and max_attempts must be at least 1.')
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self.initial_backoff_seconds = initial_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.url_rewrite = url_rewrite
+        self.clone_arguments = clone_arguments or []
+        self.statistics = CloneStatistics()
+
+        # Created lazily on the loop the service is used on
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._token_bucket: Optional[TokenBucket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_lock = threading.Lock()
+
+    def _ensure_primitives(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            if self.rate_per_second is not None:
+                self._token_bucket = TokenBucket(self.rate_per_second, self.burst)
+
+    async def clone(self, repository_name: str, path_to_repository: str, *arguments: str) -> str:
+        """
+        Clones the repository into path_to_repository.
+
+        Args:
+            repository_name (str): The name of the repository, '<owner>/<repository>'.
+            path_to_repository (str): Where to clone the repository to.
+            *arguments (str): Additional arguments to git clone for this clone, e.g. '--bare'.
+
+        Returns:
+            str: path_to_repository.
+
+        Raises:
+            GitCommandError: If the clone failed permanently or max_attempts times transiently. Like for
+                Repo.clone_from, stderr contains 'already exists' if path_to_repository is not empty.
+        """
+        self._ensure_primitives()
+        url = self.url_rewrite(repository_name)
+        command = ['git', 'clone', *self.clone_arguments, *arguments, url, path_to_repository]
+
+        for attempt in range(1, self.max_attempts + 1):
+            if self._token_bucket is not None:
+                await self._token_bucket.acquire()
+            async with self._semaphore:
+                self.statistics.attempts += 1
+                did_exist = os.path.exists(path_to_repository)
+                process = await asyncio.create_subprocess_exec(
+                    *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                    env={**os.environ, 'GIT_TERMINAL_PROMPT': '0'})
+                _, stderr = await process.communicate()
+            stderr = stderr.decode('utf-8', errors='replace')
+            if process.returncode == 0:
+                self.statistics.clones += 1
+                return path_to_repository
+
+            is_transient = bool(_TRANSIENT_ERROR_PATTERN.search(stderr))
+            if not is_transient or attempt == self.max_attempts:
+                self.statistics.failures += 1
+                raise GitCommandError(command, process.returncode, stderr)
+
+            # Remove the partial clone, so the retry does not fail with 'already exists'
+            if not did_exist:
+                shutil.rmtree(path_to_repository, ignore_errors=True)
+            backoff = min(self.max_backoff_seconds, self.initial_backoff_seconds * 2 ** (attempt - 1))
+            backoff *= random.uniform(0.5, 1.5)
+            if _THROTTLING_ERROR_PATTERN.search(stderr):
+                self.statistics.throttled += 1
+                if self._token_bucket is not None:
+                    self._token_bucket.pause(backoff)
+            self.statistics.retries += 1
+            print(f'Cloning {repository_name} failed (attempt {attempt}/{self.max_attempts}), retrying in '
+                  f'{round(backoff, 1)}s: {stderr.strip()}', file=sys.stderr)
+            await asyncio.sleep(backoff)
+
+    def submit(self, repository_name: str, path_to_repository: str, *arguments: str) -> Future:
+        """
+        Schedules a clone on the background event loop of the service, see clone.
+
+        Returns:
+            Future: Resolves to path_to_repository.
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever, name='clone-service',
+                                                     daemon=True)
+                self._loop_thread.start()
+        return asyncio.run_coroutine_threadsafe(self.clone(repository_name, path_to_repository, *arguments),
+                                                self._loop)
+
+    def clone_repository(self, repository_name: str, path_to_repository: str, *arguments: str) -> Repo:
+        """
+        Synchronous drop-in for Repo.clone_from, see clone. Safe to call from several threads at once.
+
+        Returns:
+            Repo: The cloned repository.
+        """
+        return Repo(self.submit(repository_name, path_to_repository, *arguments).result())
+
+    def close(self):
+        """
+        Stops the background event loop, if it was started.
+        """
+        with self._loop_lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop_thread.join()
+                self._loop.close()
+                self._loop, self._loop_thread = None, None
+                self._semaphore, self._token_bucket = None, None
@@ -0,0 +1,332 @@
+import codecs
+import hashlib
+import heapq
+import os
+import sqlite3
+import subprocess
+from dataclasses import dataclass
+from itertools import count
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Bump whenever the schema or the semantics of a column change. Indices of another version are rebuilt.
+COMMIT_INDEX_VERSION = '1'
+
+_FIELD_SEPARATOR = '\x1f'
+_HEADER_TERMINATOR = '\x1e'
+_RECORD_SEPARATOR = '\x00'
+
+
+@dataclass
+class FileChange:
+    """
+    One file changed by a commit, as listed by `git show --name-status`.
+
+    For merge commits the change type is the combined one (e.g. 'MM'), as shown by `git show`, and added/deleted are
+    None. For renames and copies change_type carries the similarity (e.g. 'R100') and old_path is set.
+    """
+    change_type: str
+    path: str
+    old_path: Optional[str] = None
+    added: Optional[int] = None
+    deleted: Optional[int] = None
+
+    def to_name_status_line(self) -> str:
+        """
+        Returns:
+            str: The line `git show --name-status` prints for this change.
+        """
+        if self.old_path is not None:
+            return f'{self.change_type}\t{self.old_path}\t{self.path}'
+        return f'{self.change_type}\t{self.path}'
+
+
+def iter_git_log_records(path_to_repository: str, *log_args: str, fields: str = '%H%x1f%P',
+                         stdin_lines: Optional[Iterable[str]] = None) -> Iterator[Tuple[List[str], List[str]]]:
+    """
+    Streams `git log` output record by record, without buffering the whole output.
+
+    Args:
+        path_to_repository (str): The repository to run git log in.
+        *log_args (str): Additional arguments to git log, e.g. '--all', '--name-status'.
+        fields (str): The pretty format placeholders of the header of each record, separated by %x1f. Fields may
+            span multiple lines, e.g. %B.
+        stdin_lines (Optional[Iterable[str]]): Lines written to git log, e.g. revisions together with '--stdin'.
+
+    Yields:
+        Tuple[List[str], List[str]]: The header fields and the non-empty diff output lines of each commit.
+    """
+    process = subprocess.Popen(['git', '-C', path_to_repository, 'log', f'--format=%x00{fields}%x1e', *log_args],
+                               stdin=subprocess.PIPE if stdin_lines is not None else None,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        if stdin_lines is not None:
+            # git log reads all of stdin before it prints the first commit, so this cannot block on a full stdout
+            process.stdin.write(''.join(f'{line}\n' for line in stdin_lines).encode('utf-8'))
+            process.stdin.close()
+        # Characters may be split across chunks, the incremental decoder keeps their first bytes until the next chunk
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        buffer = ''
+        for chunk in iter(lambda: process.stdout.read(1 << 16), b''):
+            buffer += decoder.decode(chunk)
+            *records, buffer = buffer.split(_RECORD_SEPARATOR)
+            for record in records:
+                if record:
+                    yield _parse_log_record(record)
+        buffer += decoder.decode(b'', final=True)
+        if buffer:
+            yield _parse_log_record(buffer)
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read().decode('utf-8', errors='replace')
+        process.stderr.close()
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, process.args, stderr=stderr)
+
+
+def _parse_log_record(record: str) -> Tuple[List[str], List[str]]:
+    header, _, diff_output = record.partition(_HEADER_TERMINATOR)
+    return header.split(_FIELD_SEPARATOR), [line for line in diff_output.split('\n') if line]
+
+
+def _parse_name_status_line(line: str) -> FileChange:
+    change_type, *paths = line.split('\t')
+    if len(paths) == 2:
+        return FileChange(change_type=change_type, old_path=paths[0], path=paths[1])
+    return FileChange(change_type=change_type, path=paths[-1])
+
+
+def _parse_numstat_line(line: str) -> Tuple[Optional[int], Optional[int]]:
+    added, deleted, _ = line.split('\t', 2)
+    # Binary files are listed with '-' instead of line counts
+    return (int(added) if added != '-' else None), (int(deleted) if deleted != '-' else None)
+
+
+def refs_fingerprint(path_to_repository: str) -> str:
+    """
+    Returns:
+        str: A hash over all refs of the repository. If it changed, the index might be missing commits.
+    """
+    refs = subprocess.run(['git', '-C', path_to_repository, 'for-each-ref', '--format=%(objectname) %(refname)'],
+                          capture_output=True, check=True).stdout
+    return hashlib.sha1(refs).hexdigest()
+
+
+def commit_index_path_for(path_to_commit_indices: str, repository_name: str) -> str:
+    """
+    Returns:
+        str: The location of the index of the GitHub repository '<owner>/<repository>' in path_to_commit_indices.
+    """
+    return os.path.join(path_to_commit_indices, "__".join(repository_name.split("/")) + '.sqlite')
+
+
+class CommitIndex:
+    """
+    Persisted commit -> files inverted index of a repository.
+
+    Stores, for every commit reachable from any ref, its parents, committer timestamp and subject as well as every
+    changed file with its change type and added/deleted line counts in a single sqlite file. It is built with two
+    streamed `git log` invocations, after which the per-commit `git show` calls of the scraper and the
+    post-processing stages can be answered from the index, without a clone.
+    """
+
+    def __init__(self, path_to_index: str):
+        if not os.path.exists(path_to_index):
+            raise FileNotFoundError(f'No commit index at {path_to_index}. Build it with CommitIndex.build first.')
+        self.path_to_index = path_to_index
+        # The index is read-only once built, so it can safely be shared with scraping threads
+        self._connection = sqlite3.connect(f'file:{path_to_index}?mode=ro', uri=True, check_same_thread=False)
+        version = self._metadata('version')
+        if version != COMMIT_INDEX_VERSION:
+            self.close()
+            raise ValueError(f'Commit index at {path_to_index} has version {version}, '
+                             f'expected {COMMIT_INDEX_VERSION}. Please rebuild it.')
+
+    @classmethod
+    def build(cls, path_to_repository: str, path_to_index: str) -> 'CommitIndex':
+        """
+        Builds the index for the repository at path_to_repository, replacing any existing index at path_to_index.
+        The index is written to a temporary file first, so a concurrent reader never sees a partial index.
+
+        Args:
+            path_to_repository (str): The repository to index, bare or with working tree.
+            path_to_index (str): Where to store the index.
+
+        Returns:
+            CommitIndex: The opened index.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path_to_index)), exist_ok=True)
+        path_to_temporary_index = f'{path_to_index}.{os.getpid()}.tmp'
+        if os.path.exists(path_to_temporary_index):
+            os.remove(path_to_temporary_index)
+
+        fingerprint = refs_fingerprint(path_to_repository)
+        connection = sqlite3.connect(path_to_temporary_index)
+        try:
+            connection.executescript("""
+                CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE commits (sha TEXT PRIMARY KEY, parents TEXT NOT NULL, committed_at INTEGER,
+                                      subject TEXT) WITHOUT ROWID;
+                CREATE TABLE changes (sha TEXT NOT NULL, position INTEGER NOT NULL, change_type TEXT NOT NULL,
+                                      path TEXT NOT NULL, old_path TEXT, added INTEGER, deleted INTEGER,
+                                      PRIMARY KEY (sha, position)) WITHOUT ROWID;
+            """)
+
+            # Pass 1: Commits and name-status. --cc lists the changes of merge commits exactly like `git show`.
+            batch_of_commits, batch_of_changes = [], []
+            for (sha, parents, committed_at, subject), name_status_lines in iter_git_log_records(
+                    path_to_repository, '--all', '--cc', '--name-status', fields='%H%x1f%P%x1f%ct%x1f%s'):
+                batch_of_commits.append((sha, parents, int(committed_at), subject))
+                for position, line in enumerate(name_status_lines):
+                    change = _parse_name_status_line(line)
+                    batch_of_changes.append((sha, position, change.change_type, change.path, change.old_path))
+                if len(batch_of_changes) > 10000 or len(batch_of_commits) > 10000:
+                    cls._insert(connection, batch_of_commits, batch_of_changes)
+                    batch_of_commits, batch_of_changes = [], []
+            cls._insert(connection, batch_of_commits, batch_of_changes)
+
+            # Pass 2: Line counts. git log lists no diff for merge commits by default, so only non-merge commits are
+            # covered. The diff queue is identical to pass 1, so the n-th numstat line belongs to the n-th change.
+            batch_of_line_counts = []
+            for (sha,), numstat_lines in iter_git_log_records(path_to_repository, '--all', '--numstat', fields='%H'):
+                for position, line in enumerate(numstat_lines):
+                    added, deleted = _parse_numstat_line(line)
+                    batch_of_line_counts.append((added, deleted, sha, position))
+                if len(batch_of_line_counts) > 10000:
+                    cls._update_line_counts(connection, batch_of_line_counts)
+                    batch_of_line_counts = []
+            cls._update_line_counts(connection, batch_of_line_counts)
+
+            connection.execute('CREATE INDEX changes_by_path ON changes (path)')
+            connection.executemany('INSERT INTO metadata VALUES (?, ?)',
+                                   [('version', COMMIT_INDEX_VERSION), ('refs_fingerprint', fingerprint)])
+            connection.commit()
+        finally:
+            connection.close()
+
+        os.replace(path_to_temporary_index, path_to_index)
+        return cls(path_to_index)
+
+    @classmethod
+    def open_or_build(cls, path_to_repository: str, path_to_index: str) -> 'CommitIndex':
+        """
+        Opens the index at path_to_index if it exists and is up to date with the refs of the repository, otherwise
+        (re)builds it.
+        """
+        if os.path.exists(path_to_index):
+            try:
+                index = cls(path_to_index)
+                if index.is_up_to_date_with(path_to_repository):
+                    return index
+                index.close()
+            except (ValueError, sqlite3.DatabaseError):
+                pass
+        return cls.build(path_to_repository, path_to_index)
+
+    @staticmethod
+    def _insert(connection: sqlite3.Connection, commits: list, changes: list):
+        connection.executemany('INSERT OR IGNORE INTO commits VALUES (?, ?, ?, ?)', commits)
+        connection.executemany('INSERT OR IGNORE INTO changes (sha, position, change_type, path, old_path) '
+                               'VALUES (?, ?, ?, ?, ?)', changes)
+
+    @staticmethod
+    def _update_line_counts(connection: sqlite3.Connection, line_counts: list):
+        connection.executemany('UPDATE changes SET added = ?, deleted = ? WHERE sha = ? AND position = ?',
+                               line_counts)
+
+    def _metadata(self, key: str) -> Optional[str]:
+        row = self._connection.execute('SELECT value FROM metadata WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def is_up_to_date_with(self, path_to_repository: str) -> bool:
+        """
+        Returns:
+            bool: True if the refs of the repository did not change since the index was built.
+        """
+        return self._metadata('refs_fingerprint') == refs_fingerprint(path_to_repository)
+
+    def contains(self, sha: str) -> bool:
+        return self._connection.execute('SELECT 1 FROM commits WHERE sha = ?', (sha,)).fetchone() is not None
+
+    def parents(self, sha: str) -> List[str]:
+        """
+        Raises:
+            KeyError: If the commit is not in the index.
+        """
+        row = self._connection.execute('SELECT parents FROM commits WHERE sha = ?', (sha,)).fetchone()
+        if row is None:
+            raise KeyError(sha)
+        return row[0].split()
+
+    def subject(self, sha: str) -> str:
+        row = self._connection.execute('SELECT subject FROM commits WHERE sha = ?', (sha,)).fetchone()
+        if row is None:
+            raise KeyError(sha)
+        return row[0]
+
+    def changes(self, sha: str) -> List[FileChange]:
+        """
+        Returns:
+            List[FileChange]: The files changed by the commit, in the order `git show` lists them.
+
+        Raises:
+            KeyError: If the commit is not in the index.
+        """
+        if not self.contains(sha):
+            raise KeyError(sha)
+        rows = self._connection.execute('SELECT change_type, path, old_path, added, deleted FROM changes '
+                                        'WHERE sha = ? ORDER BY position', (sha,)).fetchall()
+        return [FileChange(*row) for row in rows]
+
+    def name_status(self, sha: str) -> List[str]:
+        """
+        Returns:
+            List[str]: The lines of `git show <sha> --name-status` without the commit header.
+        """
+        return [change.to_name_status_line() for change in self.changes(sha)]
+
+    def files_changed_in(self, sha: str) -> List[str]:
+        """
+        Returns:
+            List[str]: The paths of the files changed by the commit, like `git show --name-only`.
+        """
+        return [change.path for change in self.changes(sha)]
+
+    def commits_changing(self, path: str) -> List[str]:
+        """
+        Returns:
+            List[str]: All commits changing the file at path, newest first.
+        """
+        rows = self._connection.execute('SELECT changes.sha FROM changes JOIN commits ON changes.sha = commits.sha '
+                                        'WHERE path = ? ORDER BY committed_at DESC', (path,)).fetchall()
+        return [row[0] for row in rows]
+
+    def log(self, sha: str, n: int) -> List[str]:
+        """
+        Emulates `git log --format=%H -n <n> <sha>`: Walks all ancestors of sha, newest committer date first.
+
+        Returns:
+            List[str]: Up to n commit hashes, starting with sha.
+        """
+        committed_at = lambda commit: self._connection.execute(
+            'SELECT committed_at FROM commits WHERE sha = ?', (commit,)).fetchone()[0]
+        insertion_order = count()
+        frontier = [(-committed_at(sha), next(insertion_order), sha)]
+        seen = {sha}
+        commits = []
+        while frontier and len(commits) < n:
+            _, _, commit = heapq.heappop(frontier)
+            commits.append(commit)
+            for parent in self.parents(commit):
+                if parent not in seen and self.contains(parent):
+                    seen.add(parent)
+                    heapq.heappush(frontier, (-committed_at(parent), next(insertion_order), parent))
+        return commits
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
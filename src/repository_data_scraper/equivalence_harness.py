@@ -0,0 +1,383 @@
+import importlib
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+from git import Repo
+
+from src.repository_data_scraper.programming_language import ProgrammingLanguage
+from src.repository_data_scraper.repository_data_scraper import RepositoryDataScraper
+
+SCENARIO_KEYS = ('file_commit_chain_scenarios', 'merge_scenarios', 'cherry_pick_scenarios')
+
+# An operation used to generate a repository, e.g. ('commit', 1, (0, 3)). See generate_operations for the vocabulary.
+RepositoryOperation = Tuple
+
+
+@dataclass
+class AccumulatorDifference:
+    """
+    The difference between the reference and a candidate accumulator for one scenario type. Scenarios are compared
+    as a multiset, so the order in which an engine emits them does not matter, but duplicates do.
+    """
+    scenario_key: str
+    missing: List[dict] = field(default_factory=list)
+    unexpected: List[dict] = field(default_factory=list)
+
+    def __str__(self):
+        lines = [f'{self.scenario_key}: {len(self.missing)} missing, {len(self.unexpected)} unexpected']
+        lines += [f'  - {scenario}' for scenario in self.missing]
+        lines += [f'  + {scenario}' for scenario in self.unexpected]
+        return '\n'.join(lines)
+
+
+@dataclass
+class EquivalenceReport:
+    """
+    The result of running the reference and a candidate engine on the same repository.
+    `operations` is only set for generated repositories and then holds the (minimised) operations that reproduce the
+    differences.
+    """
+    repository: str
+    differences: List[AccumulatorDifference]
+    operations: Optional[List[RepositoryOperation]] = None
+
+    @property
+    def is_equivalent(self) -> bool:
+        return not self.differences
+
+    def __str__(self):
+        if self.is_equivalent:
+            return f'{self.repository}: equivalent'
+
+        lines = [f'{self.repository}: NOT equivalent']
+        lines += [str(difference) for difference in self.differences]
+        if self.operations is not None:
+            lines.append(f'Minimal operations reproducing the difference ({len(self.operations)}):')
+            lines += [f'  {operation}' for operation in self.operations]
+        return '\n'.join(lines)
+
+
+def _freeze(value):
+    """
+    Converts a scenario into a hashable representation. Dict keys are sorted, list order is preserved (e.g. the order
+    of the parents of a merge commit is meaningful).
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def diff_accumulators(reference: Dict[str, List[dict]], candidate: Dict[str, List[dict]]) -> List[AccumulatorDifference]:
+    """
+    Diffs two scraper accumulators order-insensitively.
+
+    Args:
+        reference (Dict[str, List[dict]]): The accumulator of the reference RepositoryDataScraper.
+        candidate (Dict[str, List[dict]]): The accumulator of the engine under test.
+
+    Returns:
+        List[AccumulatorDifference]: One entry per scenario type that differs, empty if the accumulators are equivalent.
+    """
+    differences = []
+    for scenario_key in SCENARIO_KEYS:
+        reference_scenarios = {_freeze(s): s for s in reference.get(scenario_key, [])}
+        candidate_scenarios = {_freeze(s): s for s in candidate.get(scenario_key, [])}
+        reference_counts = Counter(_freeze(s) for s in reference.get(scenario_key, []))
+        candidate_counts = Counter(_freeze(s) for s in candidate.get(scenario_key, []))
+
+        missing = [reference_scenarios[key] for key in (reference_counts - candidate_counts).elements()]
+        unexpected = [candidate_scenarios[key] for key in (candidate_counts - reference_counts).elements()]
+        if missing or unexpected:
+            differences.append(AccumulatorDifference(scenario_key, missing, unexpected))
+    return differences
+
+
+def run_engine(engine: Type[RepositoryDataScraper], path_to_repository: str,
+               programming_language: ProgrammingLanguage, sliding_window_size: int) -> Dict[str, List[dict]]:
+    """
+    Scrapes the repository at path_to_repository with the given engine and returns its accumulator. An engine is any
+    class with the constructor signature of RepositoryDataScraper exposing scrape() and accumulator.
+    """
+    scraper = engine(repository=Repo(path_to_repository),
+                     programming_language=programming_language,
+                     repository_name=os.path.basename(path_to_repository),
+                     sliding_window_size=sliding_window_size)
+    scraper.scrape()
+    return scraper.accumulator
+
+
+def compare_engines_on(path_to_repository: str, candidate_engine: Type[RepositoryDataScraper],
+                       programming_language: ProgrammingLanguage, sliding_window_size: int = 3,
+                       reference_engine: Type[RepositoryDataScraper] = RepositoryDataScraper) -> EquivalenceReport:
+    """
+    Runs the reference and the candidate engine side by side on an existing repository.
+
+    Args:
+        path_to_repository (str): Path to the repository, bare or with working tree.
+        candidate_engine (Type[RepositoryDataScraper]): The engine under test.
+        programming_language (ProgrammingLanguage): The programming language to scrape for.
+        sliding_window_size (int): The sliding window size for file-commit chains.
+        reference_engine (Type[RepositoryDataScraper]): The engine whose output is considered correct.
+
+    Returns:
+        EquivalenceReport: The differences between both engines.
+    """
+    reference = run_engine(reference_engine, path_to_repository, programming_language, sliding_window_size)
+    candidate = run_engine(candidate_engine, path_to_repository, programming_language, sliding_window_size)
+    return EquivalenceReport(repository=path_to_repository, differences=diff_accumulators(reference, candidate))
+
+
+def generate_operations(seed: int, n_operations: int = 40, n_files: int = 4) -> List[RepositoryOperation]:
+    """
+    Generates a random, reproducible sequence of operations describing a repository history.
+
+    The vocabulary is:
+        ('commit', branch, files): Commit a change to each file index in files on branch.
+        ('branch', branch): Create a new branch off the tip of branch.
+        ('merge', target, source): Merge source into target, resolving conflicts by keeping both sides.
+        ('cherry_pick', target, source, record_origin): Cherry-pick the tip of source onto target. If record_origin
+            is True, -x is used, otherwise the pick can only be detected through its duplicate commit message.
+
+    Branches are referenced by their creation index and resolved modulo the number of existing branches, so any
+    subsequence of the operations still describes a valid history. This is what allows shrinking counterexamples.
+    """
+    rng = random.Random(seed)
+    kinds = ['commit'] * 6 + ['branch'] * 2 + ['merge'] * 2 + ['cherry_pick']
+    operations = []
+    for _ in range(n_operations):
+        kind = rng.choice(kinds)
+        if kind == 'commit':
+            n_changed_files = rng.randint(1, 2)
+            operations.append(('commit', rng.randrange(8), tuple(sorted(rng.sample(range(n_files), n_changed_files)))))
+        elif kind == 'branch':
+            operations.append(('branch', rng.randrange(8)))
+        elif kind == 'merge':
+            operations.append(('merge', rng.randrange(8), rng.randrange(8)))
+        else:
+            operations.append(('cherry_pick', rng.randrange(8), rng.randrange(8), rng.random() < 0.5))
+    return operations
+
+
+class _RepositoryGenerator:
+    """
+    Materialises a list of operations as a git repository using the git CLI. Author and committer dates are derived
+    from the operation index, so the same operations always yield the same commit hashes.
+    """
+
+    def __init__(self, path_to_repository: str, programming_language: ProgrammingLanguage):
+        self.path_to_repository = path_to_repository
+        self.programming_language = programming_language
+        self.branches = ['main']
+        self.step = 0
+
+    def _git(self, *args, check: bool = True) -> subprocess.CompletedProcess:
+        timestamp = f'{1700000000 + self.step * 60} +0000'
+        env = dict(os.environ, GIT_AUTHOR_NAME='generator', GIT_AUTHOR_EMAIL='generator@example.com',
+                   GIT_COMMITTER_NAME='generator', GIT_COMMITTER_EMAIL='generator@example.com',
+                   GIT_AUTHOR_DATE=timestamp, GIT_COMMITTER_DATE=timestamp, GIT_CONFIG_NOSYSTEM='1',
+                   GIT_CONFIG_GLOBAL=os.devnull)
+        return subprocess.run(['git', '-C', self.path_to_repository, *args], env=env, capture_output=True,
+                              text=True, check=check)
+
+    def _file_name(self, file_index: int) -> str:
+        # Every third file is noise of another file type, to cover the programming language filter
+        if file_index % 3 == 2:
+            return f'notes_{file_index}.md'
+        return f'module_{file_index}{self.programming_language.value}'
+
+    def _branch(self, branch_index: int) -> str:
+        return self.branches[branch_index % len(self.branches)]
+
+    def _append_line(self, file_name: str, line: str):
+        with open(os.path.join(self.path_to_repository, file_name), 'a') as f:
+            f.write(line + '\n')
+
+    def _resolve_conflicts_by_keeping_both_sides(self):
+        conflicted_files = self._git('diff', '--name-only', '--diff-filter=U').stdout.split()
+        for file_name in conflicted_files:
+            path_to_file = os.path.join(self.path_to_repository, file_name)
+            with open(path_to_file) as f:
+                lines = [line for line in f.readlines() if not line.startswith(('<<<<<<<', '=======', '>>>>>>>'))]
+            with open(path_to_file, 'w') as f:
+                f.writelines(lines)
+        self._git('add', '-A')
+
+    def materialise(self, operations: List[RepositoryOperation]):
+        os.makedirs(self.path_to_repository, exist_ok=True)
+        self._git('init', '-q', '-b', 'main')
+        self._append_line(self._file_name(0), 'initial')
+        self._git('add', '-A')
+        self._git('commit', '-q', '-m', 'Initial commit')
+
+        for self.step, operation in enumerate(operations, start=1):
+            kind = operation[0]
+            if kind == 'commit':
+                _, branch_index, files = operation
+                self._git('checkout', '-q', self._branch(branch_index))
+                for file_index in files:
+                    self._append_line(self._file_name(file_index), f'change {self.step}')
+                self._git('add', '-A')
+                self._git('commit', '-q', '-m', f'Change {"/".join(map(str, files))} in step {self.step}')
+            elif kind == 'branch':
+                _, branch_index = operation
+                new_branch = f'branch-{len(self.branches)}'
+                self._git('branch', new_branch, self._branch(branch_index))
+                self.branches.append(new_branch)
+            elif kind == 'merge':
+                _, target_index, source_index = operation
+                target, source = self._branch(target_index), self._branch(source_index)
+                if target == source:
+                    continue
+                self._git('checkout', '-q', target)
+                merge = self._git('merge', '--no-ff', '-q', '-m', f'Merge {source} into {target}', source,
+                                  check=False)
+                if merge.returncode != 0:
+                    self._resolve_conflicts_by_keeping_both_sides()
+                    self._git('commit', '-q', '--no-edit')
+            elif kind == 'cherry_pick':
+                _, target_index, source_index, record_origin = operation
+                target, source = self._branch(target_index), self._branch(source_index)
+                if target == source:
+                    continue
+                self._git('checkout', '-q', target)
+                source_tip = self._git('rev-parse', source).stdout.strip()
+                if self._git('merge-base', '--is-ancestor', source_tip, 'HEAD', check=False).returncode == 0:
+                    continue
+                arguments = ['cherry-pick', '--allow-empty', '-m', '1'] if self._is_merge(source_tip) \
+                    else ['cherry-pick', '--allow-empty']
+                if record_origin:
+                    arguments.append('-x')
+                pick = self._git(*arguments, source_tip, check=False)
+                if pick.returncode != 0:
+                    self._resolve_conflicts_by_keeping_both_sides()
+                    if self._git('-c', 'core.editor=true', 'cherry-pick', '--continue', check=False).returncode != 0:
+                        self._git('cherry-pick', '--abort', check=False)
+            else:
+                raise ValueError(f'Unknown repository operation: {operation}')
+
+    def _is_merge(self, commit_hash: str) -> bool:
+        parents = self._git('rev-list', '--parents', '-n', '1', commit_hash).stdout.split()
+        return len(parents) > 2
+
+
+def materialise_repository(operations: List[RepositoryOperation], path_to_repository: str,
+                           programming_language: ProgrammingLanguage):
+    """
+    Creates a git repository at path_to_repository whose history is described by operations.
+    """
+    _RepositoryGenerator(path_to_repository, programming_language).materialise(operations)
+
+
+def _compare_engines_on_operations(operations: List[RepositoryOperation], candidate_engine, programming_language,
+                                   sliding_window_size, reference_engine) -> List[AccumulatorDifference]:
+    path_to_repository = tempfile.mkdtemp(prefix='equivalence-harness-')
+    try:
+        materialise_repository(operations, path_to_repository, programming_language)
+        return compare_engines_on(path_to_repository, candidate_engine, programming_language, sliding_window_size,
+                                  reference_engine).differences
+    finally:
+        shutil.rmtree(path_to_repository, ignore_errors=True)
+
+
+def shrink_operations(operations: List[RepositoryOperation],
+                      is_counterexample: Callable[[List[RepositoryOperation]], bool]) -> List[RepositoryOperation]:
+    """
+    Greedily removes chunks of operations (halving the chunk size down to single operations) as long as the remaining
+    operations are still a counterexample. The result is 1-minimal: removing any single operation makes the
+    difference disappear.
+    """
+    chunk_size = max(len(operations) // 2, 1)
+    while True:
+        start = 0
+        while start < len(operations):
+            candidate = operations[:start] + operations[start + chunk_size:]
+            if candidate != operations and is_counterexample(candidate):
+                operations = candidate
+            else:
+                start += chunk_size
+        if chunk_size == 1:
+            return operations
+        chunk_size = max(chunk_size // 2, 1)
+
+
+def compare_engines_on_generated_repositories(candidate_engine: Type[RepositoryDataScraper],
+                                              programming_language: ProgrammingLanguage,
+                                              seeds: List[int], sliding_window_size: int = 3,
+                                              n_operations: int = 40, minimise: bool = True,
+                                              reference_engine: Type[RepositoryDataScraper] = RepositoryDataScraper
+                                              ) -> List[EquivalenceReport]:
+    """
+    Runs the reference and the candidate engine on one generated repository per seed. For every seed on which the
+    engines disagree, the generating operations are shrunk to a minimal counterexample.
+
+    Returns:
+        List[EquivalenceReport]: One report per seed.
+    """
+    reports = []
+    for seed in seeds:
+        operations = generate_operations(seed, n_operations=n_operations)
+        differences = _compare_engines_on_operations(operations, candidate_engine, programming_language,
+                                                     sliding_window_size, reference_engine)
+        if differences and minimise:
+            operations = shrink_operations(operations, lambda ops: bool(_compare_engines_on_operations(
+                ops, candidate_engine, programming_language, sliding_window_size, reference_engine)))
+            differences = _compare_engines_on_operations(operations, candidate_engine, programming_language,
+                                                         sliding_window_size, reference_engine)
+        reports.append(EquivalenceReport(repository=f'generated(seed={seed})', differences=differences,
+                                         operations=operations if differences else None))
+    return reports
+
+
+def load_engine(engine_path: str) -> Type[RepositoryDataScraper]:
+    """
+    Loads an engine from a 'package.module:ClassName' path.
+    """
+    module_name, _, attribute = engine_path.partition(':')
+    if not attribute:
+        raise ValueError(f'Engine must be given as "package.module:ClassName", got: {engine_path}')
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def main():
+    parser = ArgumentParser(description='Checks that an alternative scraper engine produces exactly the same '
+                                        'scenarios as the reference RepositoryDataScraper.')
+    parser.add_argument('-e', '--engine', type=str, required=True,
+                        help='The engine under test, e.g. "src.repository_data_scraper.my_engine:MyScraper".')
+    parser.add_argument('-p', '--programming-language', type=str, default='python',
+                        help='The programming language to filter for.')
+    parser.add_argument('-w', '--sliding-window-size', type=int, default=3)
+    parser.add_argument('-r', '--repository', action='append', default=[],
+                        help='Path to an existing repository to compare on. Can be passed multiple times.')
+    parser.add_argument('-n', '--n-generated', type=int, default=20,
+                        help='Number of generated repositories to compare on.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the first generated repository.')
+    args = parser.parse_args()
+
+    candidate_engine = load_engine(args.engine)
+    programming_language = ProgrammingLanguage[args.programming_language.upper()]
+
+    reports = [compare_engines_on(path_to_repository, candidate_engine, programming_language, args.sliding_window_size)
+               for path_to_repository in args.repository]
+    reports += compare_engines_on_generated_repositories(candidate_engine, programming_language,
+                                                         seeds=list(range(args.seed, args.seed + args.n_generated)),
+                                                         sliding_window_size=args.sliding_window_size)
+
+    for report in reports:
+        print(report)
+    n_failed = len([report for report in reports if not report.is_equivalent])
+    print(f'\n{len(reports) - n_failed}/{len(reports)} repositories equivalent.')
+    sys.exit(1 if n_failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,60 +1,356 @@
 from repository_data_scraper import RepositoryDataScraper
+from vectorised_repository_data_scraper import VectorisedRepositoryDataScraper
 from git import Repo, GitCommandError
 import os
 import pandas as pd
 from programming_language import ProgrammingLanguage
-from concurrent.futures import ProcessPoolExecutor, as_completed
-import shutil, stat
+from commit_index import CommitIndex, commit_index_path_for
+from top_k_chains import TOP_K_GROUP_BY_REPOSITORY, TOP_K_GROUP_BY_FILE, TOP_K_GROUP_BY_BRANCH
+from repository_prescreen import PreScreenThresholds, prescreen_repository, PRESCREEN_SCRAPE, PRESCREEN_SKIP, \
+    PRESCREEN_DEPRIORITISE
+from scraping_pipeline import CloneScrapePipeline
+from clone_service import CloneService, github_url, mirror_url_rewrite, template_url_rewrite
+from result_shards import ParquetShardWriter, shard_schema_for, initialise_process_shard_writer, \
+    get_process_shard_writer, merge_shards, readable_shards
+from run_manifest import RunManifest, RUN_MANIFEST_FILE_NAME
+from repository_cache import RepositoryCache
+from worker_supervision import initialise_worker_supervisor, get_worker_supervisor, RebuildingExecutor, \
+    WorkerCrashTriage, worker_event_counts, EVENT_MEMORY_BUDGET_EXCEEDED
+from run_telemetry import RunTelemetry, METRICS_FILE_NAME
+from repository_scheduler import CostModel, fit_cost_model, order_longest_first, cost_model_report, \
+    batch_small_repositories, SCHEDULE_CSV_ORDER, SCHEDULE_LONGEST_FIRST, COST_MODEL_FILE_NAME, \
+    read_cost_model_results
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
+import shutil, stat, sys
 import traceback
+import uuid
 from argparse import ArgumentParser
+from datetime import datetime
+from time import time
 
+SCRAPER_ENGINES = {'reference': RepositoryDataScraper, 'vectorised': VectorisedRepositoryDataScraper}
 
-def scrape_repository(repository_metadata: pd.Series, path_to_repositories: str,
-                      programming_language: ProgrammingLanguage, sliding_window_size: int) -> pd.Series:
+
+def clone_repository(repository_metadata: pd.Series, path_to_repositories: str,
+                     clone_service: CloneService = None, repository_cache: RepositoryCache = None) -> (pd.Series, str):
     """
-    Scrapes a GitHub repository for data using the given repository metadata and file paths.
+    Clones a GitHub repository into path_to_repositories, or reuses an existing clone.
 
     Parameters:
     - repository_metadata (pd.Series): The metadata of the GitHub repository from SEART.
     - path_to_repositories (str): The path to the directory where repositories will be cloned or accessed.
-    - programming_language (ProgrammingLanguage): The programming language to filter files by. Only commits
-        concerning files of this programming language will be considered in the scraping.
-    - sliding_window_size (int): The sliding window size to use for scraping file-commit grams.
-        These chains of subsequent commits will be at least of length sliding_window_size.
+    - clone_service (CloneService): The service to clone with, which retries transient failures and rate limits
+        clones. Defaults to a service cloning from GitHub with the default settings.
+    - repository_cache (RepositoryCache): If given, the clone is a working copy checked out from the cached mirror of
+        the repository, which is cloned by the cache (with its own clone service) if necessary. The working copy has to
+        be removed with remove_repository and the same cache.
 
     Returns:
-    - repository_metadata (pd.Series): The updated metadata of the GitHub repository, including any errors encountered during scraping.
+    - repository_metadata (pd.Series): The metadata of the GitHub repository, including the error if cloning failed.
+    - str: The path to the clone, None if cloning failed.
     """
     repository_path = os.path.join(path_to_repositories, "__".join(repository_metadata["name"].split("/")))
+    start = time()
     try:
-        repo_instance = Repo.clone_from(f'https://github.com/{repository_metadata["name"]}.git',
-                                        f'{repository_path}')
+        if repository_cache is not None:
+            repository_cache.checkout(repository_metadata["name"], repository_path)
+        else:
+            (clone_service or _get_default_clone_service()).clone_repository(repository_metadata["name"],
+                                                                             repository_path)
     except GitCommandError as e:
-        # If already exists, create Repo instance of it
+        # If already exists, use the existing clone
         if 'already exists' in e.stderr:
             print('Repository already exists, using local directory instead of cloning.')
-            repo_instance = Repo(repository_path)
         else:
             # Capture any unexpected error and store its traceback for debugging
+            repository_metadata['error'] = traceback.format_exc()
+            return repository_metadata, None
+    except Exception:
+        # E.g. a full disk, missing permissions or a failure of the repository cache
+        repository_metadata['error'] = traceback.format_exc()
+        return repository_metadata, None
+    finally:
+        repository_metadata['clone_seconds'] = time() - start
+
+    return repository_metadata, repository_path
+
+
+_default_clone_service = None
+
+
+def _get_default_clone_service() -> CloneService:
+    global _default_clone_service
+    if _default_clone_service is None:
+        _default_clone_service = CloneService()
+    return _default_clone_service
+
+
+def scrape_cloned_repository(repository_metadata: pd.Series, repository_path: str,
+                             programming_language: ProgrammingLanguage, sliding_window_size: int,
+                             top_k_chains: int = None, top_k_group_by: str = TOP_K_GROUP_BY_REPOSITORY,
+                             max_chain_length: int = None, path_to_commit_indices: str = None,
+                             engine: str = 'reference') -> pd.Series:
+    """
+    Scrapes a cloned GitHub repository for data using the given repository metadata.
+
+    Parameters:
+    - repository_metadata (pd.Series): The metadata of the GitHub repository from SEART.
+    - repository_path (str): The path to the clone of the repository.
+    - programming_language (ProgrammingLanguage): The programming language to filter files by. Only commits
+        concerning files of this programming language will be considered in the scraping.
+    - sliding_window_size (int): The sliding window size to use for scraping file-commit grams.
+        These chains of subsequent commits will be at least of length sliding_window_size.
+    - top_k_chains (int): If set, only the top_k_chains longest file-commit chains per top_k_group_by are kept.
+    - top_k_group_by (str): The group the top_k_chains limit applies to: 'repository', 'file' or 'branch'.
+    - max_chain_length (int): If set, file-commit chains longer than this are discarded.
+    - path_to_commit_indices (str): If set, a commit index of the repository is built (or reused) in this directory
+        and used by the scraper. The index is kept after the clone is removed, so later stages can reuse it.
+    - engine (str): The scraper implementation to use, a key of SCRAPER_ENGINES. All engines mine the same scenarios.
+
+    Returns:
+    - repository_metadata (pd.Series): The updated metadata of the GitHub repository, including any errors encountered during scraping.
+    """
+    start = time()
+    repository_metadata = _scrape_cloned_repository(repository_metadata, repository_path, programming_language,
+                                                    sliding_window_size, top_k_chains, top_k_group_by,
+                                                    max_chain_length, path_to_commit_indices, engine)
+    repository_metadata['scrape_seconds'] = time() - start
+    return repository_metadata
+
+
+def _scrape_cloned_repository(repository_metadata: pd.Series, repository_path: str,
+                              programming_language: ProgrammingLanguage, sliding_window_size: int,
+                              top_k_chains: int, top_k_group_by: str, max_chain_length: int,
+                              path_to_commit_indices: str, engine: str) -> pd.Series:
+    commit_index = None
+    if path_to_commit_indices is not None:
+        try:
+            commit_index = CommitIndex.open_or_build(
+                repository_path, commit_index_path_for(path_to_commit_indices, repository_metadata["name"]))
+        except Exception:
             repository_metadata['error'] = traceback.format_exc()
             return repository_metadata
 
-    os.chdir(repository_path)
-    repo_scraper = RepositoryDataScraper(repository=repo_instance,
-                                         programming_language=programming_language,
-                                         repository_name=repository_metadata["name"],
-                                         sliding_window_size=sliding_window_size)  # Reduced sliding window size to 3
+    repository = None
     try:
+        # Opening a broken clone or reading its references fails here, which is an error of this repository only and
+        # must not fail the other repositories of its batch
+        repository = Repo(repository_path)
+        repo_scraper = SCRAPER_ENGINES[engine](repository=repository,
+                                               programming_language=programming_language,
+                                               repository_name=repository_metadata["name"],
+                                               # Reduced sliding window size to 3
+                                               sliding_window_size=sliding_window_size,
+                                               top_k_chains=top_k_chains,
+                                               top_k_group_by=top_k_group_by,
+                                               max_chain_length=max_chain_length,
+                                               commit_index=commit_index)
         repo_scraper.scrape()
         repository_metadata = update_repository_metadata_with_scraper_results(repo_scraper, repository_metadata)
     except Exception:
         # Capture any exception and store it for debugging
         repository_metadata['error'] = traceback.format_exc()
         return repository_metadata
+    finally:
+        # Stops the persistent git cat-file processes of the repository, instead of leaving them to the garbage
+        # collector of a long-lived worker
+        if repository is not None:
+            repository.close()
+        if commit_index is not None:
+            commit_index.close()
 
     return repository_metadata
 
 
+def scrape_cloned_repository_into_shard(repository_metadata: pd.Series, repository_path: str,
+                                        **kwargs) -> pd.Series:
+    """
+    Scrapes a cloned GitHub repository and writes the result into the Parquet shard of this worker process, see
+    scrape_cloned_repository for the parameters.
+
+    The worker's supervisor records the peak RSS of the process while scraping, see WorkerSupervisor.
+
+    Returns:
+    - pd.Series: The summary of the result, see write_result_to_shard. The scraped data is not sent back to the parent.
+    """
+    with get_worker_supervisor().supervise(repository_metadata['name']) as task_statistics:
+        repository_metadata = scrape_cloned_repository(repository_metadata, repository_path, **kwargs)
+    repository_metadata['peak_rss_bytes'] = task_statistics.peak_rss_bytes
+    get_worker_supervisor().task_done()
+    return write_result_to_shard(get_process_shard_writer(), repository_metadata)
+
+
+def scrape_repository_batch_into_shard(batch: list, path_to_batch: str, **kwargs) -> list:
+    """
+    Scrapes a batch of cloned small repositories back to back in this (warm) worker process and writes their results
+    into its Parquet shard, see clone_repository_batch and scrape_cloned_repository for the parameters.
+
+    The results of a batch are written to the shard together, so either all or none of them are lost if the worker
+    dies and the batch can be scraped again without duplicating results.
+
+    Returns:
+    - list: The summaries of the results (pd.Series, see write_result_to_shard), in the order of the batch.
+    """
+    results = []
+    for repository_metadata, repository_path in batch:
+        # Repositories whose clone failed are written as they are
+        if repository_path is not None:
+            with get_worker_supervisor().supervise(repository_metadata['name']) as task_statistics:
+                repository_metadata = scrape_cloned_repository(repository_metadata, repository_path, **kwargs)
+            repository_metadata['peak_rss_bytes'] = task_statistics.peak_rss_bytes
+        results.append(repository_metadata)
+    get_worker_supervisor().task_done()
+    shard = get_process_shard_writer().write_many(results)
+    return [summarise_result(repository_metadata, shard) for repository_metadata in results]
+
+
+def initialise_scraping_worker(path_to_shards: str, shard_schema, memory_budget_bytes: int = None,
+                               max_tasks: int = None):
+    """
+    Initializer of the scraping processes: creates their shard writer and supervisor.
+    """
+    initialise_process_shard_writer(path_to_shards, shard_schema)
+    initialise_worker_supervisor(path_to_shards, memory_budget_bytes, max_tasks)
+
+
+def write_result_to_shard(shard_writer: ParquetShardWriter, repository_metadata: pd.Series) -> pd.Series:
+    """
+    Writes the scraping result of a repository into a shard.
+
+    Parameters:
+    - shard_writer (ParquetShardWriter): The writer of the current process.
+    - repository_metadata (pd.Series): The metadata of the GitHub repository with the scraping results.
+
+    Returns:
+    - pd.Series: The summary of the result, see summarise_result.
+    """
+    return summarise_result(repository_metadata, shard_writer.write(repository_metadata))
+
+
+def summarise_result(repository_metadata: pd.Series, shard: str) -> pd.Series:
+    """
+    Returns:
+    - pd.Series: The name of the repository, its error (if any), how long cloning and scraping took, its peak RSS, how
+        many commits were scraped and the shard the result was written to.
+    """
+    return pd.Series({'name': repository_metadata['name'], 'error': repository_metadata.get('error'), 'shard': shard,
+                      'clone_seconds': repository_metadata.get('clone_seconds'),
+                      'scrape_seconds': repository_metadata.get('scrape_seconds'),
+                      'peak_rss_bytes': repository_metadata.get('peak_rss_bytes'),
+                      'n_visited_commits': repository_metadata.get('n_visited_commits')})
+
+
+def clone_repository_batch(batch: list, path_to_repositories: str, clone_service: CloneService = None,
+                           repository_cache: RepositoryCache = None) -> (list, str):
+    """
+    Clones a batch of small repositories concurrently into a new directory of path_to_repositories, see
+    clone_repository for the parameters.
+
+    Returns:
+    - list: The metadata of each repository of the batch with the path to its clone, None if cloning failed.
+    - str: The path to the directory of the batch, which contains all clones.
+    """
+    path_to_batch = os.path.join(path_to_repositories, f'batch-{uuid.uuid4().hex[:8]}')
+    os.makedirs(path_to_batch)
+    with ThreadPoolExecutor(max_workers=len(batch)) as executor:
+        cloned_batch = list(executor.map(partial(clone_repository, path_to_repositories=path_to_batch,
+                                                 clone_service=clone_service, repository_cache=repository_cache),
+                                         batch))
+    return cloned_batch, path_to_batch
+
+
+def clone_scraping_item(item, **kwargs):
+    """
+    Clones a repository (pd.Series) or a batch of small repositories (list), see clone_repository and
+    clone_repository_batch.
+    """
+    if isinstance(item, list):
+        return clone_repository_batch(item, **kwargs)
+    return clone_repository(item, **kwargs)
+
+
+def scrape_scraping_item_into_shard(item, path: str, **kwargs):
+    """
+    Scrapes a cloned repository or batch of repositories, see scrape_cloned_repository_into_shard and
+    scrape_repository_batch_into_shard.
+    """
+    if isinstance(item, list):
+        return scrape_repository_batch_into_shard(item, path, **kwargs)
+    return scrape_cloned_repository_into_shard(item, path, **kwargs)
+
+
+def estimate_scraping_item_size(item) -> int:
+    if isinstance(item, list):
+        return sum(estimate_clone_size(repository_metadata) for repository_metadata in item)
+    return estimate_clone_size(item)
+
+
+def retry_scraping_item(item, exception: BaseException, crash_triage: WorkerCrashTriage) -> bool:
+    """
+    Decides whether a repository or batch whose scraping process died is scraped again, see WorkerCrashTriage.
+    Repositories of a batch which exceeded the memory budget are recorded as failed and not scraped again, the rest of
+    the batch is.
+    """
+    if not isinstance(item, list):
+        return crash_triage.should_retry(item['name'], exception)
+    if not isinstance(exception, BrokenExecutor):
+        return False
+    for index, (repository_metadata, repository_path) in enumerate(item):
+        tombstone = crash_triage.tombstone_of(repository_metadata['name'])
+        if repository_path is not None and tombstone is not None \
+                and tombstone.get('reason') == EVENT_MEMORY_BUDGET_EXCEEDED:
+            item[index] = (record_scrape_error(repository_metadata, exception, crash_triage), None)
+    return crash_triage.should_retry(f'batch of {item[0][0]["name"]}', exception)
+
+
+def record_clone_error(item, exception: BaseException):
+    """
+    Records an exception raised while cloning a repository or a batch of repositories outside of clone_repository,
+    e.g. while creating the directory of a batch, as the error of every repository of the item.
+    """
+    error = ''.join(traceback.format_exception(exception))
+    for repository_metadata in item if isinstance(item, list) else [item]:
+        repository_metadata['error'] = error
+    return item
+
+
+def record_scraping_item_error(item, exception: BaseException, crash_triage: WorkerCrashTriage = None):
+    """
+    Records the error of a repository or of all repositories of a batch, see record_scrape_error.
+    """
+    if isinstance(item, list):
+        return [repository_metadata if repository_path is None and isinstance(repository_metadata.get('error'), str)
+                else record_scrape_error(repository_metadata, exception, crash_triage)
+                for repository_metadata, repository_path in item]
+    return record_scrape_error(item, exception, crash_triage)
+
+
+def scrape_repository(repository_metadata: pd.Series, path_to_repositories: str,
+                      programming_language: ProgrammingLanguage, sliding_window_size: int,
+                      top_k_chains: int = None, top_k_group_by: str = TOP_K_GROUP_BY_REPOSITORY,
+                      max_chain_length: int = None, path_to_commit_indices: str = None,
+                      engine: str = 'reference', repository_cache: RepositoryCache = None) -> pd.Series:
+    """
+    Clones and then scrapes a GitHub repository, see clone_repository and scrape_cloned_repository for the parameters.
+    If a repository cache is given, the working copy is released after scraping, the mirror stays in the cache.
+
+    Returns:
+    - repository_metadata (pd.Series): The updated metadata of the GitHub repository, including any errors encountered during scraping.
+    """
+    repository_metadata, repository_path = clone_repository(repository_metadata, path_to_repositories,
+                                                            repository_cache=repository_cache)
+    if repository_path is None:
+        return repository_metadata
+    try:
+        return scrape_cloned_repository(repository_metadata, repository_path, programming_language,
+                                        sliding_window_size, top_k_chains, top_k_group_by, max_chain_length,
+                                        path_to_commit_indices, engine)
+    finally:
+        if repository_cache is not None:
+            remove_repository(repository_path, repository_cache)
+
+
 def update_repository_metadata_with_scraper_results(repo_scraper: RepositoryDataScraper,
                                                     repository_metadata: pd.Series):
     """
@@ -78,11 +374,64 @@ def update_repository_metadata_with_scraper_results(repo_scraper: RepositoryData
         [item for item in repo_scraper.accumulator['merge_scenarios'] if item['had_conflicts']]
     )
     repository_metadata['n_file_commit_gram_scenarios'] = len(
-        repo_scraper.accumulator['file_commit_gram_scenarios'])
+        repo_scraper.accumulator['file_commit_chain_scenarios'])
+    repository_metadata['n_visited_commits'] = len(repo_scraper.visited_commits)
 
     return repository_metadata
 
 
+def prescreen_repositories(repositories_metadata: pd.DataFrame, path_to_repositories: str,
+                           programming_language: ProgrammingLanguage, thresholds: PreScreenThresholds,
+                           policy: str, clone_service: CloneService, max_workers: int = 8) -> (pd.DataFrame, list):
+    """
+    Pre-screens all repositories with cheap git queries on blobless clones before they are fully cloned and scraped.
+
+    Parameters:
+    - repositories_metadata (pd.DataFrame): The metadata of the GitHub repositories from SEART.
+    - path_to_repositories (str): The path to the directory in which the temporary pre-screen clones are created.
+    - programming_language (ProgrammingLanguage): The programming language to filter files by.
+    - thresholds (PreScreenThresholds): The thresholds a repository must reach to be scraped with priority.
+    - policy (str): What to do with repositories below the thresholds, 'skip' or 'deprioritise'.
+    - clone_service (CloneService): The service the blobless clones are made with, shared with the full clones.
+    - max_workers (int): The amount of concurrent pre-screen clones, usually the concurrency of clone_service.
+        Pre-screening is network bound, so this is independent of the amount of available cores.
+
+    Returns:
+    - pd.DataFrame: The metadata of the repositories to scrape, with the estimates added as columns. Deprioritised
+        repositories are moved to the end.
+    - list: The metadata (pd.Series) of the skipped repositories, with the estimates added. These are not scraped, but
+        are still written to the output.
+    """
+    repositories_metadata = repositories_metadata.copy()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(prescreen_repository, repo['name'], path_to_repositories, programming_language,
+                                   thresholds, clone_service, policy): index
+                   for index, repo in repositories_metadata.iterrows()}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                estimate = future.result()
+                for column, value in estimate.to_dict().items():
+                    repositories_metadata.loc[index, column] = value
+            except Exception:
+                # A repository that cannot be pre-screened is scraped as usual, the full clone will surface the error
+                print(f'Pre-screening {repositories_metadata.loc[index, "name"]} failed, scraping it anyway: '
+                      f'{traceback.format_exc()}', flush=True)
+                repositories_metadata.loc[index, 'prescreen_decision'] = PRESCREEN_SCRAPE
+
+    is_skipped = repositories_metadata['prescreen_decision'] == PRESCREEN_SKIP
+    skipped_repositories = [repo for _, repo in repositories_metadata[is_skipped].iterrows()]
+    repositories_to_scrape = repositories_metadata[~is_skipped]
+    # Stable sort, so the original order is kept within both groups
+    repositories_to_scrape = repositories_to_scrape.sort_values(
+        by='prescreen_decision', key=lambda decision: decision == PRESCREEN_DEPRIORITISE, kind='stable')
+
+    print(f'Pre-screen: scraping {len(repositories_to_scrape)} repositories '
+          f'({int((repositories_to_scrape["prescreen_decision"] == PRESCREEN_DEPRIORITISE).sum())} deprioritised), '
+          f'skipping {len(skipped_repositories)}.', flush=True)
+    return repositories_to_scrape, skipped_repositories
+
+
 def on_rm_error(func, path, exc_info):
     """
     This method is called by the shutil.rmtree() function when it encounters an error while trying to remove a directory
@@ -98,6 +447,110 @@ def on_rm_error(func, path, exc_info):
     func(path)
 
 
+def remove_repository(repository_path: str, repository_cache: RepositoryCache = None) -> bool:
+    """
+    Removes the clone of a repository.
+
+    Parameters:
+    - repository_path (str): The path to the clone.
+    - repository_cache (RepositoryCache): The cache the clone was checked out from, if any. Its lease is released, so
+        the mirror can be evicted again.
+
+    Returns:
+    - bool: False if the clone could not be removed (yet), e.g. because a file in it is still in use.
+    """
+    try:
+        shutil.rmtree(repository_path, onerror=on_rm_error)
+    except PermissionError:
+        return False
+    except FileNotFoundError:
+        pass
+    if repository_cache is not None:
+        repository_cache.release(repository_path)
+    return True
+
+
+def estimate_clone_size(repository_metadata: pd.Series) -> int:
+    """
+    Estimates the bytes a clone of the repository takes on disk before cloning it.
+
+    Parameters:
+    - repository_metadata (pd.Series): The metadata of the GitHub repository from SEART.
+
+    Returns:
+    - int: The estimated size in bytes. SEART's size is the size of the repository on GitHub in KB, which roughly
+        corresponds to the packfile. The checked out working tree typically takes as much again.
+    """
+    size = repository_metadata.get('size')
+    if size is None or pd.isna(size):
+        return 0
+    return int(size) * 1024 * 2
+
+
+def record_scrape_error(repository_metadata: pd.Series, exception: BaseException,
+                        crash_triage: WorkerCrashTriage = None) -> pd.Series:
+    """
+    Records an exception raised while scraping a repository outside of scrape_cloned_repository, e.g. because the
+    worker process died. If the worker was killed because it exceeded its memory budget while scraping this
+    repository, that is recorded instead, together with the RSS it reached.
+    """
+    tombstone = crash_triage.tombstone_of(repository_metadata['name']) if crash_triage is not None else None
+    if tombstone is not None and tombstone.get('reason') == EVENT_MEMORY_BUDGET_EXCEEDED:
+        repository_metadata['error'] = f'MemoryBudgetExceeded: the scraping process reached an RSS of ' \
+                                       f'{tombstone["rss_bytes"]} bytes.'
+        repository_metadata['peak_rss_bytes'] = tombstone['rss_bytes']
+    else:
+        repository_metadata['error'] = ''.join(traceback.format_exception(exception))
+    return repository_metadata
+
+
+def record_result(run_manifest: RunManifest, result: pd.Series):
+    """
+    Records the summary of a result written to a shard, see write_result_to_shard, in the run manifest.
+    """
+    run_manifest.record_result(result['name'], result['error'] if isinstance(result['error'], str) else None,
+                               result['shard'], _none_if_missing(result.get('clone_seconds')),
+                               _none_if_missing(result.get('scrape_seconds')))
+
+
+def _none_if_missing(value):
+    return None if value is None or pd.isna(value) else float(value)
+
+
+def report_cost_model(path_to_output: str, path_to_cost_model: str):
+    """
+    Prints how well the predicted cost of the repositories matched their actual cost, and fits a cost model on the
+    actual cost which can be passed to later runs with --cost-model.
+
+    Parameters:
+    - path_to_output (str): The merged output of the run.
+    - path_to_cost_model (str): Where to save the fitted cost model.
+    """
+    results = read_cost_model_results(path_to_output)
+    if 'predicted_seconds' in results:
+        print(f'Cost model, predicted vs. actual: {cost_model_report(results)}', flush=True)
+    try:
+        cost_model = fit_cost_model(results)
+    except ValueError as e:
+        print(f'Not fitting a cost model: {e}', flush=True)
+        return
+    cost_model.save(path_to_cost_model)
+    print(f'Fitted cost model {cost_model} saved to {path_to_cost_model}.', flush=True)
+
+
+def latest_run_in(path_to_runs: str) -> str:
+    """
+    Returns:
+    - str: The path to the most recent run in path_to_runs. Runs are named by their start time, so the last in
+        lexicographic order is the most recent one.
+    """
+    runs = sorted(run for run in os.listdir(path_to_runs) if os.path.isdir(os.path.join(path_to_runs, run))) \
+        if os.path.isdir(path_to_runs) else []
+    if not runs:
+        raise FileNotFoundError(f'No run to resume in {path_to_runs}.')
+    return os.path.join(path_to_runs, runs[-1])
+
+
 def main():
     parser = ArgumentParser()
     parser.add_argument("-w", "--sliding-window-size", type=int, required=True,
@@ -106,6 +559,106 @@ def main():
                         help="The programming language to filter for. Only commits concerning files of this"
                              "programming language will be considered. Supported programming languages are:\n"
                              "'python', 'java', 'kotlin', and 'text'. The latter is only to be used for debugging.")
+    parser.add_argument("--top-k-chains", type=int, default=None,
+                        help="Only keep the k longest file-commit chains per repository, file or branch (see "
+                             "--top-k-group-by) instead of every chain. Bounds the output size per repository.")
+    parser.add_argument("--top-k-group-by", type=str, default=TOP_K_GROUP_BY_REPOSITORY,
+                        choices=[TOP_K_GROUP_BY_REPOSITORY, TOP_K_GROUP_BY_FILE, TOP_K_GROUP_BY_BRANCH],
+                        help="The group the --top-k-chains limit applies to.")
+    parser.add_argument("--max-chain-length", type=int, default=None,
+                        help="Discard file-commit chains longer than this, e.g. because they are filtered out "
+                             "downstream anyway.")
+    parser.add_argument("--commit-indices-dir", type=str, default=None,
+                        help="Build a persisted commit index per repository in this directory while scraping. The "
+                             "scraper reads the changes of each commit from it instead of running git show per "
+                             "commit, and later processing stages can reuse it instead of cloning.")
+    parser.add_argument("--engine", type=str, default='reference', choices=list(SCRAPER_ENGINES),
+                        help="The scraper implementation. 'vectorised' reads the history with a single git log and "
+                             "detects file-commit chains with NumPy, which is much faster on large repositories. "
+                             "Both engines mine the same scenarios.")
+    parser.add_argument("--clone-concurrency", type=int, default=4,
+                        help="The maximum amount of concurrent clones. Cloning is network and disk bound, so this is "
+                             "independent of the amount of available cores.")
+    parser.add_argument("--clone-rate", type=float, default=None,
+                        help="The maximum amount of clones started per second on average, e.g. to stay below the "
+                             "rate limits of GitHub.")
+    parser.add_argument("--clone-max-attempts", type=int, default=5,
+                        help="How often a clone is attempted if it fails transiently (e.g. throttling or connection "
+                             "errors), with exponential backoff in between.")
+    parser.add_argument("--mirror-dir", type=str, default=None,
+                        help="A directory with bare mirrors of the repositories (<owner>__<repository>.git or "
+                             "<owner>/<repository>.git). Repositories with a mirror are cloned from it instead of "
+                             "GitHub.")
+    parser.add_argument("--clone-url-template", type=str, default=None,
+                        help="Clone from this URL instead of GitHub, e.g. 'https://mirror.example.com/{name}.git'. "
+                             "Placeholders: {name}, {owner}, {repository} and {folder} (<owner>__<repository>).")
+    parser.add_argument("--repository-cache-dir", type=str, default=None,
+                        help="Keep bare mirrors of all cloned repositories in this directory and check out cheap "
+                             "working copies (git clone --shared) from them, so repeated runs fetch instead of clone. "
+                             "The directory can be shared by concurrent runs.")
+    parser.add_argument("--repository-cache-budget-gb", type=float, default=None,
+                        help="The maximum size of the mirrors in --repository-cache-dir. The least recently used "
+                             "mirrors which are not in use are evicted.")
+    parser.add_argument("--repository-cache-refresh-hours", type=float, default=None,
+                        help="Fetch mirrors in --repository-cache-dir which were fetched longer ago before using them. "
+                             "By default, cached mirrors are used as they are.")
+    parser.add_argument("--lookahead", type=int, default=2,
+                        help="The maximum amount of cloned repositories waiting for a free scraping worker.")
+    parser.add_argument("--disk-budget-gb", type=float, default=None,
+                        help="The maximum size of all clones in repos/. New clones are only started while the clones "
+                             "on disk and the estimated size of running clones fit into the budget.")
+    parser.add_argument("--scrape-workers", type=int, default=None,
+                        help="The amount of scraping processes. Defaults to the amount of available cores.")
+    parser.add_argument("--batch-size", type=int, default=16,
+                        help="Clone small repositories (see --batch-max-repository-mb) in batches of this size and "
+                             "scrape each batch back to back in one scraping process, which saves the fixed cost per "
+                             "task for the long tail of tiny repositories. 1 disables batching.")
+    parser.add_argument("--batch-max-repository-mb", type=float, default=5.0,
+                        help="Repositories whose clone is estimated to be at most this large (from the size in the "
+                             "metadata) are scraped in batches.")
+    parser.add_argument("--max-tasks-per-worker", type=int, default=50,
+                        help="Replace a scraping process after it scraped this many repositories, which releases "
+                             "memory accumulated by GitPython and the scraper. On Python 3.10, the whole pool is "
+                             "replaced after it scraped this many repositories per scraping process.")
+    parser.add_argument("--worker-memory-budget-gb", type=float, default=None,
+                        help="Kill a scraping process whose RSS exceeds this budget while scraping. The repository is "
+                             "recorded as failed, other repositories of the pool are scraped again.")
+    parser.add_argument("--max-scrape-attempts", type=int, default=3,
+                        help="How often a repository is scraped if its scraping process dies.")
+    parser.add_argument("--output-shards-dir", type=str, default=None,
+                        help="The directory the scraping processes write their results to as Parquet shards. "
+                             "Defaults to a new directory per run in data/output_shards. The shards are merged into "
+                             "data/output.parquet at the end of the run, but can also be read as a dataset while "
+                             "the run is still going.")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="How often (in seconds) the live metrics of the run (throughput, queue depths, worker "
+                             "utilisation, error rate and ETA) are written to metrics.json in --output-shards-dir.")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Also serve the live metrics at http://127.0.0.1:<port>/metrics.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Resume the run in --output-shards-dir (or the latest run in data/output_shards), "
+                             "skipping all repositories which were scraped successfully and whose result was already "
+                             "written to a closed shard. Failed repositories are scraped again.")
+    parser.add_argument("--schedule", type=str, default=SCHEDULE_LONGEST_FIRST,
+                        choices=[SCHEDULE_LONGEST_FIRST, SCHEDULE_CSV_ORDER],
+                        help="The order repositories are scraped in. 'longest-first' starts the repositories with the "
+                             "highest predicted cost first, so a few huge repositories do not dominate the end of the "
+                             "run. 'csv' keeps the order of the CSV file.")
+    parser.add_argument("--cost-model", type=str, default=None,
+                        help="A cost model fitted on an earlier run (the cost_model.json in its shards directory). "
+                             "Defaults to a model with rough built-in coefficients.")
+    parser.add_argument("--prescreen", type=str, default='off', choices=['off', PRESCREEN_SKIP, PRESCREEN_DEPRIORITISE],
+                        help="Pre-screen repositories with cheap git queries on blobless clones before scraping them. "
+                             "Repositories below all pre-screen thresholds are either skipped or scraped last. "
+                             "The estimates are written to the output in either case.")
+    parser.add_argument("--min-language-commits", type=int, default=None,
+                        help="Pre-screen threshold for the amount of commits changing files of the programming "
+                             "language. Defaults to the sliding window size.")
+    parser.add_argument("--min-merge-commits", type=int, default=1,
+                        help="Pre-screen threshold for the amount of merge commits.")
+    parser.add_argument("--min-cherry-pick-trailers", type=int, default=1,
+                        help="Pre-screen threshold for the amount of commits with a 'cherry picked from commit' "
+                             "trailer.")
     args = parser.parse_args()
 
     try:
@@ -118,10 +671,10 @@ def main():
 
     if programming_language is None:
         raise ValueError("Could not parse programming language. Unable to determine programming language to filter for.")
-    os.chdir('../..')
-
-    path_to_data = os.path.join(os.getcwd(), 'data')
-    path_to_repositories = os.path.join(os.getcwd(), 'repos')
+    # All paths are absolute and derived from the location of this file, so nothing depends on the working directory
+    path_to_project = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    path_to_data = os.path.join(path_to_project, 'data')
+    path_to_repositories = os.path.join(path_to_project, 'repos')
 
     if programming_language is ProgrammingLanguage.KOTLIN:
         repositories_metadata = pd.read_csv(os.path.join(path_to_data, 'kotlin_repos.csv'))
@@ -132,47 +685,150 @@ def main():
     else:
         raise ValueError("Invalid programming language. Unable to determine programming language to filter for.")
 
-    results = []
-    paths_to_directories_to_remove = []
-
-    with ProcessPoolExecutor(max_workers=None) as executor:
-        futures = [executor.submit(scrape_repository, repo, path_to_repositories,
-                                   programming_language, args.sliding_window_size)
-                   for _, repo in repositories_metadata.iterrows()]
-        for future in as_completed(futures):
-            try:
-                remaining_paths_to_directories_to_remove = []
-
-                result = future.result()
-                results.append(result)
-                paths_to_directories_to_remove.append(os.path.join(path_to_repositories,
-                                                                   "__".join(result["name"].split("/"))))
-                print(f'\n\nScraped {len(results)} repos. {results[-1]["name"]}', flush=True)
-
-                # After every success attempt to clean up directory structure
-                for path_to_directory in paths_to_directories_to_remove:
-                    try:
-                        shutil.rmtree(path_to_directory, onerror=on_rm_error)
-                    except PermissionError:
-                        remaining_paths_to_directories_to_remove.append(path_to_directory)
-                        continue
-                    except FileNotFoundError:
-                        remaining_paths_to_directories_to_remove.append(path_to_directory)
-                        continue
-
-                paths_to_directories_to_remove = remaining_paths_to_directories_to_remove
-            except Exception as e:
-                print(f'Exception occurred: {traceback.format_exc()}', flush=True)
-
-    repositories_metadata = pd.concat(results, axis=1).T
-    repositories_metadata.to_parquet(os.path.join(path_to_data, 'output.parquet'), engine='pyarrow')
+    path_to_shards = args.output_shards_dir
+    if path_to_shards is None and args.resume:
+        path_to_shards = latest_run_in(os.path.join(path_to_data, 'output_shards'))
+    elif path_to_shards is None:
+        path_to_shards = os.path.join(path_to_data, 'output_shards', datetime.now().strftime('%Y%m%d-%H%M%S'))
+    run_manifest = RunManifest(os.path.join(path_to_shards, RUN_MANIFEST_FILE_NAME))
+    if args.resume:
+        completed_repositories = run_manifest.completed_repositories(readable_shards(path_to_shards))
+        repositories_metadata = repositories_metadata[~repositories_metadata['name'].isin(completed_repositories)]
+        print(f'Resuming {path_to_shards}: skipping {len(completed_repositories)} completed repositories, '
+              f'{len(repositories_metadata)} remaining, including failed ones.', flush=True)
+    run_manifest.queue(repositories_metadata['name'])
+
+    if args.mirror_dir is not None and args.clone_url_template is not None:
+        raise ValueError('Only one of --mirror-dir and --clone-url-template can be given.')
+    if args.mirror_dir is not None:
+        url_rewrite = mirror_url_rewrite(args.mirror_dir)
+    elif args.clone_url_template is not None:
+        url_rewrite = template_url_rewrite(args.clone_url_template)
+    else:
+        url_rewrite = github_url
+    clone_service = CloneService(max_concurrency=args.clone_concurrency, rate_per_second=args.clone_rate,
+                                 max_attempts=args.clone_max_attempts, url_rewrite=url_rewrite)
+
+    skipped_repositories = []
+    if args.prescreen != 'off':
+        thresholds = PreScreenThresholds(
+            min_language_commits=args.min_language_commits if args.min_language_commits is not None
+            else args.sliding_window_size,
+            min_merge_commits=args.min_merge_commits,
+            min_cherry_pick_trailers=args.min_cherry_pick_trailers)
+        repositories_metadata, skipped_repositories = prescreen_repositories(
+            repositories_metadata, path_to_repositories, programming_language, thresholds, args.prescreen,
+            clone_service, max_workers=args.clone_concurrency)
+
+    if args.schedule == SCHEDULE_LONGEST_FIRST:
+        cost_model = CostModel.load(args.cost_model) if args.cost_model is not None else CostModel()
+        repositories_metadata = order_longest_first(repositories_metadata, cost_model)
+
+    # The parent only writes results which never reach a scraping process: skipped repositories, failed clones and
+    # repositories whose scraping process died. Everything else is written by the scraping processes themselves.
+    shard_schema = shard_schema_for(repositories_metadata)
+    shard_writer = ParquetShardWriter(path_to_shards, shard_schema)
+    for repository_metadata in skipped_repositories:
+        record_result(run_manifest, write_result_to_shard(shard_writer, repository_metadata))
+
+    repository_cache = None
+    if args.repository_cache_dir is not None:
+        repository_cache = RepositoryCache(
+            args.repository_cache_dir,
+            disk_budget_bytes=int(args.repository_cache_budget_gb * 1024 ** 3)
+            if args.repository_cache_budget_gb is not None else None,
+            clone_service=clone_service,
+            refresh_after_seconds=args.repository_cache_refresh_hours * 3600
+            if args.repository_cache_refresh_hours is not None else None)
+
+    n_results, n_errors = len(skipped_repositories), 0
+    scrape_workers = args.scrape_workers if args.scrape_workers is not None else os.cpu_count()
+    worker_memory_budget_bytes = int(args.worker_memory_budget_gb * 1024 ** 3) \
+        if args.worker_memory_budget_gb is not None else None
+    pool_arguments, max_tasks_per_worker, retire_pool_after_submissions = {}, None, None
+    if sys.version_info >= (3, 11):
+        # Recycled workers are started with spawn, forking a process with threads is not supported
+        max_tasks_per_worker = pool_arguments['max_tasks_per_child'] = args.max_tasks_per_worker
+    else:
+        # Pools of Python 3.10 cannot replace single workers, so the whole pool is replaced instead
+        retire_pool_after_submissions = scrape_workers * args.max_tasks_per_worker
+    crash_triage = WorkerCrashTriage(path_to_shards, max_attempts=args.max_scrape_attempts)
+    # Scraping processes which are killed with a dead sibling never close their shards, so the results they already
+    # reported are lost. Those repositories are scraped again in another pass.
+    repositories_to_scrape, paths_to_remove = repositories_metadata, []
+    for scraping_pass in range(args.max_scrape_attempts):
+        with RebuildingExecutor(partial(
+                ProcessPoolExecutor, max_workers=scrape_workers, initializer=initialise_scraping_worker,
+                initargs=(path_to_shards, shard_schema, worker_memory_budget_bytes, max_tasks_per_worker),
+                **pool_arguments), path_to_run=path_to_shards,
+                retire_after_submissions=retire_pool_after_submissions) as executor:
+            pipeline = CloneScrapePipeline(
+                clone=partial(clone_scraping_item, path_to_repositories=path_to_repositories,
+                              clone_service=clone_service, repository_cache=repository_cache),
+                scrape=partial(scrape_scraping_item_into_shard, programming_language=programming_language,
+                               sliding_window_size=args.sliding_window_size, top_k_chains=args.top_k_chains,
+                               top_k_group_by=args.top_k_group_by, max_chain_length=args.max_chain_length,
+                               path_to_commit_indices=args.commit_indices_dir, engine=args.engine),
+                remove=partial(remove_repository, repository_cache=repository_cache),
+                scrape_executor=executor,
+                scrape_concurrency=scrape_workers,
+                clone_concurrency=args.clone_concurrency,
+                lookahead=args.lookahead,
+                disk_budget_bytes=int(args.disk_budget_gb * 1024 ** 3) if args.disk_budget_gb is not None else None,
+                estimate_size=estimate_scraping_item_size,
+                on_scrape_error=partial(record_scraping_item_error, crash_triage=crash_triage),
+                retry_scrape=partial(retry_scraping_item, crash_triage=crash_triage),
+                on_clone_error=record_clone_error)
+            telemetry = RunTelemetry(len(repositories_to_scrape), scrape_workers,
+                                     path_to_metrics=os.path.join(path_to_shards, METRICS_FILE_NAME),
+                                     flush_interval_seconds=args.metrics_interval, http_port=args.metrics_port,
+                                     stage_sizes=pipeline.stage_sizes, cloned_bytes=lambda: pipeline.cloned_bytes,
+                                     busy_workers=pipeline.busy_workers)
+            batch_max_repository_bytes = args.batch_max_repository_mb * 1024 ** 2
+            scraping_items = batch_small_repositories(
+                (repo for _, repo in repositories_to_scrape.iterrows()),
+                is_small=lambda repository_metadata:
+                    0 < estimate_clone_size(repository_metadata) <= batch_max_repository_bytes,
+                batch_size=args.batch_size)
+            with telemetry:
+                for item_results in pipeline.run(scraping_items):
+                    for result in item_results if isinstance(item_results, list) else [item_results]:
+                        if 'shard' not in result:
+                            # Failed clone or dead scraping process
+                            result = write_result_to_shard(shard_writer, result)
+                        record_result(run_manifest, result)
+                        telemetry.record_result(result)
+                        n_results += 1
+                        n_errors += isinstance(result['error'], str)
+                        print(f'\n\nScraped {n_results} repos ({n_errors} with errors). {result["name"]}', flush=True)
+        shard_writer.close()
+        paths_to_remove.extend(pipeline.paths_to_remove)
+        lost_repositories = run_manifest.reset_lost_results(readable_shards(path_to_shards))
+        if not lost_repositories:
+            break
+        n_results -= len(lost_repositories)
+        repositories_to_scrape = repositories_metadata[repositories_metadata['name'].isin(lost_repositories)]
+        print(f'Lost the results of {len(lost_repositories)} repositories in unclosed shards. '
+              + ('Scraping them again.' if scraping_pass + 1 < args.max_scrape_attempts else 'Giving up on them.'),
+              flush=True)
+    clone_service.close()
+    print(f'Clones: {clone_service.statistics}', flush=True)
+    print(f'Run manifest: {run_manifest.status_counts()}', flush=True)
+    print(f'Scraping processes: {worker_event_counts(path_to_shards)}', flush=True)
+    shards_of_repositories = run_manifest.shards_of_repositories()
+    run_manifest.close()
+
+    n_rows = merge_shards(path_to_shards, os.path.join(path_to_data, 'output.parquet'), shards_of_repositories)
+    print(f'Merged {n_rows} results from {path_to_shards} into {os.path.join(path_to_data, "output.parquet")}.',
+          flush=True)
+    report_cost_model(os.path.join(path_to_data, 'output.parquet'), os.path.join(path_to_shards, COST_MODEL_FILE_NAME))
 
     # Clean up any remaining repositories created by the scraping process in the repository directory
-    for path_to_directory in paths_to_directories_to_remove:
-        try:
-            shutil.rmtree(path_to_directory, onerror=on_rm_error)
-        except PermissionError:
-            continue
+    for path_to_directory in paths_to_remove:
+        remove_repository(path_to_directory, repository_cache)
+    if repository_cache is not None:
+        print(f'Repository cache: {round(repository_cache.size_bytes() / 1024 ** 3, 2)} GB of mirrors in '
+              f'{repository_cache.path_to_cache}.', flush=True)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,243 @@
+import os
+import shutil
+import sqlite3
+import subprocess
+import threading
+import uuid
+from contextlib import contextmanager
+from time import time
+from typing import Iterator, Optional
+
+from git import GitCommandError
+
+from src.repository_data_scraper.clone_service import CloneService
+from src.repository_data_scraper.scraping_pipeline import directory_size
+
+
+def _is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class RepositoryCache:
+    """
+    Disk-budgeted cache of bare mirrors, from which cheap working copies are checked out.
+
+    Each repository is cloned once into a bare mirror of its branches and tags. Users check out a working copy with
+    `git clone --shared`, which borrows all objects from the mirror and has the same refs as a clone from GitHub
+    (refs/remotes/origin/* and the default branch), so scraping a working copy yields the same scenarios. Mirrors
+    are refreshed with `git fetch` instead of being cloned again.
+
+    Every checkout is recorded as a lease in the sqlite index of the cache. A lease ends when its working copy is
+    released or removed, or when the process holding it died. Mirrors with leases are never evicted. If the mirrors
+    exceed the disk budget, the least recently used mirrors without leases are evicted. The cache directory can be
+    shared by several processes.
+    """
+
+    def __init__(self, path_to_cache: str, disk_budget_bytes: Optional[int] = None,
+                 clone_service: Optional[CloneService] = None, refresh_after_seconds: Optional[float] = None):
+        """
+        Args:
+            path_to_cache (str): The directory of the cache.
+            disk_budget_bytes (Optional[int]): If set, the maximum size of all mirrors.
+            clone_service (Optional[CloneService]): The service to clone mirrors with. Defaults to cloning from GitHub.
+            refresh_after_seconds (Optional[float]): If set, mirrors fetched longer ago than this are fetched before
+                a checkout. Otherwise mirrors are never refreshed.
+        """
+        self.path_to_cache = os.path.abspath(path_to_cache)
+        self.path_to_mirrors = os.path.join(self.path_to_cache, 'mirrors')
+        self.path_to_working_copies = os.path.join(self.path_to_cache, 'working_copies')
+        os.makedirs(self.path_to_mirrors, exist_ok=True)
+        os.makedirs(self.path_to_working_copies, exist_ok=True)
+        self.disk_budget_bytes = disk_budget_bytes
+        self.clone_service = clone_service if clone_service is not None else CloneService()
+        self.refresh_after_seconds = refresh_after_seconds
+
+        self._path_to_index = os.path.join(self.path_to_cache, 'index.sqlite')
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        with self._connect() as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS mirrors (name TEXT PRIMARY KEY, size_bytes INTEGER NOT NULL,
+                                                    fetched_at REAL NOT NULL, last_used_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS leases (path TEXT PRIMARY KEY, name TEXT NOT NULL, pid INTEGER NOT NULL,
+                                                   acquired_at REAL NOT NULL, checked_out INTEGER NOT NULL DEFAULT 0);
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per operation, so the cache can be used from several threads and processes
+        return sqlite3.connect(self._path_to_index, timeout=60)
+
+    def _lock_for(self, repository_name: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(repository_name, threading.Lock())
+
+    def path_to_mirror_of(self, repository_name: str) -> str:
+        """
+        Returns:
+            str: The location of the mirror of the repository '<owner>/<repository>'.
+        """
+        return os.path.join(self.path_to_mirrors, "__".join(repository_name.split("/")) + '.git')
+
+    def checkout(self, repository_name: str, path_to_working_copy: Optional[str] = None) -> str:
+        """
+        Checks out a working copy of the repository, cloning or refreshing its mirror if necessary. The working copy
+        is leased until it is released (or removed).
+
+        Args:
+            repository_name (str): The name of the repository, '<owner>/<repository>'.
+            path_to_working_copy (Optional[str]): Where to check out the working copy. Defaults to a new directory
+                in the cache.
+
+        Returns:
+            str: The path to the working copy.
+
+        Raises:
+            GitCommandError: If the mirror could not be cloned or the working copy could not be checked out. Like for
+                Repo.clone_from, stderr contains 'already exists' if path_to_working_copy is not empty.
+        """
+        if path_to_working_copy is None:
+            path_to_working_copy = os.path.join(self.path_to_working_copies,
+                                                f'{"__".join(repository_name.split("/"))}-{uuid.uuid4().hex[:8]}')
+        path_to_working_copy = os.path.abspath(path_to_working_copy)
+
+        # Lease first, so the mirror cannot be evicted while it is prepared
+        with self._connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO leases (path, name, pid, acquired_at) VALUES (?, ?, ?, ?)',
+                               (path_to_working_copy, repository_name, os.getpid(), time()))
+        try:
+            path_to_mirror = self._ensure_mirror(repository_name)
+            command = ['git', 'clone', '--shared', '-q', path_to_mirror, path_to_working_copy]
+            result = subprocess.run(command, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise GitCommandError(command, result.returncode, result.stderr)
+        except Exception:
+            self._end_lease(path_to_working_copy)
+            raise
+
+        with self._connect() as connection:
+            connection.execute('UPDATE leases SET checked_out = 1 WHERE path = ?', (path_to_working_copy,))
+        self._evict_if_over_budget()
+        return path_to_working_copy
+
+    def release(self, path_to_working_copy: str):
+        """
+        Removes a working copy and ends its lease.
+        """
+        path_to_working_copy = os.path.abspath(path_to_working_copy)
+        shutil.rmtree(path_to_working_copy, ignore_errors=True)
+        self._end_lease(path_to_working_copy)
+        self._evict_if_over_budget()
+
+    @contextmanager
+    def lease(self, repository_name: str, path_to_working_copy: Optional[str] = None) -> Iterator[str]:
+        """
+        Context manager checking out a working copy (see checkout) and releasing it on exit.
+        """
+        path_to_working_copy = self.checkout(repository_name, path_to_working_copy)
+        try:
+            yield path_to_working_copy
+        finally:
+            self.release(path_to_working_copy)
+
+    def _end_lease(self, path_to_working_copy: str):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM leases WHERE path = ?', (path_to_working_copy,))
+
+    def _ensure_mirror(self, repository_name: str) -> str:
+        path_to_mirror = self.path_to_mirror_of(repository_name)
+        with self._lock_for(repository_name):
+            now = time()
+            if not os.path.isdir(path_to_mirror):
+                # Clone next to the mirror and publish it with an atomic rename, so concurrent processes never see a
+                # partial mirror
+                path_to_temporary_mirror = f'{path_to_mirror}.{uuid.uuid4().hex[:8]}.tmp'
+                try:
+                    self.clone_service.clone_repository(repository_name, path_to_temporary_mirror, '--bare')
+                    for arguments in [['config', 'remote.origin.fetch', '+refs/heads/*:refs/heads/*'],
+                                      ['config', '--add', 'remote.origin.fetch', '+refs/tags/*:refs/tags/*'],
+                                      # Objects of the mirror are borrowed by working copies, so they must never be
+                                      # pruned by an automatic gc
+                                      ['config', 'gc.auto', '0']]:
+                        subprocess.run(['git', '-C', path_to_temporary_mirror, *arguments], check=True)
+                    os.rename(path_to_temporary_mirror, path_to_mirror)
+                except OSError:
+                    # Another process published the mirror first
+                    if not os.path.isdir(path_to_mirror):
+                        raise
+                finally:
+                    shutil.rmtree(path_to_temporary_mirror, ignore_errors=True)
+                self._record_mirror(repository_name, path_to_mirror, fetched_at=now)
+            elif self.refresh_after_seconds is not None and \
+                    now - self._fetched_at(repository_name) > self.refresh_after_seconds:
+                result = subprocess.run(['git', '-C', path_to_mirror, 'fetch', '--prune', '-q', 'origin'],
+                                        capture_output=True, text=True)
+                # A mirror that cannot be refreshed is still better than none, e.g. if the remote is unreachable
+                self._record_mirror(repository_name, path_to_mirror,
+                                    fetched_at=now if result.returncode == 0 else self._fetched_at(repository_name))
+            else:
+                with self._connect() as connection:
+                    updated = connection.execute('UPDATE mirrors SET last_used_at = ? WHERE name = ?',
+                                                 (now, repository_name)).rowcount
+                if not updated:
+                    self._record_mirror(repository_name, path_to_mirror, fetched_at=now)
+        return path_to_mirror
+
+    def _fetched_at(self, repository_name: str) -> float:
+        with self._connect() as connection:
+            row = connection.execute('SELECT fetched_at FROM mirrors WHERE name = ?', (repository_name,)).fetchone()
+        return row[0] if row is not None else 0.0
+
+    def _record_mirror(self, repository_name: str, path_to_mirror: str, fetched_at: float):
+        with self._connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO mirrors (name, size_bytes, fetched_at, last_used_at) '
+                               'VALUES (?, ?, ?, ?)', (repository_name, directory_size(path_to_mirror), fetched_at,
+                                                       time()))
+
+    @staticmethod
+    def _names_with_live_leases(connection: sqlite3.Connection) -> set:
+        """
+        Returns the names of all repositories with live leases and deletes the others. A lease is live while its
+        process is alive and its working copy is being checked out or still exists, so working copies which were
+        removed without release, e.g. by the mappers, do not keep their mirror forever.
+        """
+        names = set()
+        for path, name, pid, is_checked_out in connection.execute(
+                'SELECT path, name, pid, checked_out FROM leases').fetchall():
+            if _is_process_alive(pid) and (not is_checked_out or os.path.exists(path)):
+                names.add(name)
+            else:
+                connection.execute('DELETE FROM leases WHERE path = ?', (path,))
+        return names
+
+    def size_bytes(self) -> int:
+        """
+        Returns:
+            int: The total size of all mirrors.
+        """
+        with self._connect() as connection:
+            return connection.execute('SELECT COALESCE(SUM(size_bytes), 0) FROM mirrors').fetchone()[0]
+
+    def _evict_if_over_budget(self):
+        """
+        Evicts the least recently used mirrors without live leases until all mirrors fit into the disk budget.
+        """
+        if self.disk_budget_bytes is None:
+            return
+        with self._connect() as connection:
+            leased_names = self._names_with_live_leases(connection)
+            total_size = connection.execute('SELECT COALESCE(SUM(size_bytes), 0) FROM mirrors').fetchone()[0]
+            for name, size_bytes in connection.execute(
+                    'SELECT name, size_bytes FROM mirrors ORDER BY last_used_at').fetchall():
+                if total_size <= self.disk_budget_bytes:
+                    break
+                if name in leased_names:
+                    continue
+                shutil.rmtree(self.path_to_mirror_of(name), ignore_errors=True)
+                connection.execute('DELETE FROM mirrors WHERE name = ?', (name,))
+                total_size -= size_bytes
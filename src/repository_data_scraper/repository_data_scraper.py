@@ -5,9 +5,11 @@ import re
 from queue import Queue
 from tqdm import tqdm
 from src.repository_data_scraper.programming_language import ProgrammingLanguage
+from src.repository_data_scraper.commit_index import CommitIndex
+from src.repository_data_scraper.top_k_chains import TopKFileCommitChains, TOP_K_GROUP_BY_REPOSITORY
 import hashlib
 from time import time
-from typing import List, Dict
+from typing import List, Dict, Optional
 from warnings import warn
 
 
@@ -33,13 +35,32 @@ class RepositoryDataScraper:
     _cherry_pick_pattern = None
 
     def __init__(self, repository: Repo, programming_language: ProgrammingLanguage, repository_name: str,
-                 sliding_window_size: int = 3):
+                 sliding_window_size: int = 3, top_k_chains: Optional[int] = None,
+                 top_k_group_by: str = TOP_K_GROUP_BY_REPOSITORY, max_chain_length: Optional[int] = None,
+                 commit_index: Optional[CommitIndex] = None):
+        """
+        Args:
+            repository (Repo): The repository to scrape.
+            programming_language (ProgrammingLanguage): Only commits concerning files of this programming language are
+                considered.
+            repository_name (str): The name of the repository, used for logging.
+            sliding_window_size (int): The minimum length of mined file-commit chains.
+            top_k_chains (Optional[int]): If set, only the top_k_chains longest file-commit chains per group are kept
+                instead of every chain.
+            top_k_group_by (str): The group the top_k_chains limit applies to: 'repository', 'file' or 'branch'.
+            max_chain_length (Optional[int]): If set, file-commit chains longer than this are discarded.
+            commit_index (Optional[CommitIndex]): If given, the changes in each commit are looked up in this index
+                instead of running `git show` for every commit.
+        """
         if repository is None:
             raise ValueError("Please provide a repository instance to scrape from.")
 
         self.repository = repository
         self.sliding_window_size = sliding_window_size
+        self.max_chain_length = max_chain_length
         self.programming_language = programming_language
+        self.commit_index = commit_index
+        self._top_k_chains = TopKFileCommitChains(top_k_chains, top_k_group_by) if top_k_chains is not None else None
 
         self.repository_name = repository_name
 
@@ -57,18 +78,30 @@ class RepositoryDataScraper:
     def update_accumulator_with_file_commit_chain_scenario(self, file_state: dict, file_to_remove: str, branch: str):
         """
         Updates the accumulator with the state at the given branch and file_to_remove with a file-commit chain scenario
-        if the scenario at branch and file_to_remove is >= self.sliding_window_size long.
+        if the scenario at branch and file_to_remove is >= self.sliding_window_size long (and at most
+        self.max_chain_length long, if set).
+
+        If only the top-k chains are kept, the scenario is pushed to the bounded heaps instead, which are written to
+        the accumulator at the end of scrape().
 
         Args:
             file_state: (dict): A dictionary containing the state of the file.
             file_to_remove (str): The name of the file to be removed.
             branch (str): The name of the branch where the file exists.
         """
-        if file_state['times_seen_consecutively'] >= self.sliding_window_size:
-            self.accumulator['file_commit_chain_scenarios'].append(
-                {'file': file_to_remove, 'branch': branch, 'oldest_commit': file_state['oldest_commit'],
-                 'newest_commit': file_state['newest_commit'],
-                 'times_seen_consecutively': file_state['times_seen_consecutively']})
+        times_seen_consecutively = file_state['times_seen_consecutively']
+        if times_seen_consecutively < self.sliding_window_size or \
+                (self.max_chain_length is not None and times_seen_consecutively > self.max_chain_length):
+            return
+
+        file_commit_chain_scenario = {'file': file_to_remove, 'branch': branch,
+                                      'oldest_commit': file_state['oldest_commit'],
+                                      'newest_commit': file_state['newest_commit'],
+                                      'times_seen_consecutively': times_seen_consecutively}
+        if self._top_k_chains is not None:
+            self._top_k_chains.push(file_commit_chain_scenario)
+        else:
+            self.accumulator['file_commit_chain_scenarios'].append(file_commit_chain_scenario)
 
     def scrape(self):
         """
@@ -174,6 +207,9 @@ class RepositoryDataScraper:
             # Clean up
             self.state = {}
 
+        if self._top_k_chains is not None:
+            self.accumulator['file_commit_chain_scenarios'] = self._top_k_chains.chains()
+
         start = time()
         self.accumulator[
             'cherry_pick_scenarios'] += self._mine_commits_with_duplicate_messages_for_cherry_pick_scenarios()
@@ -287,7 +323,8 @@ class RepositoryDataScraper:
         """
         Generates a list of changes in a commit using git show with arguments: name_status=True, format='oneline'.
         Contains only actual changes. Changes start with a change type followed by the affected file(s).
-        Can affect multiple files for e.g. renaming.
+        Can affect multiple files for e.g. renaming. If a commit index containing the commit is available, the changes
+        are read from the index instead.
 
         Args:
             commit (Commit): The commit object representing the commit for which changes are to be retrieved.
@@ -295,6 +332,9 @@ class RepositoryDataScraper:
         Returns:
             List: A list of strings representing the changes in the given commit.
         """
+        if self.commit_index is not None and self.commit_index.contains(commit.hexsha):
+            return self.commit_index.name_status(commit.hexsha)
+
         changes_in_commit = self.repository.git.show(commit, name_status=True, format='oneline').split('\n')
         changes_in_commit = changes_in_commit[1:]  # remove commit hash and message
         changes_in_commit = [change for change in changes_in_commit if change]  # filter empty lines
@@ -0,0 +1,120 @@
+import os
+import shutil
+import stat
+import subprocess
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+from src.repository_data_scraper.clone_service import CloneService
+from src.repository_data_scraper.programming_language import ProgrammingLanguage
+
+PRESCREEN_SCRAPE = 'scrape'
+PRESCREEN_DEPRIORITISE = 'deprioritise'
+PRESCREEN_SKIP = 'skip'
+
+
+@dataclass
+class PreScreenThresholds:
+    """
+    Thresholds below which a repository is not expected to yield any scenarios.
+
+    A repository passes the pre-screen if ANY of its estimates reaches the corresponding threshold, since each
+    estimate bounds a different scenario type:
+        - min_language_commits: File-commit chains need at least sliding_window_size commits changing files of the
+            programming language.
+        - min_merge_commits: Merge scenarios need merge commits.
+        - min_cherry_pick_trailers: Cherry-pick scenarios are mostly found via the trailer added by `git cherry-pick -x`.
+    """
+    min_language_commits: int = 3
+    min_merge_commits: int = 1
+    min_cherry_pick_trailers: int = 1
+
+
+@dataclass
+class RepositoryEstimate:
+    """
+    Cheap estimates of the size of a repository's history and the amount of scenarios it may contain.
+    """
+    estimated_total_commits: int
+    estimated_language_commits: int
+    estimated_merge_commits: int
+    estimated_cherry_pick_trailers: int
+    prescreen_decision: Optional[str] = None
+
+    def passes(self, thresholds: PreScreenThresholds) -> bool:
+        return (self.estimated_language_commits >= thresholds.min_language_commits
+                or self.estimated_merge_commits >= thresholds.min_merge_commits
+                or self.estimated_cherry_pick_trailers >= thresholds.min_cherry_pick_trailers)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _count(path_to_repository: str, *rev_list_args: str) -> int:
+    output = subprocess.run(['git', '-C', path_to_repository, 'rev-list', '--count', '--all', *rev_list_args],
+                            capture_output=True, text=True, check=True).stdout
+    return int(output.strip() or 0)
+
+
+def estimate_repository(path_to_repository: str, programming_language: ProgrammingLanguage) -> RepositoryEstimate:
+    """
+    Estimates the scenario potential of a repository with four `git rev-list --count` queries. None of them needs
+    file contents, so they also work on bare, blobless clones.
+
+    Args:
+        path_to_repository (str): Path to the (possibly bare and blobless) repository.
+        programming_language (ProgrammingLanguage): The programming language the scraper will filter for.
+
+    Returns:
+        RepositoryEstimate: The estimates, without a decision.
+    """
+    return RepositoryEstimate(
+        estimated_total_commits=_count(path_to_repository),
+        estimated_language_commits=_count(path_to_repository, '--', f'*{programming_language.value}'),
+        estimated_merge_commits=_count(path_to_repository, '--merges'),
+        estimated_cherry_pick_trailers=_count(path_to_repository, '--fixed-strings',
+                                              '--grep=cherry picked from commit')
+    )
+
+
+def _on_rm_error(func, path, exc_info):
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
+
+
+def prescreen_repository(repository_name: str, path_to_prescreen_clones: str,
+                         programming_language: ProgrammingLanguage, thresholds: PreScreenThresholds,
+                         clone_service: CloneService, policy: str = PRESCREEN_SKIP) -> RepositoryEstimate:
+    """
+    Pre-screens a GitHub repository before it is fully cloned and scraped.
+
+    Creates a bare, blobless clone (commits and trees only) which is a fraction of the size of a full clone, runs
+    estimate_repository on it and removes it again. The clone goes through clone_service, so it shares the
+    concurrency limit, rate limit, retries and URL rewrite of the full clones.
+
+    Args:
+        repository_name (str): The name of the GitHub repository, i.e. '<owner>/<repository>'.
+        path_to_prescreen_clones (str): Directory in which the temporary blobless clone is created.
+        programming_language (ProgrammingLanguage): The programming language the scraper will filter for.
+        thresholds (PreScreenThresholds): The thresholds a repository must reach to be scraped with priority.
+        clone_service (CloneService): The service to clone the repository with.
+        policy (str): What to do with repositories below the thresholds, either PRESCREEN_SKIP or
+            PRESCREEN_DEPRIORITISE.
+
+    Returns:
+        RepositoryEstimate: The estimates with prescreen_decision set to PRESCREEN_SCRAPE or policy.
+    """
+    if policy not in [PRESCREEN_SKIP, PRESCREEN_DEPRIORITISE]:
+        raise ValueError(f'Invalid pre-screen policy: {policy}. Valid values are: '
+                         f'"{PRESCREEN_SKIP}", "{PRESCREEN_DEPRIORITISE}"')
+
+    path_to_clone = os.path.join(path_to_prescreen_clones, "__".join(repository_name.split("/")) + '.git')
+    try:
+        clone_service.clone_repository(repository_name, path_to_clone, '--bare', '--filter=blob:none').close()
+        estimate = estimate_repository(path_to_clone, programming_language)
+    finally:
+        if os.path.exists(path_to_clone):
+            shutil.rmtree(path_to_clone, onerror=_on_rm_error)
+
+    estimate.prescreen_decision = PRESCREEN_SCRAPE if estimate.passes(thresholds) else policy
+    return estimate
@@ -0,0 +1,192 @@
+import json
+import math
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.repository_data_scraper.repository_prescreen import PRESCREEN_DEPRIORITISE
+
+SCHEDULE_CSV_ORDER = 'csv'
+SCHEDULE_LONGEST_FIRST = 'longest-first'
+
+COST_MODEL_FILE_NAME = 'cost_model.json'
+
+# The SEART metadata columns the cost is estimated from. commits is replaced by the pre-screen's count of all commits
+# if available, since SEART only counts the commits of the default branch.
+COST_FEATURES = ['commits', 'branches', 'size']
+
+# The columns of the output of a run the cost model is fitted on and compared with
+COST_MODEL_COLUMNS = [*COST_FEATURES, 'estimated_total_commits', 'predicted_seconds', 'clone_seconds',
+                      'scrape_seconds', 'error']
+
+
+def _default_coefficients() -> Dict[str, float]:
+    # Rough starting point until a model is fitted on a run: scraping walks every branch, so the cost grows about
+    # linearly with the commits and sublinearly with the branches. The size mostly adds clone time.
+    return {'commits': 1.0, 'branches': 0.3, 'size': 0.15}
+
+
+@dataclass
+class CostModel:
+    """
+    Log-linear model of the seconds it takes to clone and scrape a repository:
+    log(seconds) = intercept + sum of coefficient * log(1 + feature) over COST_FEATURES.
+
+    Only the ranking of the predictions matters for longest-first scheduling, but fitted models also predict the
+    absolute cost, which is reported next to the actual cost of each run so the model can be tuned.
+    """
+    intercept: float = -6.0
+    coefficients: Dict[str, float] = field(default_factory=_default_coefficients)
+
+    def features(self, repositories_metadata: pd.DataFrame) -> pd.DataFrame:
+        """
+        Returns:
+            pd.DataFrame: log(1 + feature) per repository and feature. Missing values count as 0.
+        """
+        features = pd.DataFrame(index=repositories_metadata.index)
+        for feature in self.coefficients:
+            values = pd.to_numeric(repositories_metadata[feature], errors='coerce') \
+                if feature in repositories_metadata else pd.Series(np.nan, index=repositories_metadata.index)
+            if feature == 'commits' and 'estimated_total_commits' in repositories_metadata:
+                values = pd.to_numeric(repositories_metadata['estimated_total_commits'],
+                                       errors='coerce').fillna(values)
+            features[feature] = np.log1p(values.fillna(0).clip(lower=0).astype(float))
+        return features
+
+    def predict(self, repositories_metadata: pd.DataFrame) -> pd.Series:
+        """
+        Returns:
+            pd.Series: The predicted seconds per repository.
+        """
+        features = self.features(repositories_metadata)
+        log_seconds = self.intercept + sum(features[feature] * coefficient
+                                           for feature, coefficient in self.coefficients.items())
+        return np.exp(log_seconds)
+
+    def save(self, path_to_model: str):
+        with open(path_to_model, 'w') as file:
+            json.dump(asdict(self), file, indent=2)
+
+    @classmethod
+    def load(cls, path_to_model: str) -> 'CostModel':
+        with open(path_to_model) as file:
+            return cls(**json.load(file))
+
+
+def actual_seconds(results: pd.DataFrame) -> pd.Series:
+    """
+    Returns:
+        pd.Series: The seconds cloning and scraping took per repository, NaN if either was not recorded.
+    """
+    return results['clone_seconds'] + results['scrape_seconds']
+
+
+def read_cost_model_results(path_to_output: str) -> pd.DataFrame:
+    """
+    Reads the COST_MODEL_COLUMNS of the output of a run, without e.g. its scraped data, for fit_cost_model and
+    cost_model_report.
+    """
+    names = set(pq.read_schema(path_to_output).names)
+    return pd.read_parquet(path_to_output, columns=[column for column in COST_MODEL_COLUMNS if column in names])
+
+
+def fit_cost_model(results: pd.DataFrame, features: Sequence[str] = tuple(COST_FEATURES)) -> CostModel:
+    """
+    Fits a cost model by least squares on the log of the actual seconds of successfully scraped repositories.
+
+    Args:
+        results (pd.DataFrame): The output of a run, with the metadata, clone_seconds, scrape_seconds and error columns.
+        features (Sequence[str]): The features to fit coefficients for.
+
+    Returns:
+        CostModel: The fitted model.
+
+    Raises:
+        ValueError: If there are fewer successfully scraped repositories than parameters to fit.
+    """
+    seconds = actual_seconds(results)
+    is_usable = seconds.notna() & (seconds > 0)
+    if 'error' in results:
+        is_usable &= results['error'].isna()
+    results = results[is_usable]
+    if len(results) <= len(features):
+        raise ValueError(f'At least {len(features) + 1} successfully scraped repositories are needed to fit the cost '
+                         f'model, got {len(results)}.')
+
+    feature_matrix = CostModel(coefficients={feature: 0.0 for feature in features}).features(results)
+    design = np.column_stack([np.ones(len(results)), feature_matrix.to_numpy()])
+    solution, *_ = np.linalg.lstsq(design, np.log(seconds[is_usable].to_numpy()), rcond=None)
+    return CostModel(intercept=float(solution[0]),
+                     coefficients={feature: float(coefficient) for feature, coefficient in zip(features, solution[1:])})
+
+
+def order_longest_first(repositories_metadata: pd.DataFrame, cost_model: CostModel) -> pd.DataFrame:
+    """
+    Orders repositories by descending predicted cost, so the most expensive ones do not start last and leave all other
+    workers idle at the end of a run. Repositories deprioritised by the pre-screen stay at the end.
+
+    Returns:
+        pd.DataFrame: The ordered metadata with the prediction in the predicted_seconds column.
+    """
+    repositories_metadata = repositories_metadata.copy()
+    repositories_metadata['predicted_seconds'] = cost_model.predict(repositories_metadata)
+    sort_keys = pd.DataFrame({'predicted_seconds': -repositories_metadata['predicted_seconds'],
+                              'is_deprioritised': repositories_metadata['prescreen_decision'] == PRESCREEN_DEPRIORITISE
+                              if 'prescreen_decision' in repositories_metadata else False})
+    order = sort_keys.sort_values(by=['is_deprioritised', 'predicted_seconds'], kind='stable').index
+    return repositories_metadata.loc[order]
+
+
+def cost_model_report(results: pd.DataFrame) -> dict:
+    """
+    Compares the predicted with the actual cost of the successfully scraped repositories of a run.
+
+    Returns:
+        dict: The amount of repositories compared, the rank correlation of predicted and actual seconds (1 means
+            the longest-first order was perfect), the median factor by which predictions were off and the total
+            predicted and actual seconds.
+    """
+    seconds = actual_seconds(results)
+    is_comparable = seconds.notna() & results['predicted_seconds'].notna() & (seconds > 0)
+    if 'error' in results:
+        is_comparable &= results['error'].isna()
+    predicted, actual = results.loc[is_comparable, 'predicted_seconds'], seconds[is_comparable]
+    if len(actual) < 2:
+        return {'repositories': int(len(actual))}
+    return {'repositories': int(len(actual)),
+            'rank_correlation': round(float(predicted.corr(actual, method='spearman')), 3),
+            'median_error_factor': round(math.exp(float(np.median(np.abs(np.log(predicted / actual))))), 2),
+            'total_predicted_seconds': round(float(predicted.sum()), 1),
+            'total_actual_seconds': round(float(actual.sum()), 1)}
+
+
+def batch_small_repositories(repositories: Iterable[pd.Series], is_small: Callable[[pd.Series], bool],
+                             batch_size: int) -> Iterator[Union[pd.Series, List[pd.Series]]]:
+    """
+    Groups small repositories into batches, which are cloned together and scraped back to back by one warm worker,
+    so the fixed cost of dispatching a task is paid once per batch instead of once per repository.
+
+    Args:
+        repositories (Iterable[pd.Series]): The metadata of the repositories, in the order they are scraped.
+        is_small (Callable[[pd.Series], bool]): Whether a repository is small enough to be batched, e.g. by its
+            estimated size.
+        batch_size (int): The maximum amount of repositories per batch. 1 disables batching.
+
+    Yields:
+        Union[pd.Series, List[pd.Series]]: The other repositories on their own and the small ones in lists. A batch is
+            yielded once it is full, so the order of the repositories is kept as far as possible.
+    """
+    batch = []
+    for repository_metadata in repositories:
+        if batch_size <= 1 or not is_small(repository_metadata):
+            yield repository_metadata
+            continue
+        batch.append(repository_metadata)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,270 @@
+import json
+import math
+import os
+import sys
+import threading
+import uuid
+from multiprocessing.util import Finalize
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+MANIFEST_FILE_NAME = '_manifest.jsonl'
+
+# Columns added to the SEART metadata by scraping. scraped_data holds str(accumulator), like the YTsaurus tables do.
+RESULT_SCHEMA = pa.schema([
+    ('error', pa.string()),
+    ('scraped_data', pa.string()),
+    ('n_merge_scenarios', pa.int64()),
+    ('n_cherry_pick_scenarios', pa.int64()),
+    ('n_merge_scenarios_with_resolved_conflicts', pa.int64()),
+    ('n_file_commit_gram_scenarios', pa.int64()),
+    ('n_visited_commits', pa.int64()),
+    ('clone_seconds', pa.float64()),
+    ('scrape_seconds', pa.float64()),
+    ('peak_rss_bytes', pa.int64()),
+])
+
+
+def shard_schema_for(repositories_metadata: pd.DataFrame) -> pa.Schema:
+    """
+    Returns:
+        pa.Schema: The schema of the shards for the given repository metadata: its columns followed by the result
+            columns. All shards of a run share it, so they can be read as one dataset.
+    """
+    schema = pa.Schema.from_pandas(repositories_metadata, preserve_index=False).remove_metadata()
+    for field in RESULT_SCHEMA:
+        index = schema.get_field_index(field.name)
+        schema = schema.set(index, field) if index != -1 else schema.append(field)
+    # Columns which are entirely empty in the input would otherwise only accept nulls
+    return pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in schema])
+
+
+def _to_shard_row(repository_metadata: pd.Series) -> dict:
+    row = {}
+    for column, value in repository_metadata.items():
+        if column == 'scraped_data' and value is not None and not isinstance(value, str):
+            value = str(value)
+        elif isinstance(value, float) and math.isnan(value):
+            value = None
+        row[column] = value
+    return row
+
+
+class ParquetShardWriter:
+    """
+    Writes scraping results of one process directly into Parquet shards, so results neither have to be sent to nor
+    be kept by the parent process.
+
+    Rows are buffered and written in row groups of row_group_size rows. After rows_per_shard rows the shard is closed
+    and recorded in the manifest of path_to_shards, and the next row starts a new shard. Only closed shards are listed
+    in the manifest, so if a process crashes, at most the rows of its open shard are lost and a reader never sees a
+    shard without footer. A writer may be shared by the threads of a process.
+    """
+
+    def __init__(self, path_to_shards: str, schema: pa.Schema, row_group_size: int = 16, rows_per_shard: int = 64):
+        if row_group_size < 1 or rows_per_shard < row_group_size:
+            raise ValueError('row_group_size must be at least 1 and at most rows_per_shard.')
+        os.makedirs(path_to_shards, exist_ok=True)
+        self.path_to_shards = path_to_shards
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.rows_per_shard = rows_per_shard
+
+        self._writer: Optional[pq.ParquetWriter] = None
+        self._shard_name: Optional[str] = None
+        self._buffer: List[dict] = []
+        self._repositories_in_shard: List[str] = []
+        self._lock = threading.Lock()
+
+    def write(self, repository_metadata: pd.Series) -> str:
+        """
+        Adds the result of one repository.
+
+        Args:
+            repository_metadata (pd.Series): The metadata of the repository with the scraping results.
+
+        Returns:
+            str: The name of the shard the row is written to.
+        """
+        return self.write_many([repository_metadata])
+
+    def write_many(self, repositories_metadata: List[pd.Series]) -> str:
+        """
+        Adds the results of several repositories to the same shard. The shard is only closed after all of them were
+        added, so either all or none of them are in a closed shard, even if the process crashes in between.
+
+        Returns:
+            str: The name of the shard the rows are written to.
+        """
+        rows = [_to_shard_row(repository_metadata) for repository_metadata in repositories_metadata]
+        with self._lock:
+            if self._writer is None:
+                self._shard_name = f'shard-{os.getpid()}-{uuid.uuid4().hex[:8]}.parquet'
+                self._writer = pq.ParquetWriter(os.path.join(self.path_to_shards, self._shard_name), self.schema)
+            shard_name = self._shard_name
+
+            for row, repository_metadata in zip(rows, repositories_metadata):
+                self._buffer.append(row)
+                self._repositories_in_shard.append(repository_metadata['name'])
+                if len(self._buffer) >= self.row_group_size:
+                    self._flush_row_group()
+            if len(self._repositories_in_shard) >= self.rows_per_shard:
+                self._close_shard()
+        return shard_name
+
+    def _flush_row_group(self):
+        if self._buffer:
+            self._writer.write_table(pa.Table.from_pylist(self._buffer, schema=self.schema))
+            self._buffer = []
+
+    def close(self):
+        """
+        Writes the remaining rows, closes the open shard and records it in the manifest.
+        """
+        with self._lock:
+            self._close_shard()
+
+    def _close_shard(self):
+        if self._writer is None:
+            return
+        self._flush_row_group()
+        self._writer.close()
+        # A single small O_APPEND write, so concurrent processes do not interleave their manifest entries
+        entry = json.dumps({'shard': self._shard_name, 'rows': len(self._repositories_in_shard),
+                            'repositories': self._repositories_in_shard}) + '\n'
+        with open(os.path.join(self.path_to_shards, MANIFEST_FILE_NAME), 'a') as manifest:
+            manifest.write(entry)
+        self._writer, self._shard_name, self._repositories_in_shard = None, None, []
+
+
+_process_shard_writer: Optional[ParquetShardWriter] = None
+
+
+def initialise_process_shard_writer(path_to_shards: str, schema: pa.Schema, row_group_size: int = 16,
+                                    rows_per_shard: int = 64):
+    """
+    Initializer for worker processes. Creates the shard writer of the process, which is closed when the process exits.
+    """
+    global _process_shard_writer
+    _process_shard_writer = ParquetShardWriter(path_to_shards, schema, row_group_size, rows_per_shard)
+    # Worker processes of a pool do not run atexit handlers, but the finalizers of multiprocessing
+    Finalize(_process_shard_writer, _process_shard_writer.close, exitpriority=10)
+
+
+def get_process_shard_writer() -> ParquetShardWriter:
+    """
+    Returns:
+        ParquetShardWriter: The shard writer of this process, see initialise_process_shard_writer.
+    """
+    if _process_shard_writer is None:
+        raise RuntimeError('No shard writer in this process. Call initialise_process_shard_writer first.')
+    return _process_shard_writer
+
+
+def read_manifest(path_to_shards: str) -> List[dict]:
+    """
+    Returns:
+        List[dict]: The entries of all closed shards in path_to_shards.
+    """
+    path_to_manifest = os.path.join(path_to_shards, MANIFEST_FILE_NAME)
+    if not os.path.exists(path_to_manifest):
+        return []
+    with open(path_to_manifest) as manifest:
+        return [json.loads(line) for line in manifest if line.strip()]
+
+
+def readable_shards(path_to_shards: str) -> Dict[str, pa.Schema]:
+    """
+    Returns:
+        Dict[str, pa.Schema]: The names and schemas of all closed shards in path_to_shards whose footer can be read.
+    """
+    shards = {}
+    for entry in read_manifest(path_to_shards):
+        try:
+            shards[entry['shard']] = pq.read_schema(os.path.join(path_to_shards, entry['shard']))
+        except (OSError, pa.ArrowException):
+            print(f'Ignoring unreadable shard {entry["shard"]} in {path_to_shards}.', file=sys.stderr)
+    return shards
+
+
+def open_shards_as_dataset(path_to_shards: str) -> ds.Dataset:
+    """
+    Opens all readable closed shards in path_to_shards as one dataset, e.g. to query the results of a run while it is
+    running. Shards written by resumed runs with other columns are unified, missing columns are null.
+    """
+    return _dataset_of(path_to_shards, readable_shards(path_to_shards))
+
+
+def _dataset_of(path_to_shards: str, shards: Dict[str, pa.Schema]) -> ds.Dataset:
+    schema = pa.unify_schemas(list(shards.values())) if shards else pa.schema([])
+    return ds.dataset([os.path.join(path_to_shards, shard) for shard in shards], schema=schema, format='parquet')
+
+
+def _latest_readable_shards(path_to_shards: str, shards: Dict[str, pa.Schema],
+                            shards_of_repositories: Dict[str, str]) -> Dict[str, str]:
+    """
+    Returns the shard of the latest result of each repository that can be read. If the shard of its latest result is
+    unreadable or was never closed, the result of the latest earlier attempt in a readable shard is used instead.
+    """
+    latest_shards = {}
+    shards_of_unreadable_repositories = {name: None for name, shard in shards_of_repositories.items()
+                                         if shard not in shards}
+    for entry in read_manifest(path_to_shards):
+        if entry['shard'] in shards:
+            for name in entry['repositories']:
+                if name in shards_of_unreadable_repositories:
+                    shards_of_unreadable_repositories[name] = entry['shard']
+    for name, shard in shards_of_repositories.items():
+        if shard in shards:
+            latest_shards[name] = shard
+        elif shards_of_unreadable_repositories[name] is not None:
+            latest_shards[name] = shards_of_unreadable_repositories[name]
+            print(f'Using an earlier result of {name}, the shard {shard} of its latest result is unreadable.',
+                  file=sys.stderr)
+        else:
+            print(f'Missing the result of {name}, its shard {shard} is unreadable.', file=sys.stderr)
+    return latest_shards
+
+
+def merge_shards(path_to_shards: str, path_to_output: str,
+                 shards_of_repositories: Optional[Dict[str, str]] = None) -> int:
+    """
+    Merges all closed shards in path_to_shards into a single Parquet file, batch by batch, without loading all
+    results into memory.
+
+    Args:
+        path_to_shards (str): The directory of the shards.
+        path_to_output (str): Where to write the merged Parquet file.
+        shards_of_repositories (Optional[Dict[str, str]]): The shard of the latest result of each repository, see
+            RunManifest.shards_of_repositories. If given, the results of a repository in other shards, e.g. of failed
+            attempts which a resumed run retried, are left out. If the shard of the latest result is unreadable, the
+            latest earlier result in a readable shard is kept instead.
+
+    Returns:
+        int: The amount of rows written.
+    """
+    shards = readable_shards(path_to_shards)
+    dataset = _dataset_of(path_to_shards, shards)
+    names_of_shards, known_names = {}, None
+    if shards_of_repositories is not None:
+        for name, shard in _latest_readable_shards(path_to_shards, shards, shards_of_repositories).items():
+            names_of_shards.setdefault(shard, []).append(name)
+        known_names = pa.array(list(shards_of_repositories), pa.string())
+    n_rows = 0
+    with pq.ParquetWriter(path_to_output, dataset.schema) as writer:
+        for fragment in dataset.get_fragments():
+            names_of_shard = pa.array(names_of_shards.get(os.path.basename(fragment.path), []), pa.string())
+            for batch in fragment.to_batches(schema=dataset.schema):
+                if known_names is not None:
+                    # Rows of repositories unknown to the run manifest are kept, like without shards_of_repositories
+                    names = batch.column('name')
+                    batch = batch.filter(pc.or_(pc.is_in(names, value_set=names_of_shard),
+                                                pc.invert(pc.is_in(names, value_set=known_names))))
+                writer.write_batch(batch)
+                n_rows += batch.num_rows
+    return n_rows
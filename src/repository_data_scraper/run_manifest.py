@@ -0,0 +1,122 @@
+import os
+import sqlite3
+from time import time
+from typing import Dict, Iterable, Optional, Set
+
+RUN_MANIFEST_FILE_NAME = 'run_manifest.sqlite'
+
+STATUS_PENDING = 'pending'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+class RunManifest:
+    """
+    Records the status of every repository of a local scraping run in a sqlite file next to the result shards, so an
+    interrupted run can be resumed.
+
+    Per repository it stores the status ('pending', 'done' or 'failed'), when it was queued and finished, how long
+    cloning and scraping took, the error (if any) and the shard its result was written to. A repository only counts
+    as completed if it was scraped successfully and its shard was closed and is readable, because the rows of shards
+    that were still open when the run was interrupted are lost. Failed repositories are scraped again on resume, their
+    earlier results are superseded, see shards_of_repositories.
+    """
+
+    def __init__(self, path_to_manifest: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path_to_manifest)), exist_ok=True)
+        self.path_to_manifest = path_to_manifest
+        self._connection = sqlite3.connect(path_to_manifest)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS repositories (
+                name TEXT PRIMARY KEY, status TEXT NOT NULL, queued_at REAL, finished_at REAL, clone_seconds REAL,
+                scrape_seconds REAL, error TEXT, shard TEXT, attempts INTEGER NOT NULL DEFAULT 0);
+        """)
+
+    def queue(self, names: Iterable[str]):
+        """
+        Records repositories as pending, unless they are already recorded.
+        """
+        queued_at = time()
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO repositories (name, status, queued_at) VALUES (?, ?, ?)',
+                [(name, STATUS_PENDING, queued_at) for name in names])
+
+    def record_result(self, name: str, error: Optional[str], shard: Optional[str],
+                      clone_seconds: Optional[float] = None, scrape_seconds: Optional[float] = None):
+        """
+        Records the result of a repository, which was written to shard.
+
+        Args:
+            name (str): The name of the repository.
+            error (Optional[str]): The error of the repository, None if it was scraped successfully.
+            shard (Optional[str]): The name of the shard the result was written to.
+            clone_seconds (Optional[float]): How long cloning took.
+            scrape_seconds (Optional[float]): How long scraping took.
+        """
+        with self._connection:
+            self._connection.execute('INSERT OR IGNORE INTO repositories (name, status) VALUES (?, ?)',
+                                     (name, STATUS_PENDING))
+            self._connection.execute(
+                'UPDATE repositories SET status = ?, finished_at = ?, clone_seconds = ?, scrape_seconds = ?, '
+                'error = ?, shard = ?, attempts = attempts + 1 WHERE name = ?',
+                (STATUS_FAILED if error else STATUS_DONE, time(), clone_seconds, scrape_seconds, error, shard, name))
+
+    def completed_repositories(self, readable_shards: Iterable[str]) -> Set[str]:
+        """
+        Args:
+            readable_shards (Iterable[str]): The names of the closed and readable shards of the run.
+
+        Returns:
+            Set[str]: The names of all successfully scraped repositories whose result is in a readable shard. Failed
+                repositories are not completed, so a resumed run retries them.
+        """
+        readable_shards = set(readable_shards)
+        return {name for name, shard in self._connection.execute(
+            'SELECT name, shard FROM repositories WHERE status = ?', (STATUS_DONE,))
+                if shard in readable_shards}
+
+    def reset_lost_results(self, readable_shards: Iterable[str]) -> Set[str]:
+        """
+        Resets repositories whose result was written to a shard that is not readable to pending, so they are scraped
+        again. A scraping process that is killed, e.g. because a sibling process of its pool died, never closes its
+        open shard, so the results it already reported are lost.
+
+        Args:
+            readable_shards (Iterable[str]): The names of the closed and readable shards of the run.
+
+        Returns:
+            Set[str]: The names of the reset repositories.
+        """
+        readable_shards = set(readable_shards)
+        lost_repositories = {name for name, shard in self._connection.execute(
+            'SELECT name, shard FROM repositories WHERE status != ? AND shard IS NOT NULL', (STATUS_PENDING,))
+                             if shard not in readable_shards}
+        with self._connection:
+            self._connection.executemany('UPDATE repositories SET status = ? WHERE name = ?',
+                                         [(STATUS_PENDING, name) for name in lost_repositories])
+        return lost_repositories
+
+    def shards_of_repositories(self) -> Dict[str, str]:
+        """
+        Returns:
+            Dict[str, str]: The shard of the latest result of every repository with a result. Results of retried
+                repositories in other shards are superseded, see merge_shards.
+        """
+        return dict(self._connection.execute('SELECT name, shard FROM repositories WHERE shard IS NOT NULL'))
+
+    def status_counts(self) -> dict:
+        """
+        Returns:
+            dict: The amount of repositories per status.
+        """
+        return dict(self._connection.execute('SELECT status, COUNT(*) FROM repositories GROUP BY status'))
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,204 @@
+import json
+import math
+import os
+import sys
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, time
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+METRICS_FILE_NAME = 'metrics.json'
+
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class RunTelemetry:
+    """
+    Live throughput metrics of a local scraping run, aggregated in the parent process from the result summaries the
+    scraping processes send back and from the queue depths of the pipeline.
+
+    The metrics are computed on demand by snapshot. start writes them to a JSON file every flush_interval_seconds
+    (atomically, so it can be polled with e.g. `watch cat`) and, if http_port is given, serves them at
+    http://127.0.0.1:<http_port>/metrics. Rates are computed over the last window_seconds, so they reflect stalls
+    quickly, the totals over the whole run.
+    """
+
+    def __init__(self, total_repositories: int, scrape_workers: int, path_to_metrics: Optional[str] = None,
+                 flush_interval_seconds: float = 10.0, window_seconds: float = 600.0, http_port: Optional[int] = None,
+                 stage_sizes: Callable[[], Dict[str, int]] = dict, cloned_bytes: Callable[[], int] = lambda: 0,
+                 busy_workers: Optional[Callable[[], int]] = None):
+        """
+        Args:
+            total_repositories (int): The amount of repositories of the run.
+            scrape_workers (int): The amount of scraping processes.
+            path_to_metrics (Optional[str]): The JSON file to flush the metrics to.
+            flush_interval_seconds (float): How often the metrics are flushed.
+            window_seconds (float): The window rates are computed over.
+            http_port (Optional[int]): If set, the port of the local HTTP endpoint serving the metrics.
+            stage_sizes (Callable[[], Dict[str, int]]): Returns the amount of repositories per pipeline stage, see
+                CloneScrapePipeline.stage_sizes.
+            cloned_bytes (Callable[[], int]): Returns the total bytes cloned so far.
+            busy_workers (Optional[Callable[[], int]]): Returns the amount of busy scraping workers, see
+                CloneScrapePipeline.busy_workers. Defaults to the repositories being scraped, which is only right
+                without batches.
+        """
+        self.total_repositories = total_repositories
+        self.scrape_workers = scrape_workers
+        self.path_to_metrics = path_to_metrics
+        self.flush_interval_seconds = flush_interval_seconds
+        self.window_seconds = window_seconds
+        self.http_port = http_port
+        self.stage_sizes = stage_sizes
+        self.cloned_bytes = cloned_bytes
+        self.busy_workers = busy_workers
+
+        self.repositories_done = 0
+        self.repositories_failed = 0
+        self.commits_scraped = 0
+        self.scrape_seconds = 0.0
+        self._started_at = monotonic()
+        self._last_result_at: Optional[float] = None
+        # (time, commits, is_error) per result and (time, cloned bytes) per snapshot within the window
+        self._results = deque()
+        self._cloned_bytes_samples = deque()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+        self._http_server: Optional[ThreadingHTTPServer] = None
+
+    def record_result(self, result: pd.Series):
+        """
+        Records the result summary of a repository, see write_result_to_shard.
+        """
+        is_error = isinstance(result.get('error'), str)
+        commits = result.get('n_visited_commits')
+        commits = 0 if _is_missing(commits) else int(commits)
+        scrape_seconds = result.get('scrape_seconds')
+        now = monotonic()
+        with self._lock:
+            self.repositories_done += 1
+            self.repositories_failed += is_error
+            self.commits_scraped += commits
+            self.scrape_seconds += 0.0 if _is_missing(scrape_seconds) else float(scrape_seconds)
+            self._last_result_at = now
+            self._results.append((now, commits, is_error))
+
+    def _discard_outside_window(self, now: float):
+        while self._results and self._results[0][0] < now - self.window_seconds:
+            self._results.popleft()
+        while len(self._cloned_bytes_samples) > 1 and \
+                self._cloned_bytes_samples[0][0] < now - self.window_seconds:
+            self._cloned_bytes_samples.popleft()
+
+    def snapshot(self) -> dict:
+        """
+        Returns:
+            dict: The current metrics.
+        """
+        now = monotonic()
+        with self._lock:
+            self._cloned_bytes_samples.append((now, self.cloned_bytes()))
+            self._discard_outside_window(now)
+            elapsed_seconds = now - self._started_at
+            window_seconds = min(self.window_seconds, elapsed_seconds) or 1e-9
+            repositories_in_window = len(self._results)
+            repositories_per_second = repositories_in_window / window_seconds
+            (first_sample_at, first_cloned_bytes), (_, cloned_bytes) = self._cloned_bytes_samples[0], \
+                self._cloned_bytes_samples[-1]
+            stage_sizes = self.stage_sizes()
+            busy_workers = self.busy_workers() if self.busy_workers is not None else stage_sizes.get('scraping', 0)
+            remaining = self.total_repositories - self.repositories_done
+            return {
+                'time': time(),
+                'elapsed_seconds': round(elapsed_seconds, 1),
+                'repositories': {'total': self.total_repositories, 'done': self.repositories_done,
+                                 'failed': self.repositories_failed, 'remaining': remaining},
+                'repositories_per_minute': round(repositories_per_second * 60, 2),
+                'commits_per_second': round(sum(commits for _, commits, _ in self._results) / window_seconds, 1),
+                'clone_megabytes_per_second': round((cloned_bytes - first_cloned_bytes) / 1024 ** 2
+                                                    / max(now - first_sample_at, 1e-9), 2)
+                if now > first_sample_at else 0.0,
+                'error_rate': round(sum(is_error for _, _, is_error in self._results) / repositories_in_window, 3)
+                if repositories_in_window else 0.0,
+                'queues': {'waiting_to_clone': max(0, remaining - sum(stage_sizes.values())), **stage_sizes},
+                'worker_utilisation': {
+                    'current': round(busy_workers / self.scrape_workers, 3),
+                    'average': round(self.scrape_seconds / (elapsed_seconds * self.scrape_workers), 3)
+                    if elapsed_seconds else 0.0},
+                'seconds_since_last_result': round(now - self._last_result_at, 1)
+                if self._last_result_at is not None else None,
+                'eta_seconds': round(remaining / repositories_per_second) if repositories_per_second else None,
+            }
+
+    def flush(self):
+        """
+        Writes the current metrics to path_to_metrics, replacing the file atomically.
+        """
+        if self.path_to_metrics is None:
+            return
+        path_to_temporary_file = f'{self.path_to_metrics}.tmp'
+        with open(path_to_temporary_file, 'w') as metrics:
+            json.dump(self.snapshot(), metrics, indent=2)
+        os.replace(path_to_temporary_file, self.path_to_metrics)
+
+    def _flush_periodically(self):
+        while not self._stopped.wait(self.flush_interval_seconds):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f'Could not write metrics to {self.path_to_metrics}: {e}', file=sys.stderr, flush=True)
+
+    def start(self):
+        """
+        Starts flushing the metrics and, if http_port is set, serving them.
+        """
+        self._flush_thread = threading.Thread(target=self._flush_periodically, name='telemetry', daemon=True)
+        self._flush_thread.start()
+        if self.http_port is not None:
+            self._http_server = ThreadingHTTPServer(('127.0.0.1', self.http_port), _metrics_handler_for(self))
+            threading.Thread(target=self._http_server.serve_forever, name='telemetry-http', daemon=True).start()
+            print(f'Serving metrics at http://127.0.0.1:{self._http_server.server_port}/metrics', flush=True)
+
+    def close(self):
+        """
+        Stops flushing and serving, and writes the final metrics.
+        """
+        self._stopped.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+        self.flush()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _metrics_handler_for(telemetry: RunTelemetry):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = json.dumps(telemetry.snapshot()).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Polling the endpoint would otherwise flood the output of the run
+            pass
+
+    return MetricsHandler
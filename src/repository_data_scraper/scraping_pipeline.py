@@ -0,0 +1,223 @@
+import os
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+_NO_ITEM = object()
+
+
+def directory_size(path: str) -> int:
+    """
+    Returns:
+        int: The total size in bytes of all files below path. Symlinks are not followed.
+    """
+    total_size = 0
+    for directory, _, files in os.walk(path):
+        for file in files:
+            try:
+                total_size += os.lstat(os.path.join(directory, file)).st_size
+            except FileNotFoundError:
+                continue
+    return total_size
+
+
+def _number_of_repositories_in(item) -> int:
+    # Batches of small repositories are lists, see batch_small_repositories
+    return len(item) if isinstance(item, list) else 1
+
+
+class CloneScrapePipeline:
+    """
+    Bounded two-stage pipeline that overlaps network and disk bound cloning with CPU bound scraping.
+
+    Repositories are cloned by a thread pool of clone_concurrency threads and handed to scrape_executor (usually a
+    process pool with one worker per core) once cloned. Backpressure is applied on both stages:
+        - At most lookahead repositories are cloned ahead, ie. cloned but waiting for a free scraping worker.
+        - A clone is only started if the bytes on disk of all cloned, scraped and not yet removed repositories plus the
+          estimated size of all running clones stay within disk_budget_bytes. If no repository is in either stage, a
+          clone is always started, so a single repository larger than the budget cannot stall the pipeline.
+    A repository is removed as soon as it was scraped, which releases its bytes from the budget.
+    """
+
+    def __init__(self, clone: Callable[[Any], Tuple[Any, Optional[str]]], scrape: Callable[[Any, str], Any],
+                 remove: Callable[[str], bool], scrape_executor: Executor, scrape_concurrency: int,
+                 clone_concurrency: int = 4, lookahead: int = 2, disk_budget_bytes: Optional[int] = None,
+                 estimate_size: Callable[[Any], int] = lambda item: 0,
+                 on_scrape_error: Optional[Callable[[Any, BaseException], Any]] = None,
+                 retry_scrape: Optional[Callable[[Any, BaseException], bool]] = None,
+                 on_clone_error: Optional[Callable[[Any, BaseException], Any]] = None):
+        """
+        Args:
+            clone (Callable[[Any], Tuple[Any, Optional[str]]]): Clones the repository of an item. Returns the item and
+                the path of the clone, or the result for the item and None if the repository could not be cloned.
+                Called in a thread.
+            scrape (Callable[[Any, str], Any]): Scrapes the clone of an item and returns the result. Submitted to
+                scrape_executor, so it must be picklable for a process pool.
+            remove (Callable[[str], bool]): Removes a clone, returns False if it could not be removed (yet).
+            scrape_executor (Executor): Runs the scrape stage.
+            scrape_concurrency (int): The amount of workers of scrape_executor.
+            clone_concurrency (int): The maximum amount of concurrent clones.
+            lookahead (int): The maximum amount of cloned repositories waiting for a scraping worker.
+            disk_budget_bytes (Optional[int]): If set, the maximum amount of bytes of clones on disk.
+            estimate_size (Callable[[Any], int]): Estimates the size of the clone of an item before cloning it.
+            on_scrape_error (Optional[Callable[[Any, BaseException], Any]]): Returns the result for an item whose
+                scrape raised, e.g. because its worker process died. If not set, the exception is raised.
+            retry_scrape (Optional[Callable[[Any, BaseException], bool]]): Decides whether an item whose scrape raised
+                is scraped again. Its clone is kept and it is put at the front of the scrape stage. If not set, or if
+                it returns False, the item is passed to on_scrape_error.
+            on_clone_error (Optional[Callable[[Any, BaseException], Any]]): Returns the result for an item whose clone
+                raised, e.g. because the disk is full. If not set, the exception is raised.
+        """
+        if clone_concurrency < 1 or scrape_concurrency < 1 or lookahead < 0:
+            raise ValueError('clone_concurrency and scrape_concurrency must be at least 1, lookahead at least 0.')
+        self.clone = clone
+        self.scrape = scrape
+        self.remove = remove
+        self.scrape_executor = scrape_executor
+        self.scrape_concurrency = scrape_concurrency
+        self.clone_concurrency = clone_concurrency
+        self.lookahead = lookahead
+        self.disk_budget_bytes = disk_budget_bytes
+        self.estimate_size = estimate_size
+        self.on_scrape_error = on_scrape_error
+        self.retry_scrape = retry_scrape
+        self.on_clone_error = on_clone_error
+
+        # Bytes on disk per clone path, including clones which could not be removed yet
+        self.bytes_on_disk: Dict[str, int] = {}
+        self.paths_to_remove = []
+        self.peak_bytes_on_disk = 0
+        # Total bytes cloned so far, e.g. to report the clone throughput
+        self.cloned_bytes = 0
+        self._stages: Optional[Tuple[dict, deque, dict]] = None
+        # The amount of repositories of each running clone, a batch is cloned by one future
+        self._repositories_cloning: Dict[Future, int] = {}
+
+    def run(self, items: Iterable) -> Iterator:
+        """
+        Clones and scrapes all items, yielding their results in the order they complete.
+
+        Args:
+            items (Iterable): The items to process, e.g. the metadata of each repository. Consumed lazily.
+
+        Yields:
+            The result of each item, as returned by scrape, by clone if cloning failed, by on_clone_error or by
+            on_scrape_error.
+        """
+        items = iter(items)
+        next_item, is_exhausted = _NO_ITEM, False
+        cloning: Dict[Future, int] = {}
+        cloned = deque()
+        scraping: Dict[Future, Tuple[Any, str]] = {}
+        self._stages = (cloning, cloned, scraping)
+
+        with ThreadPoolExecutor(max_workers=self.clone_concurrency) as clone_executor:
+            while True:
+                # Fill the clone stage, as far as the lookahead and the disk budget allow
+                while not is_exhausted and len(cloning) < self.clone_concurrency \
+                        and len(cloning) + len(cloned) < self.clone_concurrency + self.lookahead:
+                    if next_item is _NO_ITEM:
+                        next_item = next(items, _NO_ITEM)
+                        if next_item is _NO_ITEM:
+                            is_exhausted = True
+                            break
+                    estimated_size = self.estimate_size(next_item)
+                    is_idle = not cloning and not cloned and not scraping
+                    if not is_idle and not self._fits_into_disk_budget(estimated_size, cloning):
+                        break
+                    future = clone_executor.submit(self._clone_and_measure, next_item)
+                    cloning[future] = estimated_size
+                    self._repositories_cloning[future] = _number_of_repositories_in(next_item)
+                    next_item = _NO_ITEM
+
+                # Fill the scrape stage
+                while cloned and len(scraping) < self.scrape_concurrency:
+                    item, path = cloned.popleft()
+                    scraping[self.scrape_executor.submit(self.scrape, item, path)] = (item, path)
+
+                if not cloning and not scraping:
+                    break
+
+                done, _ = wait(list(cloning) + list(scraping), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in cloning:
+                        del cloning[future]
+                        del self._repositories_cloning[future]
+                        result, path, size = future.result()
+                        if path is None:
+                            yield result
+                        else:
+                            self.bytes_on_disk[path] = size
+                            self.cloned_bytes += size
+                            cloned.append((result, path))
+                    else:
+                        item, path = scraping.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            if self.retry_scrape is not None and self.retry_scrape(item, e):
+                                # Keep the clone for the next attempt
+                                cloned.appendleft((item, path))
+                                continue
+                            if self.on_scrape_error is None:
+                                raise
+                            result = self.on_scrape_error(item, e)
+                        self.paths_to_remove.append(path)
+                        self._remove_scraped_repositories()
+                        yield result
+
+                self.peak_bytes_on_disk = max(self.peak_bytes_on_disk, self._reserved_bytes(cloning))
+
+        self._remove_scraped_repositories()
+
+    def stage_sizes(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: The amount of repositories being cloned, cloned but waiting for a scraping worker and
+                being scraped. A batch counts with all of its repositories. Safe to call from other threads while the
+                pipeline runs.
+        """
+        if self._stages is None:
+            return {'cloning': 0, 'waiting_for_worker': 0, 'scraping': 0}
+        _, cloned, scraping = self._stages
+        return {'cloning': sum(list(self._repositories_cloning.values())),
+                'waiting_for_worker': sum(_number_of_repositories_in(item) for item, _ in list(cloned)),
+                'scraping': sum(_number_of_repositories_in(item) for item, _ in list(scraping.values()))}
+
+    def busy_workers(self) -> int:
+        """
+        Returns:
+            int: The amount of items being scraped, i.e. of busy scraping workers. Safe to call from other threads
+                while the pipeline runs.
+        """
+        return len(self._stages[2]) if self._stages is not None else 0
+
+    def _clone_and_measure(self, item) -> Tuple[Any, Optional[str], int]:
+        try:
+            result, path = self.clone(item)
+            return result, path, directory_size(path) if path is not None else 0
+        except Exception as e:
+            if self.on_clone_error is None:
+                raise
+            return self.on_clone_error(item, e), None, 0
+
+    def _remove_scraped_repositories(self):
+        """
+        Removes all scraped clones. Clones which could not be removed stay accounted in the disk budget and are
+        retried the next time.
+        """
+        remaining_paths_to_remove = []
+        for path in self.paths_to_remove:
+            if self.remove(path):
+                self.bytes_on_disk.pop(path, None)
+            else:
+                remaining_paths_to_remove.append(path)
+        self.paths_to_remove = remaining_paths_to_remove
+
+    def _reserved_bytes(self, cloning: Dict[Future, int]) -> int:
+        return sum(self.bytes_on_disk.values()) + sum(cloning.values())
+
+    def _fits_into_disk_budget(self, estimated_size: int, cloning: Dict[Future, int]) -> bool:
+        if self.disk_budget_bytes is None:
+            return True
+        return self._reserved_bytes(cloning) + estimated_size <= self.disk_budget_bytes
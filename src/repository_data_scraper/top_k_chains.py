@@ -0,0 +1,55 @@
+import heapq
+from itertools import count
+from typing import Dict, List, Optional
+
+TOP_K_GROUP_BY_REPOSITORY = 'repository'
+TOP_K_GROUP_BY_FILE = 'file'
+TOP_K_GROUP_BY_BRANCH = 'branch'
+
+
+class TopKFileCommitChains:
+    """
+    Keeps only the k longest file-commit chains per group in bounded min-heaps, so the amount of chains kept for a
+    repository no longer grows with the length of its history.
+
+    A group is either the whole repository, a file or a branch. If two chains are equally long, the one pushed first
+    is kept, which makes the selection deterministic for a deterministic traversal.
+    """
+
+    def __init__(self, k: int, group_by: str = TOP_K_GROUP_BY_REPOSITORY):
+        if k < 1:
+            raise ValueError(f'k must be at least 1, got {k}.')
+        if group_by not in [TOP_K_GROUP_BY_REPOSITORY, TOP_K_GROUP_BY_FILE, TOP_K_GROUP_BY_BRANCH]:
+            raise ValueError(f'Invalid value for group_by: {group_by}. Valid values are: '
+                             f'"{TOP_K_GROUP_BY_REPOSITORY}", "{TOP_K_GROUP_BY_FILE}" and "{TOP_K_GROUP_BY_BRANCH}"')
+        self.k = k
+        self.group_by = group_by
+        self._heaps: Dict[Optional[str], list] = {}
+        self._sequence = count()
+
+    def push(self, file_commit_chain: dict):
+        """
+        Adds a chain, evicting the shortest chain of its group if the group already holds k chains.
+
+        Args:
+            file_commit_chain (dict): A file-commit chain scenario as written to the scraper's accumulator.
+        """
+        group = None if self.group_by == TOP_K_GROUP_BY_REPOSITORY else file_commit_chain[self.group_by]
+        heap = self._heaps.setdefault(group, [])
+        # Negated sequence number: on ties the most recently pushed chain is the smallest entry and evicted first
+        entry = (file_commit_chain['times_seen_consecutively'], -next(self._sequence), file_commit_chain)
+        if len(heap) < self.k:
+            heapq.heappush(heap, entry)
+        else:
+            heapq.heappushpop(heap, entry)
+
+    def chains(self) -> List[dict]:
+        """
+        Returns:
+            List[dict]: The kept chains of all groups, longest first.
+        """
+        entries = [entry for heap in self._heaps.values() for entry in heap]
+        return [file_commit_chain for _, _, file_commit_chain in sorted(entries, reverse=True)]
+
+    def __len__(self):
+        return sum(len(heap) for heap in self._heaps.values())
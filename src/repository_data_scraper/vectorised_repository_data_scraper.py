@@ -0,0 +1,263 @@
+import sys
+from collections import deque
+from time import time
+from typing import Dict, List, Tuple
+from warnings import warn
+
+import numpy as np
+from git import BadObject, Commit, Repo
+from tqdm import tqdm
+
+from src.repository_data_scraper.commit_index import iter_git_log_records
+from src.repository_data_scraper.programming_language import ProgrammingLanguage
+from src.repository_data_scraper.repository_data_scraper import RepositoryDataScraper
+
+
+class VectorisedRepositoryDataScraper(RepositoryDataScraper):
+    """
+    Drop-in replacement for RepositoryDataScraper that mines the same scenarios without a `git show` per commit and
+    without maintaining the per-file state dict commit by commit.
+
+    The history of all refs is read with a single streamed `git log --all --cc --name-status`. The traversal of the
+    reference scraper (breadth-first over all parents, shared visited commits, keepalive past a branch's origin) only
+    depends on the parents of each commit, so it is replayed on the parents map to obtain the sequence of processed
+    commits per branch as an integer array. File-commit chains are then runs of consecutive positions in that sequence
+    in which a file is changed. They are found with a run-length encoding over the sparse commit x file incidence
+    matrix, which is kept in CSR form (row pointers and file ids per commit) as plain numpy arrays.
+    """
+
+    def __init__(self, repository: Repo, programming_language: ProgrammingLanguage, repository_name: str,
+                 sliding_window_size: int = 3, **kwargs):
+        super().__init__(repository=repository, programming_language=programming_language,
+                         repository_name=repository_name, sliding_window_size=sliding_window_size, **kwargs)
+
+        self._commit_ids: Dict[str, int] = {}
+        self._hexshas: List[str] = []
+        self._parents: List[List[str]] = []
+        self._messages: List[str] = []
+        self._changes: List[List[str]] = []
+        self._file_ids: Dict[str, int] = {}
+        self._files: List[str] = []
+
+    def scrape(self):
+        """
+        Parses the repository to collect merge, cherry_pick and file_commit_chain scenarios. The mined scenarios are
+        identical to the ones of RepositoryDataScraper.scrape, see there for the semantics.
+        """
+        self._load_history()
+
+        sequences = []
+        for branch in tqdm(self.branches, desc=f'Parsing branches in {self.repository_name}'):
+            try:
+                head = self.repository.commit(branch).hexsha
+            except Exception as e:
+                if isinstance(e, BadObject):
+                    warning_content = (
+                        f'\nCould not get branch HEAD for branch {branch}. Branch probably contains "@". '
+                        f'GitPython cant handle that.\n\nSkipping branch ...')
+                    warn(warning_content, category=RuntimeWarning)
+                    continue
+                else:
+                    raise e
+            sequences.append((branch, self._traverse_branch_from(head)))
+
+        # Commits missing from the log (refs git log --all does not resolve) were loaded during the traversal, so the
+        # incidence matrix can only be built afterwards
+        row_pointers, file_ids_per_row, has_programming_language_change, had_conflicts = self._build_incidence()
+
+        for branch, sequence in sequences:
+            self._process_commit_scenarios(sequence, has_programming_language_change, had_conflicts)
+            self._detect_file_commit_chains(branch, sequence, row_pointers, file_ids_per_row)
+
+        if self._top_k_chains is not None:
+            self.accumulator['file_commit_chain_scenarios'] = self._top_k_chains.chains()
+
+        start = time()
+        self.accumulator[
+            'cherry_pick_scenarios'] += self._mine_commits_with_duplicate_messages_for_cherry_pick_scenarios()
+        print(f'Extra time incurred: {round(time() - start, 4)}s', file=sys.stderr)
+
+    def _load_history(self):
+        """
+        Reads parents, message and changes of every commit reachable from any ref with a single `git log`.
+        """
+        path_to_repository = self.repository.working_tree_dir or self.repository.git_dir
+        for (hexsha, parents, message), changes_in_commit in iter_git_log_records(
+                path_to_repository, '--all', '--cc', '--name-status', fields='%H%x1f%P%x1f%B'):
+            self._add_commit(hexsha, parents.split(), message, changes_in_commit)
+
+    def _add_commit(self, hexsha: str, parents: List[str], message: str, changes_in_commit: List[str]) -> int:
+        commit_id = len(self._hexshas)
+        self._commit_ids[hexsha] = commit_id
+        self._hexshas.append(hexsha)
+        self._parents.append(parents)
+        self._messages.append(message)
+        self._changes.append(changes_in_commit)
+        return commit_id
+
+    def _commit_id_of(self, hexsha: str) -> int:
+        """
+        Returns:
+            int: The row of the commit in the incidence matrix. Commits not loaded by _load_history are read with
+                GitPython, like the reference scraper does.
+        """
+        commit_id = self._commit_ids.get(hexsha)
+        if commit_id is None:
+            commit = self.repository.commit(hexsha)
+            commit_id = self._add_commit(hexsha, [parent.hexsha for parent in commit.parents], commit.message,
+                                         super()._get_changes_in_commit(commit))
+        return commit_id
+
+    def _traverse_branch_from(self, head: str) -> np.ndarray:
+        """
+        Replays the traversal of RepositoryDataScraper.scrape for one branch without processing any commit.
+
+        Args:
+            head (str): The hexsha of the branch HEAD.
+
+        Returns:
+            np.ndarray: The ids of the commits processed for this branch, in processing order. A commit may occur
+                more than once if it is reached again within the keepalive.
+        """
+        frontier = deque([head])
+        keepalive = self.sliding_window_size - 1
+        sequence = []
+
+        while frontier:
+            hexsha = frontier.popleft()
+            commit_id = self._commit_id_of(hexsha)
+            parents = self._parents[commit_id]
+
+            if hexsha not in self.visited_commits:
+                self.visited_commits.add(hexsha)
+                if len(parents) > 1:
+                    frontier.extend(parent for parent in parents if parent not in self.visited_commits)
+                elif len(parents) == 1:
+                    frontier.append(parents[0])
+            elif keepalive > 0:
+                keepalive -= 1
+            else:
+                break
+
+            sequence.append(commit_id)
+
+        return np.asarray(sequence, dtype=np.int64)
+
+    def _build_incidence(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Builds the commit x file incidence matrix of valid changes (A, M, MM) to files of self.programming_language.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: The CSR row pointers and file ids of the incidence
+                matrix, whether each commit changes any path containing the programming language's file ending and
+                whether it changes a file of the programming language with change type MM.
+        """
+        valid_change_types = ['A', 'M', 'MM']
+        n_commits = len(self._hexshas)
+        row_lengths = np.zeros(n_commits, dtype=np.int64)
+        file_ids_per_row = []
+        has_programming_language_change = np.zeros(n_commits, dtype=bool)
+        had_conflicts = np.zeros(n_commits, dtype=bool)
+
+        for commit_id, changes_in_commit in enumerate(self._changes):
+            has_programming_language_change[commit_id] = \
+                self._does_commit_contain_changes_in_programming_language(changes_in_commit)
+            if not has_programming_language_change[commit_id]:
+                continue
+            for change_in_commit in changes_in_commit:
+                changes_to_unpack = change_in_commit.split('\t')
+                if changes_to_unpack[0] not in valid_change_types:
+                    continue
+                change_type, file = changes_to_unpack
+                if self.programming_language.value not in file:
+                    continue
+                file_id = self._file_ids.get(file)
+                if file_id is None:
+                    file_id = self._file_ids[file] = len(self._files)
+                    self._files.append(file)
+                file_ids_per_row.append(file_id)
+                row_lengths[commit_id] += 1
+                had_conflicts[commit_id] |= change_type == 'MM'
+
+        row_pointers = np.zeros(n_commits + 1, dtype=np.int64)
+        np.cumsum(row_lengths, out=row_pointers[1:])
+        return row_pointers, np.asarray(file_ids_per_row, dtype=np.int64), has_programming_language_change, \
+            had_conflicts
+
+    def _process_commit_scenarios(self, sequence: np.ndarray, has_programming_language_change: np.ndarray,
+                                  had_conflicts: np.ndarray):
+        """
+        Collects the cherry-pick and merge scenarios of the processed commits of a branch and tracks their messages,
+        in the same order as the reference scraper.
+        """
+        for commit_id in sequence.tolist():
+            hexsha, parents = self._hexshas[commit_id], self._parents[commit_id]
+
+            potential_cherry_pick_match = self._cherry_pick_pattern.search(self._messages[commit_id])
+            if potential_cherry_pick_match:
+                self.accumulator['cherry_pick_scenarios'].append({
+                    'cherry_pick_commit': hexsha,
+                    'cherry_commit': potential_cherry_pick_match[0],
+                    'parents': list(parents)
+                })
+
+            if has_programming_language_change[commit_id]:
+                # Commits are only loaded lazily if they have a duplicate message and are compared by patch
+                commit = Commit(self.repository, bytes.fromhex(hexsha))
+                self.seen_commit_messages.setdefault(self._messages[commit_id], []).append(commit)
+
+            if len(parents) > 1 and (len(self._changes[commit_id]) == 0 or has_programming_language_change[commit_id]):
+                self.accumulator['merge_scenarios'].append({'merge_commit_hash': hexsha,
+                                                            'had_conflicts': bool(had_conflicts[commit_id]),
+                                                            'parents': list(parents)})
+
+    def _detect_file_commit_chains(self, branch: str, sequence: np.ndarray, row_pointers: np.ndarray,
+                                   file_ids_per_row: np.ndarray):
+        """
+        Finds all file-commit chains of a branch as runs of consecutive positions in sequence that change the same
+        file and hands them to update_accumulator_with_file_commit_chain_scenario.
+
+        Args:
+            branch (str): The branch the sequence was traversed on.
+            sequence (np.ndarray): The processed commit ids of the branch, see _traverse_branch_from.
+            row_pointers (np.ndarray): The CSR row pointers of the incidence matrix.
+            file_ids_per_row (np.ndarray): The CSR file ids of the incidence matrix.
+        """
+        row_starts = row_pointers[sequence]
+        row_lengths = row_pointers[sequence + 1] - row_starts
+        n_entries = int(row_lengths.sum())
+        if n_entries == 0:
+            return
+
+        # Gather the (position, file) pairs of the sub-matrix with the rows of the sequence
+        columns = np.arange(n_entries, dtype=np.int64) - np.repeat(np.cumsum(row_lengths) - row_lengths, row_lengths)
+        positions = np.repeat(np.arange(len(sequence), dtype=np.int64), row_lengths)
+        files = file_ids_per_row[columns + np.repeat(row_starts, row_lengths)]
+
+        # Run-length encode the positions of each file. A run starts whenever the file changes or a position is skipped
+        order = np.lexsort((positions, files))
+        positions, files, columns = positions[order], files[order], columns[order]
+        is_run_start = np.ones(n_entries, dtype=bool)
+        is_run_start[1:] = (files[1:] != files[:-1]) | (positions[1:] != positions[:-1] + 1)
+        run_starts = np.flatnonzero(is_run_start)
+        run_lengths = np.diff(np.append(run_starts, n_entries))
+
+        is_chain = run_lengths >= self.sliding_window_size
+        if self.max_chain_length is not None:
+            is_chain &= run_lengths <= self.max_chain_length
+        run_starts, run_lengths = run_starts[is_chain], run_lengths[is_chain]
+
+        # Emit the chains in the order the reference scraper does, so the selection of the top-k chains breaks ties
+        # identically: by the commit ending the chain, then by when the chain started and the file's position in it
+        run_ends = run_starts + run_lengths - 1
+        emission_order = np.lexsort((columns[run_starts], positions[run_starts], positions[run_ends]))
+        run_starts, run_ends, run_lengths = run_starts[emission_order], run_ends[emission_order], \
+            run_lengths[emission_order]
+        oldest_commits = sequence[positions[run_starts]]
+        newest_commits = sequence[positions[run_ends]]
+
+        for file_id, oldest_commit, newest_commit, times_seen_consecutively in zip(
+                files[run_starts].tolist(), oldest_commits.tolist(), newest_commits.tolist(), run_lengths.tolist()):
+            self.update_accumulator_with_file_commit_chain_scenario(
+                {'oldest_commit': self._hexshas[oldest_commit], 'newest_commit': self._hexshas[newest_commit],
+                 'times_seen_consecutively': times_seen_consecutively}, self._files[file_id], branch)
@@ -0,0 +1,300 @@
+import json
+import os
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import BrokenExecutor, Executor, Future
+from contextlib import contextmanager
+from dataclasses import dataclass
+from time import sleep, time
+from typing import Callable, Dict, Iterator, Optional
+
+import psutil
+
+WORKER_EVENTS_FILE_NAME = '_worker_events.jsonl'
+TOMBSTONES_DIRECTORY_NAME = '_tombstones'
+
+EVENT_RECYCLED = 'recycled'
+EVENT_MEMORY_BUDGET_EXCEEDED = 'memory_budget_exceeded'
+EVENT_POOL_REBUILT = 'pool_rebuilt'
+EVENT_POOL_RETIRED = 'pool_retired'
+
+# Exit code of a worker killed by its watchdog, in the range of codes not used by Python itself
+MEMORY_BUDGET_EXIT_CODE = 75
+
+
+def current_rss_bytes() -> int:
+    """
+    Returns:
+        int: The resident set size of this process.
+    """
+    return psutil.Process().memory_info().rss
+
+
+def record_worker_event(path_to_run: str, event: str, **details):
+    """
+    Appends an event, e.g. a recycled worker, to the worker events of a run. Like the shard manifest, each event is a
+    single small O_APPEND write, so concurrent processes do not interleave their entries.
+    """
+    entry = json.dumps({'event': event, 'pid': os.getpid(), 'time': time(), **details}) + '\n'
+    with open(os.path.join(path_to_run, WORKER_EVENTS_FILE_NAME), 'a') as events:
+        events.write(entry)
+
+
+def read_worker_events(path_to_run: str) -> list:
+    path_to_events = os.path.join(path_to_run, WORKER_EVENTS_FILE_NAME)
+    if not os.path.exists(path_to_events):
+        return []
+    with open(path_to_events) as events:
+        return [json.loads(line) for line in events if line.strip()]
+
+
+def worker_event_counts(path_to_run: str) -> dict:
+    """
+    Returns:
+        dict: The amount of worker events per type.
+    """
+    return dict(Counter(event['event'] for event in read_worker_events(path_to_run)))
+
+
+@dataclass
+class TaskStatistics:
+    peak_rss_bytes: int = 0
+
+
+class WorkerSupervisor:
+    """
+    Supervises the tasks of a scraping worker process.
+
+    While a task runs, a watchdog thread polls the RSS of the process and records its peak. If it exceeds
+    memory_budget_bytes, the watchdog marks the task's tombstone and exits the process immediately: the memory is
+    reclaimed even if the scraper is stuck in native code, and the parent learns from the tombstone which repository
+    was responsible (see WorkerCrashTriage). Pool tasks report their end with task_done, after max_tasks tasks a
+    recycled event is recorded, since the pool then replaces the worker (see max_tasks_per_child). A task may scrape
+    several repositories, e.g. a batch of small ones, each of which is supervised separately.
+
+    The tombstone of a task, '<path_to_run>/_tombstones/<pid>.json', is written when the task starts and removed when it
+    ends, so after a worker died it names the repository it was scraping.
+    """
+
+    def __init__(self, path_to_run: Optional[str] = None, memory_budget_bytes: Optional[int] = None,
+                 max_tasks: Optional[int] = None, poll_interval_seconds: float = 0.5):
+        """
+        Args:
+            path_to_run (Optional[str]): The directory of the run to record tombstones and events in. If None, only
+                the peak RSS of tasks is measured.
+            memory_budget_bytes (Optional[int]): If set, the maximum RSS of the process while it runs a task.
+            max_tasks (Optional[int]): The amount of tasks after which the worker is recycled by its pool.
+            poll_interval_seconds (float): How often the watchdog measures the RSS.
+        """
+        self.path_to_run = path_to_run
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_tasks = max_tasks
+        self.poll_interval_seconds = poll_interval_seconds
+        self.tasks_done = 0
+
+        self._repository_name: Optional[str] = None
+        self._statistics: Optional[TaskStatistics] = None
+        self._task_started = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+        if path_to_run is not None:
+            os.makedirs(os.path.join(path_to_run, TOMBSTONES_DIRECTORY_NAME), exist_ok=True)
+
+    @property
+    def _path_to_tombstone(self) -> str:
+        return os.path.join(self.path_to_run, TOMBSTONES_DIRECTORY_NAME, f'{os.getpid()}.json')
+
+    def _write_tombstone(self, **details):
+        if self.path_to_run is not None:
+            with open(self._path_to_tombstone, 'w') as tombstone:
+                json.dump({'repository': self._repository_name, 'pid': os.getpid(), **details}, tombstone)
+
+    @contextmanager
+    def supervise(self, repository_name: str) -> Iterator[TaskStatistics]:
+        """
+        Context manager around a task, yields its statistics. The peak RSS is final once the context was left.
+        """
+        self._repository_name = repository_name
+        self._statistics = TaskStatistics(peak_rss_bytes=current_rss_bytes())
+        self._write_tombstone(started_at=time())
+        self._start_watchdog()
+        self._task_started.set()
+        try:
+            yield self._statistics
+        finally:
+            self._task_started.clear()
+            self._statistics.peak_rss_bytes = max(self._statistics.peak_rss_bytes, current_rss_bytes())
+            if self.path_to_run is not None:
+                os.remove(self._path_to_tombstone)
+            self._repository_name = None
+
+    def task_done(self):
+        """
+        Records the end of a task of the pool.
+        """
+        self.tasks_done += 1
+        if self.max_tasks is not None and self.tasks_done == self.max_tasks and self.path_to_run is not None:
+            record_worker_event(self.path_to_run, EVENT_RECYCLED, tasks=self.tasks_done, rss_bytes=current_rss_bytes())
+
+    def _start_watchdog(self):
+        if self._watchdog is None:
+            self._watchdog = threading.Thread(target=self._watch, name='memory-watchdog', daemon=True)
+            self._watchdog.start()
+
+    def _watch(self):
+        while True:
+            self._task_started.wait()
+            statistics, repository_name = self._statistics, self._repository_name
+            rss_bytes = current_rss_bytes()
+            statistics.peak_rss_bytes = max(statistics.peak_rss_bytes, rss_bytes)
+            if self.memory_budget_bytes is not None and rss_bytes > self.memory_budget_bytes \
+                    and self._task_started.is_set():
+                self._write_tombstone(reason=EVENT_MEMORY_BUDGET_EXCEEDED, rss_bytes=rss_bytes)
+                if self.path_to_run is not None:
+                    record_worker_event(self.path_to_run, EVENT_MEMORY_BUDGET_EXCEEDED,
+                                        repository=repository_name, rss_bytes=rss_bytes)
+                print(f'Worker {os.getpid()} exceeded its memory budget with {rss_bytes} bytes while scraping '
+                      f'{repository_name}, exiting.', file=sys.stderr, flush=True)
+                os._exit(MEMORY_BUDGET_EXIT_CODE)
+            sleep(self.poll_interval_seconds)
+
+
+_worker_supervisor: Optional[WorkerSupervisor] = None
+
+
+def initialise_worker_supervisor(path_to_run: str, memory_budget_bytes: Optional[int] = None,
+                                 max_tasks: Optional[int] = None):
+    """
+    Initializer for worker processes. Creates the supervisor of the process, see WorkerSupervisor.
+    """
+    global _worker_supervisor
+    _worker_supervisor = WorkerSupervisor(path_to_run, memory_budget_bytes, max_tasks)
+
+
+def get_worker_supervisor() -> WorkerSupervisor:
+    """
+    Returns:
+        WorkerSupervisor: The supervisor of this process. Processes without initialise_worker_supervisor get one which
+            only measures the peak RSS of tasks.
+    """
+    global _worker_supervisor
+    if _worker_supervisor is None:
+        _worker_supervisor = WorkerSupervisor()
+    return _worker_supervisor
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+class RebuildingExecutor(Executor):
+    """
+    Executor delegating to an executor created by create_executor, usually a process pool, and replacing it once it is
+    broken. A process pool breaks if any of its workers dies, e.g. killed by its watchdog or the OOM killer, after
+    which it fails all pending tasks and accepts no new ones.
+
+    With retire_after_submissions, the executor is also replaced after that many tasks were submitted to it. This
+    recycles the workers of process pools without max_tasks_per_child (Python 3.10): the retired pool finishes its
+    tasks and its workers exit, while new tasks already go to the new pool.
+    """
+
+    def __init__(self, create_executor: Callable[[], Executor], path_to_run: Optional[str] = None,
+                 retire_after_submissions: Optional[int] = None):
+        """
+        Args:
+            create_executor (Callable[[], Executor]): Creates a new executor.
+            path_to_run (Optional[str]): If set, rebuilds and retirements are recorded as events of this run.
+            retire_after_submissions (Optional[int]): If set, the amount of tasks after which the executor is replaced.
+        """
+        self.create_executor = create_executor
+        self.path_to_run = path_to_run
+        self.retire_after_submissions = retire_after_submissions
+        self.rebuilds = 0
+        self.retirements = 0
+        self._submissions = 0
+        self._executor = create_executor()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        with self._lock:
+            if self.retire_after_submissions is not None and self._submissions >= self.retire_after_submissions:
+                self._retire()
+            try:
+                future = self._executor.submit(fn, *args, **kwargs)
+            except BrokenExecutor:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor, self._submissions = self.create_executor(), 0
+                self.rebuilds += 1
+                if self.path_to_run is not None:
+                    record_worker_event(self.path_to_run, EVENT_POOL_REBUILT, rebuilds=self.rebuilds)
+                print(f'Scraping workers died, rebuilt the pool ({self.rebuilds} rebuilds so far).', file=sys.stderr,
+                      flush=True)
+                future = self._executor.submit(fn, *args, **kwargs)
+            self._submissions += 1
+            return future
+
+    def _retire(self):
+        # Tasks already submitted still run to completion, the workers exit afterwards
+        self._executor.shutdown(wait=False)
+        self._executor, self._submissions = self.create_executor(), 0
+        self.retirements += 1
+        if self.path_to_run is not None:
+            record_worker_event(self.path_to_run, EVENT_POOL_RETIRED, retirements=self.retirements)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        with self._lock:
+            self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+class WorkerCrashTriage:
+    """
+    Decides whether a repository whose scrape failed because its worker died is scraped again.
+
+    All tasks running in a pool fail once one of its workers dies, most of them through no fault of their own. They are
+    retried until they failed max_attempts times. Repositories whose tombstone shows that they exceeded the memory
+    budget are not retried, since they would exceed it again.
+    """
+
+    def __init__(self, path_to_run: str, max_attempts: int = 3):
+        self.path_to_run = path_to_run
+        self.max_attempts = max_attempts
+        self.attempts = Counter()
+        self._tombstones: Dict[str, dict] = {}
+
+    def _collect_tombstones(self):
+        path_to_tombstones = os.path.join(self.path_to_run, TOMBSTONES_DIRECTORY_NAME)
+        if not os.path.isdir(path_to_tombstones):
+            return
+        for file_name in os.listdir(path_to_tombstones):
+            path_to_tombstone = os.path.join(path_to_tombstones, file_name)
+            try:
+                with open(path_to_tombstone) as tombstone:
+                    tombstone = json.load(tombstone)
+            except (OSError, ValueError):
+                continue
+            # The watchdog only gives a reason right before the worker exits, which may still be in progress. Other
+            # tombstones of live workers belong to running tasks, e.g. in a pool which is not broken.
+            if 'reason' not in tombstone and _is_alive(tombstone['pid']):
+                continue
+            os.remove(path_to_tombstone)
+            self._tombstones[tombstone['repository']] = tombstone
+
+    def tombstone_of(self, repository_name: str) -> Optional[dict]:
+        """
+        Returns:
+            Optional[dict]: The tombstone the dead worker left for the repository, if any.
+        """
+        self._collect_tombstones()
+        return self._tombstones.get(repository_name)
+
+    def should_retry(self, repository_name: str, exception: BaseException) -> bool:
+        if not isinstance(exception, BrokenExecutor):
+            return False
+        tombstone = self.tombstone_of(repository_name)
+        if tombstone is not None and tombstone.get('reason') == EVENT_MEMORY_BUDGET_EXCEEDED:
+            return False
+        self.attempts[repository_name] += 1
+        return self.attempts[repository_name] < self.max_attempts
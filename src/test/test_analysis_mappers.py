@@ -0,0 +1,272 @@
+import ast
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+from dataclasses import fields
+from sys import path
+
+from git import Repo, GitCommandError
+
+path.append("..")
+from src.data_processing_scripts.mappers import MergeConflictMapper, SelectOnlyMergeScenariosWithConflictsMapper, \
+    SelectMergeScenariosWithExactlyTwoParents, RemoveFileCommitGramScenariosWithMergesMapper, \
+    ImproveMergeConflictScenarioQualityMapper, RepositoryAnalysisMapper, _get_clone_service, analyse_remerge_diffs, \
+    _detect_merge_conflicts_in, _detect_manual_changes_in, analyse_cherry_pick_conflicts, _file_commit_chain_purity, \
+    _file_commit_chain_purity_from_log, FirstParentMergeIndex, _remerge_diff_analyses, SampleAnalysisMapper, SampleAnalysisReducer, \
+    RemoveFileCommitGramScenariosWithAddedFile, RemoveFileCommitGramScenariosWithAddedFileReducer
+from src.data_processing_scripts.schemas import RepositoryDataRow, SampleDataRow, SampleDataRowV4
+from src.repository_data_scraper.equivalence_harness import generate_operations, materialise_repository, run_engine
+from src.repository_data_scraper.programming_language import ProgrammingLanguage
+from src.repository_data_scraper.repository_data_scraper import RepositoryDataScraper
+
+
+class RepositoryAnalysisMapperTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path_to_directory = tempfile.mkdtemp()
+        # Cherry-picking commits needs an identity
+        self.environment = mock.patch.dict(os.environ, {'GIT_COMMITTER_NAME': 'Test', 'GIT_COMMITTER_EMAIL': 'test@example.com'})
+        self.environment.start()
+        self.clone_url_template = f'file://{self.path_to_directory}/origins/{{folder}}'
+        path_to_origin = os.path.join(self.path_to_directory, 'origins', 'owner__repository')
+        materialise_repository(generate_operations(seed=3, n_operations=60), path_to_origin,
+                               ProgrammingLanguage.PYTHON)
+        accumulator = run_engine(RepositoryDataScraper, path_to_origin, ProgrammingLanguage.PYTHON, 3)
+        # The post-processing stages predate ClarifyDatasetMapper and use its original field names
+        file_commit_gram_scenarios = [{'first_commit': scenario['newest_commit'],
+                                       'last_commit': scenario['oldest_commit'], **scenario}
+                                      for scenario in accumulator['file_commit_chain_scenarios']]
+        self.row_values = {field.name: None for field in fields(RepositoryDataRow)}
+        self.row_values.update(id=0, name='owner/repository',
+                               file_commit_gram_scenarios=str(file_commit_gram_scenarios),
+                               merge_scenarios=str(accumulator['merge_scenarios']),
+                               cherry_pick_scenarios=str(accumulator['cherry_pick_scenarios']))
+
+    def tearDown(self):
+        self.environment.stop()
+        shutil.rmtree(self.path_to_directory, ignore_errors=True)
+
+    def _configure(self, job):
+        job.with_clone_settings(clone_url_template=self.clone_url_template)
+        job.path_to_repositories = os.path.join(self.path_to_directory, 'repos')
+        return job
+
+    def test_should_clone_once_and_match_the_separate_stages(self):
+        self.assertNotEqual(self.row_values['merge_scenarios'], '[]')
+        clone_service = _get_clone_service(self.clone_url_template, 5, None)
+
+        rows = [RepositoryDataRow(**self.row_values)]
+        for mapper in [MergeConflictMapper(), SelectOnlyMergeScenariosWithConflictsMapper(),
+                       SelectMergeScenariosWithExactlyTwoParents(), RemoveFileCommitGramScenariosWithMergesMapper(),
+                       ImproveMergeConflictScenarioQualityMapper()]:
+            if hasattr(mapper, 'with_clone_settings'):
+                self._configure(mapper)
+            rows = [output for row in rows for output in mapper(row)]
+            # Every operation runs in a fresh sandbox
+            shutil.rmtree(os.path.join(self.path_to_directory, 'repos'), ignore_errors=True)
+        clones_of_separate_stages = clone_service.statistics.clones
+
+        analysed_rows = list(self._configure(RepositoryAnalysisMapper())(RepositoryDataRow(**self.row_values)))
+
+        self.assertEqual(analysed_rows, rows)
+        self.assertIsNone(analysed_rows[0].error)
+        self.assertEqual(clones_of_separate_stages, 3)
+        self.assertEqual(clone_service.statistics.clones - clones_of_separate_stages, 1)
+        self.assertEqual(os.listdir(os.path.join(self.path_to_directory, 'repos')), [])
+        self.assertIn('total_number_of_merge_conflicts', analysed_rows[0].merge_scenarios)
+
+    def test_should_analyse_remerge_diffs_of_all_merges_at_once(self):
+        repo_instance = Repo(os.path.join(self.path_to_directory, 'origins', 'owner__repository'))
+        merge_commit_hashes = repo_instance.git.log('--all', '--merges', '--format=%H').split()
+        missing_commit_hash = 'f' * 40
+
+        analyses = list(analyse_remerge_diffs(repo_instance, [missing_commit_hash, *merge_commit_hashes]))
+
+        self.assertEqual([analysis.merge_commit_hash for analysis in analyses], merge_commit_hashes)
+        self.assertTrue(any(analysis.has_conflict for analysis in analyses))
+        for analysis in analyses:
+            remerge_result = repo_instance.git.show('--remerge-diff', '--format=', analysis.merge_commit_hash)
+            self.assertEqual(analysis.has_conflict, _detect_merge_conflicts_in(remerge_result) != [])
+            self.assertEqual(analysis.has_manual_changes, _detect_manual_changes_in(remerge_result))
+            self.assertEqual(analysis.total_number_of_merge_conflicts, remerge_result.count('<<<<<<<'))
+        self.assertEqual(list(analyse_remerge_diffs(repo_instance, [missing_commit_hash])), [])
+
+    def test_should_detect_the_conflicts_of_cherry_picks_without_a_checkout(self):
+        path_to_origin = os.path.join(self.path_to_directory, 'origins', 'owner__repository')
+        bare_repository = Repo.clone_from(path_to_origin, os.path.join(self.path_to_directory, 'bare'), bare=True)
+        repo_instance = Repo(path_to_origin)
+        commits = [commit for commit in repo_instance.iter_commits('--all') if len(commit.parents) == 1][:12]
+
+        cherry_picks_with_conflicts = 0
+        for parent in commits[:4]:
+            for cherry_commit in commits:
+                repo_instance.git.checkout('--detach', parent.hexsha)
+                cherry_pick = subprocess.run(['git', '-C', path_to_origin, 'cherry-pick', cherry_commit.hexsha],
+                                             capture_output=True, text=True)
+                conflict_messages, files, total_number_of_conflicts = [], [], 0
+                if cherry_pick.returncode != 0:
+                    conflict_messages = [line for line in cherry_pick.stdout.splitlines() if 'CONFLICT' in line]
+                    files = [line.split(' ')[-1] for line in conflict_messages if line.endswith('.py')]
+                    total_number_of_conflicts = sum(open(os.path.join(path_to_origin, file)).read().count('<<<<<<<')
+                                                    for file in files)
+                    repo_instance.git.cherry_pick('--abort')
+
+                analysis = analyse_cherry_pick_conflicts(bare_repository, parent.hexsha,
+                                                         bare_repository.commit(cherry_commit.hexsha))
+
+                self.assertEqual(analysis.has_conflict, conflict_messages != [])
+                # Only the labels of the commits in the messages differ
+                self.assertEqual(len(analysis.conflict_messages), len(conflict_messages))
+                self.assertEqual(analysis.files_in_merge_conflict, files)
+                self.assertEqual(analysis.total_number_of_merge_conflicts, total_number_of_conflicts)
+                cherry_picks_with_conflicts += analysis.has_conflict
+        self.assertGreater(cherry_picks_with_conflicts, 0)
+        # No ref of the repository was changed
+        self.assertEqual(bare_repository.git.for_each_ref(), Repo(path_to_origin).git.for_each_ref())
+
+    def test_should_compute_the_purity_of_file_commit_chains_without_a_checkout(self):
+        path_to_origin = os.path.join(self.path_to_directory, 'origins', 'owner__repository')
+        bare_repository = Repo.clone_from(path_to_origin, os.path.join(self.path_to_directory, 'bare'), bare=True)
+        repo_instance = Repo(path_to_origin)
+        scenarios = ast.literal_eval(self.row_values['file_commit_gram_scenarios'])
+
+        def purity_of(scenario, engine, repository):
+            try:
+                return engine(scenario, repository)
+            except GitCommandError:
+                # e.g. the chain starts at the root commit, so there is no commit before it to reset to
+                return 'error'
+
+        purities = [purity_of(scenario, _file_commit_chain_purity_from_log, bare_repository)
+                    for scenario in scenarios]
+
+        self.assertEqual(purities, [purity_of(scenario, _file_commit_chain_purity, repo_instance)
+                                    for scenario in scenarios])
+        self.assertIn(None, purities)
+        self.assertTrue(any(purity not in [None, 0] for purity in purities))
+
+    def test_should_not_count_lines_starting_with_increments_as_file_headers(self):
+        path_to_repository = os.path.join(self.path_to_directory, 'increments')
+        repository = Repo.init(path_to_repository)
+        contents = [{'a.py': 'i = 0\nj = 0\n', 'b.py': 'k = 0\n'},
+                    {'a.py': 'i = 0\n++i;\nj = 0\n', 'b.py': 'k = 0\n--k;\n'},
+                    {'a.py': 'i = 0\n++i;\n--j;\n', 'b.py': 'k = 1\n'}]
+        for index, files in enumerate(contents):
+            for file, content in files.items():
+                with open(os.path.join(path_to_repository, file), 'w') as file_to_write:
+                    file_to_write.write(content)
+            repository.git.add('--all')
+            repository.git.commit('-m', f'commit {index}', author='Test <test@example.com>')
+        scenario = {'newest_commit': repository.head.commit.hexsha, 'times_seen_consecutively': 2, 'file': 'a.py'}
+        bare_repository = Repo.clone_from(path_to_repository, os.path.join(self.path_to_directory, 'increments.git'),
+                                          bare=True)
+
+        purity = _file_commit_chain_purity_from_log(scenario, bare_repository)
+
+        self.assertEqual(purity, _file_commit_chain_purity(scenario, repository))
+        # Like the reference, the added '++i;' and the removed '--k;' are taken for file headers, numstat gives 0.43
+        self.assertEqual(purity, 0.4)
+
+    def test_should_find_merges_in_first_parent_chains_without_walking_them(self):
+        repo_instance = Repo(os.path.join(self.path_to_directory, 'origins', 'owner__repository'))
+
+        merge_index = FirstParentMergeIndex(repo_instance)
+
+        commits = list(repo_instance.iter_commits('--all'))
+        self.assertTrue(all(commit.hexsha in merge_index for commit in commits))
+        self.assertNotIn('f' * 40, merge_index)
+        for commit in commits:
+            chain = [commit]
+            while chain[-1].parents:
+                chain.append(chain[-1].parents[0])
+            merge_positions = [position for position, chain_commit in enumerate(chain)
+                               if len(chain_commit.parents) > 1]
+            self.assertEqual(merge_index.depth(commit.hexsha), len(chain))
+            self.assertEqual(merge_index.merge_position(commit.hexsha), (merge_positions or [None])[0])
+        self.assertTrue(any(merge_index.merge_position(commit.hexsha) not in [None, 0] for commit in commits))
+
+    def _samples(self, row_type, **values) -> list:
+        scenarios = ast.literal_eval(self.row_values['file_commit_gram_scenarios'])
+        samples = []
+        for i, scenario in enumerate(scenarios):
+            sample_values = {field.name: None for field in fields(row_type)}
+            # The difficulty of the samples of RemoveFileCommitGramScenariosWithAddedFile is computed from the purity
+            sample_values.update(id=f'owner/repository-{i:05d}', name='owner/repository',
+                                 scenario=str({**scenario, 'purity': 1.0}), **values)
+            samples.append(row_type(**sample_values))
+        return samples
+
+    def test_should_clone_once_per_repository_in_reducers(self):
+        clone_service = _get_clone_service(self.clone_url_template, 5, None)
+        for mapper, reducer, row_type, values in [
+                (SampleAnalysisMapper(), SampleAnalysisReducer(), SampleDataRowV4, {'sample_type': 'file_commit_chain'}),
+                (RemoveFileCommitGramScenariosWithAddedFile(), RemoveFileCommitGramScenariosWithAddedFileReducer(),
+                 SampleDataRow, {'scenario_type': 'file_commit_gram'})]:
+            self.assertGreater(len(self._samples(row_type, **values)), 1)
+
+            clones = clone_service.statistics.clones
+            mapped_rows = [output for sample in self._samples(row_type, **values)
+                           for output in self._configure(mapper)(sample)]
+            clones_of_mapper = clone_service.statistics.clones - clones
+
+            reduced_rows = list(self._configure(reducer)(iter(self._samples(row_type, **values))))
+
+            self.assertEqual(reduced_rows, mapped_rows)
+            self.assertNotEqual(mapped_rows, [])
+            self.assertGreater(clones_of_mapper, 1)
+            self.assertEqual(clone_service.statistics.clones - clones - clones_of_mapper, 1)
+            self.assertEqual(os.listdir(os.path.join(self.path_to_directory, 'repos')), [])
+
+    def test_should_not_clone_if_all_analyses_are_cached(self):
+        clone_service = _get_clone_service(self.clone_url_template, 5, None)
+        path_to_analysis_cache = os.path.join(self.path_to_directory, 'analysis_cache', 'results.sqlite')
+        origin = Repo(os.path.join(self.path_to_directory, 'origins', 'owner__repository'))
+        # Git errors are not cached, e.g. those of chains which reach the root commit
+        chains_with_base = [sample.id for sample in self._samples(SampleDataRowV4, sample_type='file_commit_chain')
+                            if origin.git.rev_parse('--verify', '-q', '{newest_commit}~{times_seen_consecutively}'.format(
+                                **ast.literal_eval(sample.scenario)), with_exceptions=False)]
+        self.assertGreater(len(chains_with_base), 1)
+        for mapper, rows in [
+                (RepositoryAnalysisMapper(['detect_merge_conflicts', 'improve_merge_conflict_scenario_quality']),
+                 lambda: [RepositoryDataRow(**self.row_values)]),
+                (SampleAnalysisMapper(), lambda: [sample for sample in self._samples(SampleDataRowV4, sample_type='file_commit_chain')
+                         if sample.id in chains_with_base])]:
+            self._configure(mapper)
+            uncached_rows = [output for row in rows() for output in mapper(row)]
+            mapper.with_analysis_cache(path_to_analysis_cache)
+
+            clones = clone_service.statistics.clones
+            first_rows = [output for row in rows() for output in mapper(row)]
+            clones_of_first_run = clone_service.statistics.clones - clones
+            second_rows = [output for row in rows() for output in mapper(row)]
+
+            self.assertEqual(first_rows, uncached_rows)
+            self.assertEqual(second_rows, uncached_rows)
+            self.assertGreater(clones_of_first_run, 0)
+            self.assertEqual(clone_service.statistics.clones - clones - clones_of_first_run, 0)
+            self.assertEqual(os.listdir(os.path.join(self.path_to_directory, 'repos')), [])
+
+    def test_should_analyse_commits_again_which_were_missing_from_a_clone(self):
+        repo_instance = Repo(os.path.join(self.path_to_directory, 'origins', 'owner__repository'))
+        merge_commit_hash = repo_instance.git.log('--all', '--merges', '--format=%H').split()[0]
+        stale_clone = Repo.init(os.path.join(self.path_to_directory, 'stale'))
+        stale_clone.git.commit('--allow-empty', '-m', 'Unrelated', author='Test <test@example.com>')
+        job = MergeConflictMapper().with_analysis_cache(os.path.join(self.path_to_directory, 'analysis_cache.sqlite'))
+
+        self.assertEqual(_remerge_diff_analyses(job, 'owner/repository', [merge_commit_hash], lambda: stale_clone), {})
+        analyses = _remerge_diff_analyses(job, 'owner/repository', [merge_commit_hash], lambda: repo_instance)
+
+        self.assertEqual(list(analyses), [merge_commit_hash])
+        self.assertEqual(_remerge_diff_analyses(job, 'owner/repository', [merge_commit_hash], lambda: stale_clone),
+                         analyses)
+
+    def test_should_reject_unknown_passes(self):
+        with self.assertRaises(ValueError):
+            RepositoryAnalysisMapper(['detect_merge_conflicts', 'unknown'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import unittest
+from sys import path
+from time import monotonic
+
+from git import GitCommandError
+
+path.append("..")
+from src.repository_data_scraper.clone_service import CloneService, TokenBucket, mirror_url_rewrite, \
+    template_url_rewrite
+from src.repository_data_scraper.equivalence_harness import generate_operations, materialise_repository
+from src.repository_data_scraper.programming_language import ProgrammingLanguage
+
+
+class CloneServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path_to_directory = tempfile.mkdtemp()
+        self.path_to_mirrors = os.path.join(self.path_to_directory, 'mirrors')
+        path_to_origin = os.path.join(self.path_to_directory, 'origin')
+        materialise_repository(generate_operations(seed=1, n_operations=10), path_to_origin,
+                               ProgrammingLanguage.PYTHON)
+        subprocess.run(['git', 'clone', '--bare', '-q', path_to_origin,
+                        os.path.join(self.path_to_mirrors, 'owner__repository.git')], check=True)
+        self.head = subprocess.run(['git', '-C', path_to_origin, 'rev-parse', 'HEAD'], capture_output=True,
+                                   text=True, check=True).stdout.strip()
+
+    def tearDown(self):
+        shutil.rmtree(self.path_to_directory, ignore_errors=True)
+
+    def test_should_clone_from_mirror(self):
+        clone_service = CloneService(url_rewrite=mirror_url_rewrite(self.path_to_mirrors, fall_back_to_github=False))
+        try:
+            repository = clone_service.clone_repository('owner/repository',
+                                                        os.path.join(self.path_to_directory, 'clone'))
+            self.assertEqual(repository.head.commit.hexsha, self.head)
+
+            with self.assertRaises(GitCommandError):
+                clone_service.clone_repository('owner/missing', os.path.join(self.path_to_directory, 'missing'))
+            # A missing repository is a permanent failure, so it is not retried
+            self.assertEqual(clone_service.statistics.attempts, 2)
+        finally:
+            clone_service.close()
+
+    def test_should_retry_transient_failures(self):
+        # A git which fails with a transient error once, then behaves like git
+        path_to_bin = os.path.join(self.path_to_directory, 'bin')
+        os.makedirs(path_to_bin)
+        path_to_failure_marker = os.path.join(self.path_to_directory, 'failed-once')
+        with open(os.path.join(path_to_bin, 'git'), 'w') as fake_git:
+            fake_git.write(f'#!/bin/sh\nif [ ! -f {path_to_failure_marker} ]; then touch {path_to_failure_marker}; '
+                           f'echo "fatal: early EOF" >&2; exit 128; fi\nexec {shutil.which("git")} "$@"\n')
+        os.chmod(os.path.join(path_to_bin, 'git'), stat.S_IRWXU)
+
+        clone_service = CloneService(initial_backoff_seconds=0.01, url_rewrite=template_url_rewrite(
+            f'file://{self.path_to_mirrors}/{{folder}}.git'))
+        original_path = os.environ['PATH']
+        os.environ['PATH'] = f'{path_to_bin}{os.pathsep}{original_path}'
+        try:
+            repository = clone_service.clone_repository('owner/repository',
+                                                        os.path.join(self.path_to_directory, 'clone'))
+        finally:
+            os.environ['PATH'] = original_path
+            clone_service.close()
+
+        self.assertEqual(repository.head.commit.hexsha, self.head)
+        self.assertEqual((clone_service.statistics.attempts, clone_service.statistics.retries), (2, 1))
+
+    def test_token_bucket_should_limit_rate(self):
+        async def acquire_tokens():
+            token_bucket = TokenBucket(rate=50, capacity=1)
+            start = monotonic()
+            for _ in range(6):
+                await token_bucket.acquire()
+            return monotonic() - start
+
+        self.assertGreaterEqual(asyncio.run(acquire_tokens()), 0.09)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+from sys import path
+
+from git import Repo
+
+path.append("..")
+from src.repository_data_scraper.commit_index import CommitIndex, iter_git_log_records
+from src.repository_data_scraper.equivalence_harness import generate_operations, materialise_repository, \
+    compare_engines_on
+from src.repository_data_scraper.programming_language import ProgrammingLanguage
+from src.repository_data_scraper.repository_data_scraper import RepositoryDataScraper
+
+
+class IndexedRepositoryDataScraper(RepositoryDataScraper):
+
+    def __init__(self, repository: Repo, **kwargs):
+        path_to_index = os.path.join(repository.git_dir, 'commit-index.sqlite')
+        super().__init__(repository=repository,
+                         commit_index=CommitIndex.open_or_build(repository.working_tree_dir, path_to_index),
+                         **kwargs)
+
+
+class CommitIndexTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.path_to_repository = tempfile.mkdtemp()
+        materialise_repository(generate_operations(seed=7, n_operations=40), cls.path_to_repository,
+                               ProgrammingLanguage.PYTHON)
+        cls.path_to_index = os.path.join(tempfile.mkdtemp(), 'index.sqlite')
+        cls.commit_index = CommitIndex.build(cls.path_to_repository, cls.path_to_index)
+        cls.repository = Repo(cls.path_to_repository)
+        cls.commits = cls.repository.git.rev_list('--all').split()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.commit_index.close()
+        shutil.rmtree(cls.path_to_repository, ignore_errors=True)
+        shutil.rmtree(os.path.dirname(cls.path_to_index), ignore_errors=True)
+
+    def test_should_list_same_changes_as_git_show(self):
+        for commit in self.commits:
+            changes = self.repository.git.show(commit, name_status=True, format='oneline').split('\n')[1:]
+
+            self.assertEqual(self.commit_index.name_status(commit), [change for change in changes if change])
+
+    def test_should_store_parents_and_line_counts(self):
+        for commit in self.commits:
+            parents = self.repository.git.rev_list('--parents', '-n', '1', commit).split()[1:]
+            self.assertEqual(self.commit_index.parents(commit), parents)
+
+            if len(parents) < 2:
+                numstat = [line.split('\t') for line in
+                           self.repository.git.show(commit, numstat=True, format='').split('\n') if line]
+                self.assertEqual([(change.added, change.deleted, change.path)
+                                  for change in self.commit_index.changes(commit)],
+                                 [(int(added), int(deleted), file) for added, deleted, file in numstat])
+
+    def test_should_emulate_git_log(self):
+        for commit in self.commits:
+            self.assertEqual(self.commit_index.log(commit, 5),
+                             self.repository.git.log(commit, format='%H', n=5).split())
+
+    def test_should_rebuild_when_refs_changed(self):
+        self.assertTrue(self.commit_index.is_up_to_date_with(self.path_to_repository))
+
+        self.repository.git.branch('new-branch-after-indexing', 'main')
+        try:
+            self.assertFalse(self.commit_index.is_up_to_date_with(self.path_to_repository))
+        finally:
+            self.repository.git.branch('-D', 'new-branch-after-indexing')
+
+    def test_should_decode_characters_split_across_reads(self):
+        path_to_repository = tempfile.mkdtemp()
+        try:
+            repository = Repo.init(path_to_repository)
+            # The record starts with 9 bytes, so the first read of 64KB ends within a three byte character
+            message = '€' * 30000
+            repository.git.commit('--allow-empty', '-m', message, author='Jürgen <j@example.com>',
+                                  env={'GIT_COMMITTER_NAME': 'Jürgen', 'GIT_COMMITTER_EMAIL': 'j@example.com'})
+
+            (header, _), = iter_git_log_records(path_to_repository, fields='%an%x1f%B')
+
+            self.assertEqual(header, ['Jürgen', message + '\n'])
+        finally:
+            shutil.rmtree(path_to_repository, ignore_errors=True)
+
+    def test_scraper_with_index_should_be_equivalent_to_reference(self):
+        report = compare_engines_on(self.path_to_repository, IndexedRepositoryDataScraper, ProgrammingLanguage.PYTHON,
+                                    sliding_window_size=2)
+
+        self.assertTrue(report.is_equivalent, str(report))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from sys import path
+
+path.append("..")
+from src.repository_data_scraper.equivalence_harness import generate_operations, materialise_repository, run_engine
+from src.repository_data_scraper.programming_language import ProgrammingLanguage
+from src.repository_data_scraper.repository_data_scraper import RepositoryDataScraper
+from src.repository_data_scraper.vectorised_repository_data_scraper import VectorisedRepositoryDataScraper
+
+
+class ConcurrentScrapingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.paths_to_repositories = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        for seed, path_to_repository in enumerate(self.paths_to_repositories):
+            materialise_repository(generate_operations(seed=seed, n_operations=50), path_to_repository,
+                                   ProgrammingLanguage.PYTHON)
+        # Scraping must not depend on the working directory, so run it from an unrelated one
+        self.working_directory = os.getcwd()
+        self.unrelated_directory = tempfile.mkdtemp()
+        os.chdir(self.unrelated_directory)
+
+    def tearDown(self):
+        os.chdir(self.working_directory)
+        for path_to_directory in self.paths_to_repositories + [self.unrelated_directory]:
+            shutil.rmtree(path_to_directory, ignore_errors=True)
+
+    def test_should_scrape_two_repositories_concurrently_in_one_process(self):
+        for engine in [RepositoryDataScraper, VectorisedRepositoryDataScraper]:
+            expected_accumulators = [run_engine(engine, path_to_repository, ProgrammingLanguage.PYTHON, 2)
+                                     for path_to_repository in self.paths_to_repositories]
+
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                accumulators = list(executor.map(
+                    lambda path_to_repository: run_engine(engine, path_to_repository, ProgrammingLanguage.PYTHON, 2),
+                    self.paths_to_repositories))
+
+            self.assertEqual(accumulators, expected_accumulators)
+            self.assertNotEqual(accumulators[0], accumulators[1])
+            self.assertEqual(os.getcwd(), os.path.realpath(self.unrelated_directory))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import random
+import unittest
+from dataclasses import fields
+from sys import path
+
+path.append("..")
+from src.data_processing_scripts.deduplication import remove_duplicates, sort_rows_externally
+from src.data_processing_scripts.mappers import RemoveDuplicatesReducer
+from src.data_processing_scripts.schemas import RepositoryDataRow
+
+
+def _repositories(seed: int, n: int) -> list:
+    generator = random.Random(seed)
+    rows = []
+    for i in range(n):
+        row_values = {field.name: None for field in fields(RepositoryDataRow)}
+        row_values.update(id=generator.randrange(n), name=f'owner/repository-{generator.randrange(n // 4)}',
+                          stargazers=generator.choice([None, generator.randrange(10)]))
+        rows.append(RepositoryDataRow(**row_values))
+    return rows
+
+
+class DeduplicationTestCase(unittest.TestCase):
+
+    def test_should_sort_rows_externally(self):
+        rows = _repositories(seed=1, n=200)
+
+        sorted_rows = list(sort_rows_externally(rows, ['stargazers', 'name'], rows_per_run=16))
+
+        # Missing values sort first and the sort is stable, like sorted
+        self.assertEqual(sorted_rows, sorted(rows, key=lambda row: (row.stargazers is not None, row.stargazers or 0,
+                                                                    row.name)))
+
+    def test_should_keep_the_first_row_by_tie_break_columns(self):
+        rows = _repositories(seed=2, n=200)
+        expected_rows = {}
+        for row in sorted(rows, key=lambda row: row.id):
+            expected_rows.setdefault(row.name, row)
+
+        for seed in range(3):
+            shuffled_rows = list(rows)
+            random.Random(seed).shuffle(shuffled_rows)
+
+            deduplicated_rows = list(remove_duplicates(shuffled_rows, ['name'], ['id'], rows_per_run=16))
+
+            self.assertEqual([row.id for row in deduplicated_rows],
+                             [expected_rows[name].id for name in sorted(expected_rows)])
+
+    def test_should_keep_the_first_row_of_a_group_in_the_reducer(self):
+        rows = sorted(_repositories(seed=3, n=20), key=lambda row: (row.name, row.id))[:3]
+
+        self.assertEqual(list(RemoveDuplicatesReducer()(iter(rows))), rows[:1])
+
+
+if __name__ == '__main__':
+    unittest.main()
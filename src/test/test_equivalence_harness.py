@@ -0,0 +1,68 @@
+import unittest
+from sys import path
+
+path.append("..")
+from src.repository_data_scraper.equivalence_harness import diff_accumulators, \
+    compare_engines_on_generated_repositories
+from src.repository_data_scraper.programming_language import ProgrammingLanguage
+from src.repository_data_scraper.repository_data_scraper import RepositoryDataScraper
+
+
+class ScraperWithoutConflictingMerges(RepositoryDataScraper):
+    """Deliberately broken engine that drops merge scenarios with conflicts."""
+
+    def scrape(self):
+        super().scrape()
+        self.accumulator['merge_scenarios'] = [merge_scenario for merge_scenario in self.accumulator['merge_scenarios']
+                                               if not merge_scenario['had_conflicts']]
+
+
+class EquivalenceHarnessTestCase(unittest.TestCase):
+
+    def test_should_diff_accumulators_order_insensitively(self):
+        chain = {'file': 'foo.py', 'branch': 'main', 'oldest_commit': 'a', 'newest_commit': 'b',
+                 'times_seen_consecutively': 3}
+        merge = {'merge_commit_hash': 'c', 'had_conflicts': False, 'parents': ['a', 'b']}
+        reference = {'file_commit_chain_scenarios': [chain, dict(chain, file='bar.py')], 'merge_scenarios': [merge],
+                     'cherry_pick_scenarios': []}
+        candidate = {'file_commit_chain_scenarios': [dict(chain, file='bar.py'), chain], 'merge_scenarios': [merge],
+                     'cherry_pick_scenarios': []}
+
+        self.assertEqual(diff_accumulators(reference, candidate), [])
+
+    def test_should_report_missing_duplicates_and_parent_order(self):
+        merge = {'merge_commit_hash': 'c', 'had_conflicts': False, 'parents': ['a', 'b']}
+        reference = {'file_commit_chain_scenarios': [], 'merge_scenarios': [merge, merge], 'cherry_pick_scenarios': []}
+        candidate = {'file_commit_chain_scenarios': [], 'cherry_pick_scenarios': [],
+                     'merge_scenarios': [dict(merge, parents=['b', 'a'])]}
+
+        differences = diff_accumulators(reference, candidate)
+
+        self.assertEqual(len(differences), 1)
+        self.assertEqual(differences[0].scenario_key, 'merge_scenarios')
+        self.assertEqual(differences[0].missing, [merge, merge])
+        self.assertEqual(differences[0].unexpected, [dict(merge, parents=['b', 'a'])])
+
+    def test_reference_engine_should_be_equivalent_to_itself_on_generated_repositories(self):
+        reports = compare_engines_on_generated_repositories(RepositoryDataScraper, ProgrammingLanguage.PYTHON,
+                                                            seeds=[0, 1, 2], sliding_window_size=2)
+
+        for report in reports:
+            self.assertTrue(report.is_equivalent, str(report))
+
+    def test_should_shrink_counterexample_for_broken_engine(self):
+        reports = compare_engines_on_generated_repositories(ScraperWithoutConflictingMerges,
+                                                            ProgrammingLanguage.PYTHON, seeds=range(10),
+                                                            sliding_window_size=2, n_operations=15)
+        failing_reports = [report for report in reports if not report.is_equivalent]
+
+        self.assertTrue(failing_reports)
+        for report in failing_reports:
+            self.assertEqual([difference.scenario_key for difference in report.differences], ['merge_scenarios'])
+            self.assertTrue(all(scenario['had_conflicts'] for scenario in report.differences[0].missing))
+            # A conflicting merge needs at least two diverging commits and the merge itself
+            self.assertLessEqual(len(report.operations), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from sys import path
+
+path.append("..")
+from src.repository_data_scraper.clone_service import CloneService, template_url_rewrite
+from src.repository_data_scraper.equivalence_harness import generate_operations, materialise_repository
+from src.repository_data_scraper.programming_language import ProgrammingLanguage
+from src.repository_data_scraper.repository_cache import RepositoryCache
+
+
+def _refs_of(path_to_repository: str) -> str:
+    return subprocess.run(['git', '-C', path_to_repository, 'for-each-ref', '--format=%(refname) %(objectname)'],
+                          capture_output=True, text=True, check=True).stdout
+
+
+class RepositoryCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path_to_directory = tempfile.mkdtemp()
+        self.path_to_origins = os.path.join(self.path_to_directory, 'origins')
+        for seed, folder in enumerate(['owner__first', 'owner__second']):
+            materialise_repository(generate_operations(seed=seed, n_operations=10),
+                                   os.path.join(self.path_to_origins, folder), ProgrammingLanguage.PYTHON)
+        self.clone_service = CloneService(url_rewrite=template_url_rewrite(f'file://{self.path_to_origins}/{{folder}}'))
+
+    def tearDown(self):
+        self.clone_service.close()
+        shutil.rmtree(self.path_to_directory, ignore_errors=True)
+
+    def test_should_check_out_working_copies_like_clones(self):
+        repository_cache = RepositoryCache(os.path.join(self.path_to_directory, 'cache'),
+                                           clone_service=self.clone_service, refresh_after_seconds=0)
+        path_to_clone = os.path.join(self.path_to_directory, 'clone')
+        self.clone_service.clone_repository('owner/first', path_to_clone)
+
+        with repository_cache.lease('owner/first') as path_to_working_copy:
+            # Same branches, tags and default branch as a clone, so scraping yields the same scenarios
+            self.assertEqual(_refs_of(path_to_working_copy), _refs_of(path_to_clone))
+        self.assertFalse(os.path.exists(path_to_working_copy))
+
+        # The second checkout fetches new commits into the mirror instead of cloning again
+        path_to_origin = os.path.join(self.path_to_origins, 'owner__first')
+        subprocess.run(['git', '-C', path_to_origin, '-c', 'user.name=a', '-c', 'user.email=a@b.c', 'commit', '-q',
+                        '--allow-empty', '-m', 'New commit'], check=True)
+        with repository_cache.lease('owner/first') as path_to_working_copy:
+            self.assertEqual(subprocess.run(['git', '-C', path_to_working_copy, 'log', '-1', '--format=%s'],
+                                            capture_output=True, text=True, check=True).stdout.strip(), 'New commit')
+        self.assertEqual(self.clone_service.statistics.clones, 2)
+
+    def test_should_evict_least_recently_used_mirrors_without_leases(self):
+        # Every mirror exceeds the budget, so only leased mirrors stay in the cache
+        repository_cache = RepositoryCache(os.path.join(self.path_to_directory, 'cache'), disk_budget_bytes=1,
+                                           clone_service=self.clone_service)
+        path_to_first_working_copy = repository_cache.checkout('owner/first')
+        with repository_cache.lease('owner/second'):
+            self.assertTrue(os.path.isdir(repository_cache.path_to_mirror_of('owner/first')))
+        self.assertFalse(os.path.isdir(repository_cache.path_to_mirror_of('owner/second')))
+        self.assertTrue(os.path.isdir(repository_cache.path_to_mirror_of('owner/first')))
+
+        # Removing a working copy without release, like the mappers do, ends its lease as well
+        shutil.rmtree(path_to_first_working_copy)
+        with repository_cache.lease('owner/second'):
+            pass
+        self.assertFalse(os.path.isdir(repository_cache.path_to_mirror_of('owner/first')))
+        self.assertEqual(repository_cache.size_bytes(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
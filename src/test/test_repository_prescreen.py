@@ -0,0 +1,74 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from sys import path
+
+path.append("..")
+from src.repository_data_scraper.clone_service import CloneService, template_url_rewrite
+from src.repository_data_scraper.equivalence_harness import materialise_repository, run_engine
+from src.repository_data_scraper.programming_language import ProgrammingLanguage
+from src.repository_data_scraper.repository_data_scraper import RepositoryDataScraper
+from src.repository_data_scraper.repository_prescreen import estimate_repository, PreScreenThresholds, \
+    prescreen_repository, PRESCREEN_SCRAPE
+
+
+class RepositoryPreScreenTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path_to_repository = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path_to_repository, ignore_errors=True)
+
+    def test_should_estimate_commits_merges_and_trailers(self):
+        materialise_repository([('branch', 0),
+                                ('commit', 0, (0,)), ('commit', 1, (1,)), ('commit', 1, (2,)),
+                                ('merge', 0, 1),
+                                ('commit', 1, (0,)),
+                                ('cherry_pick', 0, 1, True)],
+                               self.path_to_repository, ProgrammingLanguage.PYTHON)
+
+        estimate = estimate_repository(self.path_to_repository, ProgrammingLanguage.PYTHON)
+
+        total_commits = subprocess.run(['git', '-C', self.path_to_repository, 'rev-list', '--count', '--all'],
+                                       capture_output=True, text=True).stdout
+        self.assertEqual(estimate.estimated_total_commits, int(total_commits))
+        self.assertEqual(estimate.estimated_merge_commits, 1)
+        self.assertEqual(estimate.estimated_cherry_pick_trailers, 1)
+        # The initial commit, four commits changing module_0.py or module_1.py and the merge, which differs from both
+        # of its parents in a .py file. The commit changing notes_2.md is not counted.
+        self.assertEqual(estimate.estimated_language_commits, 6)
+
+    def test_should_not_pass_thresholds_iff_repository_yields_no_scenarios(self):
+        materialise_repository([('commit', 0, (2,)), ('commit', 0, (2,)), ('commit', 0, (0,))],
+                               self.path_to_repository, ProgrammingLanguage.PYTHON)
+
+        estimate = estimate_repository(self.path_to_repository, ProgrammingLanguage.PYTHON)
+        accumulator = run_engine(RepositoryDataScraper, self.path_to_repository, ProgrammingLanguage.PYTHON, 3)
+
+        self.assertFalse(estimate.passes(PreScreenThresholds(min_language_commits=3)))
+        self.assertEqual(sum(len(scenarios) for scenarios in accumulator.values()), 0)
+
+    def test_should_prescreen_blobless_clones_of_the_clone_service(self):
+        materialise_repository([('branch', 0), ('commit', 0, (0,)), ('commit', 1, (1,)), ('merge', 0, 1)],
+                               self.path_to_repository, ProgrammingLanguage.PYTHON)
+        path_to_prescreen_clones = tempfile.mkdtemp()
+        clone_service = CloneService(url_rewrite=template_url_rewrite(f'file://{self.path_to_repository}'))
+        try:
+            estimate = prescreen_repository('owner/repository', path_to_prescreen_clones, ProgrammingLanguage.PYTHON,
+                                            PreScreenThresholds(), clone_service)
+
+            self.assertEqual(estimate.prescreen_decision, PRESCREEN_SCRAPE)
+            self.assertEqual(estimate.estimated_merge_commits, 1)
+            self.assertEqual(clone_service.statistics.clones, 1)
+            # The clone is removed again
+            self.assertEqual(os.listdir(path_to_prescreen_clones), [])
+        finally:
+            clone_service.close()
+            shutil.rmtree(path_to_prescreen_clones, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+from sys import path
+
+import numpy as np
+import pandas as pd
+
+path.append("..")
+from src.repository_data_scraper.repository_prescreen import PRESCREEN_DEPRIORITISE, PRESCREEN_SCRAPE
+from src.repository_data_scraper.repository_scheduler import CostModel, fit_cost_model, order_longest_first, \
+    cost_model_report, batch_small_repositories, read_cost_model_results
+
+
+class RepositorySchedulerTestCase(unittest.TestCase):
+
+    def test_should_order_longest_first_and_keep_deprioritised_last(self):
+        repositories_metadata = pd.DataFrame({
+            'name': ['small/deprioritised', 'owner/small', 'owner/huge', 'owner/medium'],
+            'commits': [10, 50, 100000, 5000],
+            'branches': [1, 1, 40, 5],
+            'size': [100, 200, 900000, 20000],
+            'prescreen_decision': [PRESCREEN_DEPRIORITISE, PRESCREEN_SCRAPE, PRESCREEN_SCRAPE, PRESCREEN_SCRAPE]})
+
+        ordered = order_longest_first(repositories_metadata, CostModel())
+
+        self.assertEqual(list(ordered['name']), ['owner/huge', 'owner/medium', 'owner/small', 'small/deprioritised'])
+        self.assertTrue(ordered['predicted_seconds'].iloc[:3].is_monotonic_decreasing)
+
+    def test_should_fit_cost_model_on_actual_cost(self):
+        random = np.random.default_rng(0)
+        results = pd.DataFrame({'commits': random.integers(10, 100000, 50), 'branches': random.integers(1, 50, 50),
+                                'size': random.integers(100, 10 ** 6, 50), 'error': None})
+        true_model = CostModel(intercept=-5.0, coefficients={'commits': 1.1, 'branches': 0.4, 'size': 0.2})
+        results['clone_seconds'] = 0.0
+        results['scrape_seconds'] = true_model.predict(results)
+
+        fitted_model = fit_cost_model(results)
+
+        self.assertAlmostEqual(fitted_model.intercept, true_model.intercept, places=6)
+        for feature, coefficient in true_model.coefficients.items():
+            self.assertAlmostEqual(fitted_model.coefficients[feature], coefficient, places=6)
+
+        results['predicted_seconds'] = fitted_model.predict(results)
+        report = cost_model_report(results)
+        self.assertEqual(report['repositories'], 50)
+        self.assertEqual(report['rank_correlation'], 1.0)
+        self.assertEqual(report['median_error_factor'], 1.0)
+
+        with tempfile.TemporaryDirectory() as path_to_run:
+            path_to_output = os.path.join(path_to_run, 'output.parquet')
+            results.assign(name='owner/repository', scraped_data='{}').to_parquet(path_to_output)
+
+            results_of_run = read_cost_model_results(path_to_output)
+
+        self.assertNotIn('scraped_data', results_of_run)
+        self.assertEqual(fit_cost_model(results_of_run), fitted_model)
+
+    def test_should_batch_small_repositories(self):
+        repositories = [pd.Series({'name': name, 'size': size})
+                        for name, size in [('a', 900), ('b', 1), ('c', 2), ('d', 800), ('e', 3), ('f', 4)]]
+
+        items = list(batch_small_repositories(repositories, is_small=lambda repository: repository['size'] < 10,
+                                              batch_size=2))
+
+        self.assertEqual([item['name'] if isinstance(item, pd.Series) else [repository['name'] for repository in item]
+                          for item in items], ['a', ['b', 'c'], 'd', ['e', 'f']])
+        self.assertEqual(len(list(batch_small_repositories(repositories, lambda repository: True, batch_size=1))), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
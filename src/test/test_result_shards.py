@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from sys import path
+
+import pandas as pd
+
+path.append("..")
+from src.repository_data_scraper.result_shards import ParquetShardWriter, shard_schema_for, \
+    initialise_process_shard_writer, get_process_shard_writer, read_manifest, open_shards_as_dataset, merge_shards
+
+
+def _write_in_worker(repository_metadata):
+    return get_process_shard_writer().write(repository_metadata)
+
+
+def _repository_metadata(index):
+    return pd.Series({'name': f'owner/repository-{index}', 'size': index,
+                      'homepage': float('nan') if index % 2 else 'https://example.com',
+                      'scraped_data': {'merge_scenarios': [index]}, 'n_merge_scenarios': 1})
+
+
+class ResultShardsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path_to_shards = tempfile.mkdtemp()
+        self.schema = shard_schema_for(pd.DataFrame([{'name': 'owner/repository', 'size': 0,
+                                                      'homepage': 'https://example.com'}]))
+
+    def tearDown(self):
+        shutil.rmtree(self.path_to_shards, ignore_errors=True)
+
+    def test_should_only_list_closed_shards_in_manifest(self):
+        shard_writer = ParquetShardWriter(self.path_to_shards, self.schema, row_group_size=2, rows_per_shard=4)
+        for index in range(6):
+            shard_writer.write(_repository_metadata(index))
+
+        self.assertEqual([entry['rows'] for entry in read_manifest(self.path_to_shards)], [4])
+        shard_writer.close()
+        self.assertEqual([entry['rows'] for entry in read_manifest(self.path_to_shards)], [4, 2])
+
+        table = open_shards_as_dataset(self.path_to_shards).to_table()
+        self.assertEqual(table.column('name').to_pylist(), [f'owner/repository-{index}' for index in range(6)])
+        self.assertEqual(table.column('scraped_data')[0].as_py(), "{'merge_scenarios': [0]}")
+        self.assertIsNone(table.column('homepage')[1].as_py())
+        self.assertIsNone(table.column('error')[0].as_py())
+
+    def test_should_close_shards_only_after_all_rows_of_a_batch(self):
+        shard_writer = ParquetShardWriter(self.path_to_shards, self.schema, row_group_size=2, rows_per_shard=4)
+        shard_writer.write(_repository_metadata(0))
+        shard = shard_writer.write_many([_repository_metadata(index) for index in range(1, 6)])
+
+        # The batch exceeds rows_per_shard, but is not split across shards
+        self.assertEqual(read_manifest(self.path_to_shards)[0]['shard'], shard)
+        self.assertEqual(read_manifest(self.path_to_shards)[0]['rows'], 6)
+
+    def test_worker_processes_should_close_their_shards_on_exit(self):
+        with ProcessPoolExecutor(max_workers=2, initializer=initialise_process_shard_writer,
+                                 initargs=(self.path_to_shards, self.schema, 2, 4)) as executor:
+            list(executor.map(_write_in_worker, [_repository_metadata(index) for index in range(9)]))
+
+        path_to_output = os.path.join(self.path_to_shards, 'output.parquet')
+        self.assertEqual(merge_shards(self.path_to_shards, path_to_output), 9)
+        self.assertCountEqual(pd.read_parquet(path_to_output)['name'],
+                              [f'owner/repository-{index}' for index in range(9)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import unittest
+from sys import path
+
+import pandas as pd
+
+path.append("..")
+import pyarrow.parquet as pq
+
+from src.repository_data_scraper.result_shards import ParquetShardWriter, shard_schema_for, readable_shards, \
+    merge_shards
+from src.repository_data_scraper.run_manifest import RunManifest, RUN_MANIFEST_FILE_NAME
+
+
+class RunManifestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path_to_shards = tempfile.mkdtemp()
+        self.run_manifest = RunManifest(os.path.join(self.path_to_shards, RUN_MANIFEST_FILE_NAME))
+
+    def tearDown(self):
+        self.run_manifest.close()
+        shutil.rmtree(self.path_to_shards, ignore_errors=True)
+
+    def test_should_only_complete_repositories_in_readable_shards(self):
+        names = [f'owner/repository-{index}' for index in range(5)]
+        self.run_manifest.queue(names)
+        shard_writer = ParquetShardWriter(self.path_to_shards, shard_schema_for(pd.DataFrame({'name': names})),
+                                          row_group_size=1, rows_per_shard=3)
+        for index, name in enumerate(names[:4]):
+            error = 'clone failed' if index == 1 else None
+            shard = shard_writer.write(pd.Series({'name': name, 'error': error}))
+            self.run_manifest.record_result(name, error, shard, clone_seconds=1.0, scrape_seconds=2.0)
+
+        # The second shard is still open, as if the run was interrupted
+        first_shard, second_shard = readable_shards(self.path_to_shards), shard_writer._shard_name
+        self.assertEqual(len(first_shard), 1)
+        # The failed repository is not completed, so a resumed run retries it
+        self.assertEqual(self.run_manifest.completed_repositories(readable_shards(self.path_to_shards)),
+                         {names[0], names[2]})
+        self.assertEqual(self.run_manifest.status_counts(), {'done': 3, 'failed': 1, 'pending': 1})
+
+        shard_writer.close()
+        self.assertEqual(self.run_manifest.completed_repositories(readable_shards(self.path_to_shards)),
+                         {names[0], names[2], names[3]})
+
+        with open(os.path.join(self.path_to_shards, next(iter(first_shard))), 'wb') as shard:
+            shard.write(b'corrupted')
+        self.assertEqual(self.run_manifest.completed_repositories(readable_shards(self.path_to_shards)),
+                         {names[3]})
+        self.assertIn(second_shard, readable_shards(self.path_to_shards))
+
+    def test_should_retry_failed_repositories_and_merge_only_their_latest_result(self):
+        names = ['owner/failed-transiently', 'owner/scraped']
+        self.run_manifest.queue(names)
+        schema = shard_schema_for(pd.DataFrame({'name': names}))
+        shard_writer = ParquetShardWriter(self.path_to_shards, schema)
+        for name, error in zip(names, ['clone failed', None]):
+            self.run_manifest.record_result(name, error, shard_writer.write(pd.Series({'name': name, 'error': error})))
+        shard_writer.close()
+
+        # The resumed run only scrapes the failed repository again
+        completed_repositories = self.run_manifest.completed_repositories(readable_shards(self.path_to_shards))
+        self.assertEqual([name for name in names if name not in completed_repositories], ['owner/failed-transiently'])
+        shard_writer = ParquetShardWriter(self.path_to_shards, schema)
+        self.run_manifest.record_result('owner/failed-transiently', None, shard_writer.write(
+            pd.Series({'name': 'owner/failed-transiently', 'error': None})))
+        shard_writer.close()
+        self.assertEqual(self.run_manifest.completed_repositories(readable_shards(self.path_to_shards)), set(names))
+        self.assertEqual(self.run_manifest.status_counts(), {'done': 2})
+
+        path_to_output = os.path.join(self.path_to_shards, 'output.parquet')
+        self.assertEqual(merge_shards(self.path_to_shards, path_to_output,
+                                      self.run_manifest.shards_of_repositories()), 2)
+        self.assertEqual(sorted((row['name'], row['error']) for row in pq.read_table(path_to_output).to_pylist()),
+                         [('owner/failed-transiently', None), ('owner/scraped', None)])
+        self.assertEqual(merge_shards(self.path_to_shards, path_to_output), 3)
+
+    def test_should_reset_repositories_whose_shard_was_never_closed(self):
+        names = [f'owner/repository-{index}' for index in range(3)]
+        self.run_manifest.queue(names)
+        schema = shard_schema_for(pd.DataFrame({'name': names}))
+        closed_shard_writer = ParquetShardWriter(self.path_to_shards, schema)
+        self.run_manifest.record_result(names[0], None, closed_shard_writer.write(pd.Series({'name': names[0]})))
+        closed_shard_writer.close()
+        # The process of this shard was killed before closing it
+        killed_shard_writer = ParquetShardWriter(self.path_to_shards, schema)
+        for name, error in zip(names[1:], [None, 'scraping failed']):
+            self.run_manifest.record_result(name, error, killed_shard_writer.write(pd.Series({'name': name})))
+
+        self.assertEqual(self.run_manifest.reset_lost_results(readable_shards(self.path_to_shards)), set(names[1:]))
+        self.assertEqual(self.run_manifest.status_counts(), {'done': 1, 'pending': 2})
+        self.assertEqual(self.run_manifest.reset_lost_results(readable_shards(self.path_to_shards)), set())
+
+    def test_should_merge_the_previous_result_if_the_latest_shard_is_unreadable(self):
+        names = ['owner/retried', 'owner/lost']
+        schema = shard_schema_for(pd.DataFrame({'name': names}))
+        shard_writer = ParquetShardWriter(self.path_to_shards, schema)
+        shard_writer.write(pd.Series({'name': 'owner/retried', 'error': 'clone failed'}))
+        shard_writer.close()
+        shard_writer = ParquetShardWriter(self.path_to_shards, schema)
+        latest_shard = shard_writer.write_many([pd.Series({'name': name, 'error': None}) for name in names])
+        shard_writer.close()
+        with open(os.path.join(self.path_to_shards, latest_shard), 'wb') as shard:
+            shard.write(b'truncated')
+
+        path_to_output = os.path.join(self.path_to_shards, 'output.parquet')
+        self.assertEqual(merge_shards(self.path_to_shards, path_to_output,
+                                      {'owner/retried': latest_shard, 'owner/lost': latest_shard}), 1)
+        self.assertEqual([(row['name'], row['error']) for row in pq.read_table(path_to_output).to_pylist()],
+                         [('owner/retried', 'clone failed')])
+
+
+if __name__ == '__main__':
+    unittest.main()
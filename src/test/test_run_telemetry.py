@@ -0,0 +1,53 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import urllib.request
+from sys import path
+
+import pandas as pd
+
+path.append("..")
+from src.repository_data_scraper.run_telemetry import RunTelemetry
+
+
+class RunTelemetryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path_to_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path_to_directory, ignore_errors=True)
+
+    def test_should_aggregate_results_and_serve_metrics(self):
+        path_to_metrics = os.path.join(self.path_to_directory, 'metrics.json')
+        telemetry = RunTelemetry(10, scrape_workers=2, path_to_metrics=path_to_metrics, flush_interval_seconds=60,
+                                 http_port=0, stage_sizes=lambda: {'cloning': 1, 'waiting_for_worker': 2,
+                                                                   'scraping': 3},
+                                 busy_workers=lambda: 1)
+        with telemetry:
+            telemetry.record_result(pd.Series({'name': 'a/a', 'error': None, 'scrape_seconds': 1.0,
+                                               'n_visited_commits': 100}))
+            telemetry.record_result(pd.Series({'name': 'b/b', 'error': 'Traceback', 'scrape_seconds': None,
+                                               'n_visited_commits': None}))
+            with urllib.request.urlopen(
+                    f'http://127.0.0.1:{telemetry._http_server.server_port}/metrics') as response:
+                served_metrics = json.load(response)
+
+        self.assertEqual(served_metrics['repositories'], {'total': 10, 'done': 2, 'failed': 1, 'remaining': 8})
+        self.assertEqual(served_metrics['error_rate'], 0.5)
+        # A batch of 3 repositories is scraped by a single worker
+        self.assertEqual(served_metrics['queues'], {'waiting_to_clone': 2, 'cloning': 1, 'waiting_for_worker': 2,
+                                                    'scraping': 3})
+        self.assertEqual(served_metrics['worker_utilisation']['current'], 0.5)
+        self.assertGreater(served_metrics['commits_per_second'], 0)
+        self.assertIsNotNone(served_metrics['eta_seconds'])
+
+        # The final metrics are flushed on close
+        with open(path_to_metrics) as metrics:
+            self.assertEqual(json.load(metrics)['repositories']['done'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
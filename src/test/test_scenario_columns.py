@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+from dataclasses import asdict, fields
+from sys import path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+path.append("..")
+from src.data_processing_scripts.downsample_dataset import read_dataset
+from src.data_processing_scripts.scenario_columns import arrow_schema_of, parse_raw_scenarios, scenario_of, scenario_to_struct, \
+    structs_to_raw_scenarios, to_structured_repository_row, to_structured_sample_row
+from src.data_processing_scripts.schemas import FileCommitChainScenario, MergeScenario, RepositoryDataRow, \
+    SampleDataRowV4, SampleDataRowV5
+from src.repository_data_scraper.equivalence_harness import generate_operations, materialise_repository, run_engine
+from src.repository_data_scraper.programming_language import ProgrammingLanguage
+from src.repository_data_scraper.repository_data_scraper import RepositoryDataScraper
+
+
+def _sample(sample_type: str, scenario: dict) -> SampleDataRowV4:
+    return SampleDataRowV4(id=f'owner/repository-{sample_type}-00000', name='owner/repository', default_branch='main',
+                           license=None, stargazers=1000, created_at=None, topics=None, programming_language='python',
+                           scenario=str(scenario), sample_type=sample_type, project_size='small',
+                           project_activity='week', difficulty='easy')
+
+
+class ScenarioColumnsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path_to_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path_to_directory, ignore_errors=True)
+
+    def test_should_round_trip_scraped_scenarios(self):
+        path_to_repository = os.path.join(self.path_to_directory, 'repository')
+        materialise_repository(generate_operations(seed=3, n_operations=60), path_to_repository,
+                               ProgrammingLanguage.PYTHON)
+        accumulator = run_engine(RepositoryDataScraper, path_to_repository, ProgrammingLanguage.PYTHON, 3)
+        row_values = {field.name: None for field in fields(RepositoryDataRow)}
+        row_values.update(id=0, name='owner/repository',
+                          file_commit_gram_scenarios=str(accumulator['file_commit_chain_scenarios']),
+                          merge_scenarios=str(accumulator['merge_scenarios']),
+                          cherry_pick_scenarios=str(accumulator['cherry_pick_scenarios']))
+
+        structured_row = to_structured_repository_row(RepositoryDataRow(**row_values))
+
+        self.assertIsInstance(structured_row.merge_scenarios[0], MergeScenario)
+        self.assertIsNone(structured_row.error)
+        for column in ['file_commit_gram_scenarios', 'merge_scenarios', 'cherry_pick_scenarios']:
+            # Key order follows the fields of the struct
+            self.assertEqual(parse_raw_scenarios(structs_to_raw_scenarios(getattr(structured_row, column))),
+                             parse_raw_scenarios(row_values[column]))
+        self.assertEqual(structs_to_raw_scenarios(None), 'None')
+
+    def test_should_reject_scenarios_with_unknown_keys(self):
+        with self.assertRaises(ValueError):
+            scenario_to_struct({'merge_commit_hash': 'a', 'unknown': 1}, MergeScenario)
+
+    def test_should_read_structured_samples_from_parquet(self):
+        chain_scenario = {'file': 'a.py', 'newest_commit': 'b', 'oldest_commit': 'c', 'times_seen_consecutively': 3,
+                          'purity': 0}
+        merge_scenario = {'merge_commit_hash': 'd', 'parents': ['e', 'f'], 'files_in_merge_conflict': ['a.py'],
+                          'number_of_files_with_merge_conflict': 1, 'total_number_of_merge_conflicts': 2}
+        samples = [to_structured_sample_row(_sample('file_commit_chain', chain_scenario)),
+                   to_structured_sample_row(_sample('merge', merge_scenario))]
+        self.assertIsInstance(samples[0].file_commit_chain_scenario, FileCommitChainScenario)
+        self.assertEqual([scenario_of(sample) for sample in samples], [chain_scenario, merge_scenario])
+
+        schema = arrow_schema_of(SampleDataRowV5)
+        self.assertEqual(schema.field('merge_scenario').type.field('parents').type, pa.list_(pa.string()))
+        path_to_dataset = os.path.join(self.path_to_directory, 'dataset.parquet')
+        pq.write_table(pa.Table.from_pylist([asdict(sample) for sample in samples], schema=schema), path_to_dataset)
+
+        dataset = read_dataset(path_to_dataset)
+
+        self.assertEqual(list(dataset['scenario']), [chain_scenario, merge_scenario])
+        self.assertNotIn('merge_scenario', dataset.columns)
+
+
+if __name__ == '__main__':
+    unittest.main()
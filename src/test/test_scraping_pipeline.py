@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from sys import path
+
+path.append("..")
+from src.repository_data_scraper.scraping_pipeline import CloneScrapePipeline, directory_size
+
+REPOSITORY_SIZE = 1000
+
+
+class _FakeRepositories:
+    """
+    Clones by writing a file of REPOSITORY_SIZE bytes and records how many clones and scrapes run concurrently.
+    """
+
+    def __init__(self, path_to_repositories: str):
+        self.path_to_repositories = path_to_repositories
+        self.lock = threading.Lock()
+        self.running_clones = self.max_running_clones = 0
+        self.running_scrapes = self.max_running_scrapes = 0
+
+    def clone(self, item):
+        with self.lock:
+            self.running_clones += 1
+            self.max_running_clones = max(self.max_running_clones, self.running_clones)
+        time.sleep(0.01)
+        with self.lock:
+            self.running_clones -= 1
+        if item % 5 == 4:
+            return f'clone of {item} failed', None
+        if item == 13:
+            raise OSError('No space left on device')
+        repository_path = os.path.join(self.path_to_repositories, str(item))
+        os.makedirs(repository_path)
+        with open(os.path.join(repository_path, 'pack'), 'wb') as pack:
+            pack.write(b'0' * REPOSITORY_SIZE)
+        return item, repository_path
+
+    def scrape(self, item, repository_path):
+        with self.lock:
+            self.running_scrapes += 1
+            self.max_running_scrapes = max(self.max_running_scrapes, self.running_scrapes)
+        time.sleep(0.02)
+        with self.lock:
+            self.running_scrapes -= 1
+        if item == 7:
+            raise RuntimeError('worker died')
+        return f'scraped {item}'
+
+
+def _remove(repository_path):
+    shutil.rmtree(repository_path)
+    return True
+
+
+class CloneScrapePipelineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path_to_repositories = tempfile.mkdtemp()
+        self.repositories = _FakeRepositories(self.path_to_repositories)
+
+    def tearDown(self):
+        shutil.rmtree(self.path_to_repositories, ignore_errors=True)
+
+    def _run(self, **kwargs):
+        with ThreadPoolExecutor(max_workers=2) as scrape_executor:
+            pipeline = CloneScrapePipeline(clone=self.repositories.clone, scrape=self.repositories.scrape,
+                                           remove=_remove, scrape_executor=scrape_executor, scrape_concurrency=2,
+                                           estimate_size=lambda item: REPOSITORY_SIZE,
+                                           on_scrape_error=lambda item, e: f'error {item}',
+                                           on_clone_error=lambda item, e: f'clone error {item}', **kwargs)
+            return pipeline, list(pipeline.run(range(20)))
+
+    def test_should_yield_one_result_per_repository_and_remove_clones(self):
+        pipeline, results = self._run(clone_concurrency=3, lookahead=1)
+
+        expected_results = [f'clone of {item} failed' if item % 5 == 4 else 'error 7' if item == 7
+                            else 'clone error 13' if item == 13 else f'scraped {item}' for item in range(20)]
+        self.assertCountEqual(results, expected_results)
+        self.assertEqual(os.listdir(self.path_to_repositories), [])
+        self.assertEqual(pipeline.bytes_on_disk, {})
+        self.assertLessEqual(self.repositories.max_running_clones, 3)
+        self.assertLessEqual(self.repositories.max_running_scrapes, 2)
+
+    def test_should_respect_disk_budget(self):
+        pipeline, results = self._run(clone_concurrency=4, lookahead=4, disk_budget_bytes=3 * REPOSITORY_SIZE)
+
+        self.assertEqual(len(results), 20)
+        self.assertLessEqual(pipeline.peak_bytes_on_disk, 3 * REPOSITORY_SIZE)
+        self.assertLessEqual(self.repositories.max_running_clones, 3)
+
+    def test_should_raise_clone_errors_without_handler(self):
+        with ThreadPoolExecutor(max_workers=2) as scrape_executor:
+            pipeline = CloneScrapePipeline(clone=self.repositories.clone, scrape=self.repositories.scrape,
+                                           remove=_remove, scrape_executor=scrape_executor, scrape_concurrency=2,
+                                           on_scrape_error=lambda item, e: f'error {item}')
+            with self.assertRaises(OSError):
+                list(pipeline.run([13]))
+
+    def test_should_count_the_repositories_of_batches_in_stage_sizes(self):
+        batches = [[0, 1, 2], [3], [5, 6]]
+        observed = []
+
+        def clone(batch):
+            repository_path = os.path.join(self.path_to_repositories, str(batch[0]))
+            os.makedirs(repository_path)
+            return batch, repository_path
+
+        def scrape(batch, repository_path):
+            # The pipeline registers the task right after submitting it
+            time.sleep(0.05)
+            observed.append((len(batch), pipeline.stage_sizes()['scraping'], pipeline.busy_workers()))
+            return batch
+
+        with ThreadPoolExecutor(max_workers=1) as scrape_executor:
+            pipeline = CloneScrapePipeline(clone=clone, scrape=scrape, remove=_remove,
+                                           scrape_executor=scrape_executor, scrape_concurrency=1)
+            self.assertCountEqual(list(pipeline.run(batches)), batches)
+
+        self.assertCountEqual(observed, [(3, 3, 1), (1, 1, 1), (2, 2, 1)])
+        self.assertEqual(pipeline.stage_sizes(), {'cloning': 0, 'waiting_for_worker': 0, 'scraping': 0})
+
+    def test_should_measure_directory_size(self):
+        _, repository_path = self.repositories.clone(0)
+
+        self.assertEqual(directory_size(repository_path), REPOSITORY_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()
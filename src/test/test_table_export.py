@@ -0,0 +1,85 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from dataclasses import asdict
+from sys import path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+path.append("..")
+from src.data_processing_scripts.scenario_columns import to_structured_sample_row
+from src.data_processing_scripts.schemas import SampleDataRowV4, SampleDataRowV5
+from src.data_processing_scripts.table_export import export_rows
+
+
+def _samples(n: int) -> list:
+    samples = []
+    for i in range(n):
+        scenario = {'merge_commit_hash': f'{i:040x}', 'parents': ['a', 'b'], 'files_in_merge_conflict': ['a.py'],
+                    'number_of_files_with_merge_conflict': 1, 'total_number_of_merge_conflicts': i}
+        samples.append(SampleDataRowV4(id=f'owner/repository-merge-{i:05d}', name='owner/repository',
+                                       default_branch='main', license=None if i % 2 else 'MIT', stargazers=1000 + i,
+                                       created_at=None, topics=None, programming_language='python',
+                                       scenario=str(scenario), sample_type='merge', project_size='small',
+                                       project_activity='week', difficulty='easy'))
+    return samples
+
+
+class TableExportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path_to_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path_to_directory, ignore_errors=True)
+
+    def test_should_stream_rows_into_parquet_row_groups_and_csv(self):
+        samples = _samples(25)
+        path_to_parquet = os.path.join(self.path_to_directory, 'dataset.parquet')
+        path_to_csv = os.path.join(self.path_to_directory, 'dataset.csv')
+
+        number_of_rows = export_rows(iter(samples), SampleDataRowV4,
+                                     path_to_parquet=path_to_parquet, path_to_csv=path_to_csv, rows_per_batch=10)
+
+        self.assertEqual(number_of_rows, 25)
+        parquet_file = pq.ParquetFile(path_to_parquet)
+        self.assertEqual([parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)],
+                         [10, 10, 5])
+        self.assertEqual(parquet_file.read().to_pylist(), [asdict(sample) for sample in samples])
+        expected_csv = io.StringIO()
+        pd.DataFrame([asdict(sample) for sample in samples]).to_csv(expected_csv)
+        with open(path_to_csv) as csv_file:
+            self.assertEqual(csv_file.read(), expected_csv.getvalue())
+
+    def test_should_write_the_same_csv_for_all_batch_sizes(self):
+        samples = _samples(5)
+        samples[-1].stargazers = None
+        csvs = []
+        for rows_per_batch in [2, 3, 10]:
+            path_to_csv = os.path.join(self.path_to_directory, f'dataset_{rows_per_batch}.csv')
+            export_rows(iter(samples), SampleDataRowV4, path_to_csv=path_to_csv, rows_per_batch=rows_per_batch)
+            with open(path_to_csv) as csv_file:
+                csvs.append(csv_file.read())
+
+        self.assertEqual(csvs[1:], csvs[:1] * 2)
+        self.assertEqual(list(pd.read_csv(io.StringIO(csvs[0]), index_col=0, dtype={'stargazers': str})['stargazers']
+                              .fillna('')), ['1000', '1001', '1002', '1003', ''])
+
+    def test_should_export_structured_rows(self):
+        samples = [to_structured_sample_row(sample) for sample in _samples(3)]
+        path_to_parquet = os.path.join(self.path_to_directory, 'dataset.parquet')
+
+        export_rows(iter(samples), SampleDataRowV5, path_to_parquet=path_to_parquet)
+
+        self.assertEqual(pq.read_table(path_to_parquet).to_pylist(), [asdict(sample) for sample in samples])
+
+    def test_should_require_an_output(self):
+        with self.assertRaises(ValueError):
+            export_rows([], SampleDataRowV4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import shutil
+import tempfile
+import unittest
+from sys import path
+
+from git import Repo
+
+path.append("..")
+from src.repository_data_scraper.equivalence_harness import generate_operations, materialise_repository, run_engine
+from src.repository_data_scraper.programming_language import ProgrammingLanguage
+from src.repository_data_scraper.repository_data_scraper import RepositoryDataScraper
+from src.repository_data_scraper.top_k_chains import TopKFileCommitChains
+
+
+def _chain(file, branch, times_seen_consecutively):
+    return {'file': file, 'branch': branch, 'oldest_commit': 'a', 'newest_commit': 'b',
+            'times_seen_consecutively': times_seen_consecutively}
+
+
+class TopKFileCommitChainsTestCase(unittest.TestCase):
+
+    def test_should_keep_k_longest_chains_and_first_pushed_on_ties(self):
+        top_k = TopKFileCommitChains(k=2)
+        for file, length in [('a.py', 3), ('b.py', 5), ('c.py', 4), ('d.py', 4), ('e.py', 2)]:
+            top_k.push(_chain(file, 'main', length))
+
+        self.assertEqual(top_k.chains(), [_chain('b.py', 'main', 5), _chain('c.py', 'main', 4)])
+
+    def test_should_keep_k_longest_chains_per_group(self):
+        top_k = TopKFileCommitChains(k=1, group_by='branch')
+        for file, branch, length in [('a.py', 'main', 3), ('b.py', 'main', 5), ('a.py', 'dev', 4)]:
+            top_k.push(_chain(file, branch, length))
+
+        self.assertEqual(top_k.chains(), [_chain('b.py', 'main', 5), _chain('a.py', 'dev', 4)])
+
+    def test_scraper_should_keep_longest_chains_within_length_bounds(self):
+        path_to_repository = tempfile.mkdtemp()
+        try:
+            materialise_repository(generate_operations(seed=3, n_operations=60), path_to_repository,
+                                   ProgrammingLanguage.PYTHON)
+            all_chains = run_engine(RepositoryDataScraper, path_to_repository, ProgrammingLanguage.PYTHON,
+                                    2)['file_commit_chain_scenarios']
+
+            scraper = RepositoryDataScraper(repository=Repo(path_to_repository),
+                                            programming_language=ProgrammingLanguage.PYTHON,
+                                            repository_name='generated', sliding_window_size=2,
+                                            top_k_chains=2, max_chain_length=3)
+            scraper.scrape()
+            top_chains = scraper.accumulator['file_commit_chain_scenarios']
+        finally:
+            shutil.rmtree(path_to_repository, ignore_errors=True)
+
+        chains_within_bounds = [chain for chain in all_chains if chain['times_seen_consecutively'] <= 3]
+        expected_lengths = sorted([chain['times_seen_consecutively'] for chain in chains_within_bounds],
+                                  reverse=True)[:2]
+        self.assertEqual([chain['times_seen_consecutively'] for chain in top_chains], expected_lengths)
+        for chain in top_chains:
+            self.assertIn(chain, chains_within_bounds)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import shutil
+import tempfile
+import unittest
+from sys import path
+
+from git import Repo
+
+path.append("..")
+from src.repository_data_scraper.equivalence_harness import compare_engines_on_generated_repositories, \
+    generate_operations, materialise_repository
+from src.repository_data_scraper.programming_language import ProgrammingLanguage
+from src.repository_data_scraper.repository_data_scraper import RepositoryDataScraper
+from src.repository_data_scraper.vectorised_repository_data_scraper import VectorisedRepositoryDataScraper
+
+
+class VectorisedRepositoryDataScraperTestCase(unittest.TestCase):
+
+    def test_should_mine_same_scenarios_as_reference(self):
+        for sliding_window_size in [1, 2, 3]:
+            reports = compare_engines_on_generated_repositories(VectorisedRepositoryDataScraper,
+                                                                ProgrammingLanguage.PYTHON, seeds=range(8),
+                                                                sliding_window_size=sliding_window_size,
+                                                                n_operations=50)
+
+            for report in reports:
+                self.assertTrue(report.is_equivalent, str(report))
+
+    def test_should_keep_same_top_k_chains_as_reference(self):
+        path_to_repository = tempfile.mkdtemp()
+        try:
+            materialise_repository(generate_operations(seed=3, n_operations=80), path_to_repository,
+                                   ProgrammingLanguage.PYTHON)
+            accumulators = []
+            for engine in [RepositoryDataScraper, VectorisedRepositoryDataScraper]:
+                scraper = engine(repository=Repo(path_to_repository), programming_language=ProgrammingLanguage.PYTHON,
+                                 repository_name='generated', sliding_window_size=2, top_k_chains=3,
+                                 top_k_group_by='file')
+                scraper.scrape()
+                accumulators.append(scraper.accumulator)
+        finally:
+            shutil.rmtree(path_to_repository, ignore_errors=True)
+
+        # Ties are broken by the order chains are found in, so the kept chains are only identical if the order is
+        self.assertEqual(accumulators[0], accumulators[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from sys import path
+
+path.append("..")
+from src.repository_data_scraper.scraping_pipeline import CloneScrapePipeline
+from src.repository_data_scraper.worker_supervision import RebuildingExecutor, WorkerCrashTriage, \
+    current_rss_bytes, get_worker_supervisor, initialise_worker_supervisor, worker_event_counts, \
+    EVENT_MEMORY_BUDGET_EXCEEDED, EVENT_POOL_REBUILT, EVENT_POOL_RETIRED, EVENT_RECYCLED
+
+ALLOCATION_BYTES = 256 * 1024 ** 2
+
+
+def _scrape(repository_name: str) -> int:
+    with get_worker_supervisor().supervise(repository_name) as task_statistics:
+        if repository_name == 'owner/huge':
+            allocation = b'x' * ALLOCATION_BYTES
+            time.sleep(5)
+            del allocation
+    get_worker_supervisor().task_done()
+    return task_statistics.peak_rss_bytes
+
+
+class WorkerSupervisionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path_to_run = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path_to_run, ignore_errors=True)
+
+    def test_should_kill_worker_over_memory_budget_and_rebuild_pool(self):
+        memory_budget_bytes = current_rss_bytes() + ALLOCATION_BYTES // 2
+        executor = RebuildingExecutor(partial(ProcessPoolExecutor, max_workers=1,
+                                              initializer=initialise_worker_supervisor,
+                                              initargs=(self.path_to_run, memory_budget_bytes, 2)),
+                                      path_to_run=self.path_to_run)
+        triage = WorkerCrashTriage(self.path_to_run)
+        with executor:
+            self.assertGreater(executor.submit(_scrape, 'owner/small').result(), 0)
+
+            with self.assertRaises(BrokenProcessPool) as context:
+                executor.submit(_scrape, 'owner/huge').result()
+            # The repository exceeded the budget, so scraping it again would only kill the next worker
+            self.assertFalse(triage.should_retry('owner/huge', context.exception))
+            self.assertGreater(triage.tombstone_of('owner/huge')['rss_bytes'], memory_budget_bytes)
+
+            # The next task is submitted to a new pool
+            for _ in range(2):
+                executor.submit(_scrape, 'owner/small').result()
+
+        self.assertEqual(worker_event_counts(self.path_to_run),
+                         {EVENT_MEMORY_BUDGET_EXCEEDED: 1, EVENT_POOL_REBUILT: 1, EVENT_RECYCLED: 1})
+
+    def test_should_replace_pool_after_submissions(self):
+        executor = RebuildingExecutor(partial(ProcessPoolExecutor, max_workers=1), path_to_run=self.path_to_run,
+                                      retire_after_submissions=2)
+        with executor:
+            futures = [executor.submit(os.getpid) for _ in range(5)]
+            pids = [future.result() for future in futures]
+
+        # Tasks submitted before a retirement still finish in the retired pool
+        self.assertEqual(len(set(pids)), 3)
+        self.assertEqual(pids[0], pids[1])
+        self.assertEqual(pids[2], pids[3])
+        self.assertEqual(executor.retirements, 2)
+        self.assertEqual(worker_event_counts(self.path_to_run), {EVENT_POOL_RETIRED: 2})
+
+    def test_pipeline_should_retry_scrapes_of_dead_workers_with_their_clone(self):
+        path_to_repositories = os.path.join(self.path_to_run, 'repos')
+        attempts = []
+
+        def clone(item):
+            os.makedirs(os.path.join(path_to_repositories, item))
+            return item, os.path.join(path_to_repositories, item)
+
+        def scrape(item, repository_path):
+            attempts.append(item)
+            if attempts.count(item) == 1:
+                raise BrokenProcessPool('A process in the process pool was terminated abruptly.')
+            return f'scraped {item} from {os.path.exists(repository_path)}'
+
+        triage = WorkerCrashTriage(self.path_to_run, max_attempts=2)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pipeline = CloneScrapePipeline(clone=clone, scrape=scrape, remove=lambda path: shutil.rmtree(path) or True,
+                                           scrape_executor=executor, scrape_concurrency=1,
+                                           on_scrape_error=lambda item, e: f'failed {item}',
+                                           retry_scrape=lambda item, e: triage.should_retry(item, e))
+            results = list(pipeline.run(['a', 'b']))
+
+        self.assertEqual(sorted(results), ['scraped a from True', 'scraped b from True'])
+        self.assertEqual(sorted(attempts), ['a', 'a', 'b', 'b'])
+        self.assertEqual(os.listdir(path_to_repositories), [])
+
+
+if __name__ == '__main__':
+    unittest.main()